@@ -0,0 +1,311 @@
+"""直接读取 zip/tar 压缩包中的图片，不解压到磁盘。
+
+压缩包内的图片用 "<压缩包路径>!/<成员名>" 形式的路径表示（与 jar URL 相同，见 member_path），
+可以和普通图片路径一起放进队列、journal、缓存索引。需要数据时由 open_source 打开成员流：
+FFmpeg 通过 stdin（image2pipe）读取，Pillow 直接从流中解码，全程没有临时文件。
+
+zip 的成员可以随机访问；tar 没有目录，只能从头顺序读取，因此每个 tar 包保持一个打开的
+TarFile，按队列顺序（即列举顺序）读取时只需要向前推进，gzip/xz 等压缩的 tar 也不会重复解压。
+限制：压缩 tar 中较大的成员（超过 TAR_BUFFER_MEMBER_BYTES）若被乱序读取，需要从头重新解压，
+因此队列排序（order_longest_first）不移动 tar 成员；并行任务之间的小范围乱序由最近成员缓冲吸收。
+图片格式转换的每个工作进程各有一个读取位置，最多各自完整解压一遍。
+"""
+
+import io
+import os
+import tarfile
+import threading
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import PurePosixPath
+from typing import Callable, Iterator, Optional
+
+from logging_config import logger
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+# 分隔符以 "/" 结尾：Path(成员路径).name / .stem 即成员自身的文件名，输出文件名的规则不变
+MEMBER_SEP = "!/"
+# 向 FFmpeg stdin 写入时每次读取的块大小
+CHUNK_SIZE = 1024 * 1024
+# 压缩 tar 中不超过该大小的成员读取时整体缓存在内存中（含顺序推进时跳过的成员），
+# 并行任务的乱序读取、同一成员的再次读取（缓存哈希后再交给 FFmpeg）不必从头重新解压
+TAR_BUFFER_MEMBER_BYTES = 16 * 1024 * 1024
+# 每个 tar 包最近成员缓冲的总大小上限（超出时淘汰最早的成员）
+TAR_RECENT_BYTES = 64 * 1024 * 1024
+
+
+def is_archive(path: str) -> bool:
+    return str(path).lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def member_path(archive: str, name: str) -> str:
+    return f"{archive}{MEMBER_SEP}{name}"
+
+
+def split_member(path: str) -> Optional[tuple[str, str]]:
+    """(压缩包路径, 成员名)；普通文件路径返回 None。"""
+    path = str(path)
+    start = 0
+    # 目录名中也可能出现分隔符：取第一个前面是压缩包路径的位置
+    while True:
+        pos = path.find(MEMBER_SEP, start)
+        if pos < 0:
+            return None
+        archive, name = path[:pos], path[pos + len(MEMBER_SEP):]
+        if name and is_archive(archive):
+            return archive, name
+        start = pos + 1
+
+
+def is_member(path: str) -> bool:
+    return split_member(path) is not None
+
+
+def is_tar_member(path: str) -> bool:
+    """tar 包的成员（只能顺序读取）。"""
+    member = split_member(path)
+    return member is not None and not member[0].lower().endswith(".zip")
+
+
+def archive_stem(archive: str) -> str:
+    """去掉压缩包扩展名（含 .tar.gz 这类双扩展名）后的文件名。"""
+    name = os.path.basename(archive)
+    lower = name.lower()
+    for ext in sorted(ARCHIVE_EXTENSIONS, key=len, reverse=True):
+        if lower.endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+
+def member_output_dir(path: str) -> str:
+    """压缩包成员的默认输出目录：<压缩包所在目录>/<压缩包名>/<成员所在子目录>。
+
+    包内不同子目录中的同名图片不会互相覆盖；成员名中的 ".." 和绝对路径前缀被丢弃，输出不会写到该目录之外。
+    """
+    archive, name = split_member(path)
+    parts = [p for p in PurePosixPath(name).parent.parts if p not in ("", ".", "..", "/")]
+    base = os.path.join(os.path.dirname(os.path.abspath(archive)), archive_stem(archive))
+    return os.path.join(base, *parts)
+
+
+# 列举时顺便记下的成员大小：{(压缩包, mtime_ns): {成员名: 字节数}}，source_stat 命中时不必再打开压缩包
+_sizes: dict[tuple[str, int], dict[str, int]] = {}
+_sizes_lock = threading.Lock()
+
+
+def _size_index(archive: str, mtime_ns: Optional[int] = None) -> dict[str, int]:
+    key = (archive, os.stat(archive).st_mtime_ns if mtime_ns is None else mtime_ns)
+    with _sizes_lock:
+        sizes = _sizes.get(key)
+        if sizes is None:
+            # 压缩包被替换：丢弃旧版本的索引
+            for stale in [k for k in _sizes if k[0] == archive]:
+                del _sizes[stale]
+            sizes = _sizes[key] = {}
+        return sizes
+
+
+def iter_members(archive: str, accept: Callable[[str], bool]) -> Iterator[str]:
+    """按包内顺序逐个产出匹配的成员路径（不读取成员数据）。"""
+    sizes = _size_index(archive)
+    if archive.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and accept(info.filename):
+                    sizes[info.filename] = info.file_size
+                    yield member_path(archive, info.filename)
+        return
+    # 流式模式只读取成员头，跳过成员数据，不会把整个包的目录载入内存
+    with tarfile.open(archive, "r|*") as tf:
+        for info in tf:
+            if info.isfile() and accept(info.name):
+                sizes[info.name] = info.size
+                yield member_path(archive, info.name)
+
+
+class _TarCursor:
+    """一个 tar 包的顺序读取位置。
+
+    请求的成员在当前位置之后时向前推进；在之前时由 TarFile 回退（未压缩的 tar 只是 seek，
+    压缩的 tar 需要从头重新解压，所以压缩包中的小成员在经过时缓存在 _recent 中）。
+    大成员不缓存：持有 lock 直接从解压流读取，读完之前同一个包的其他读取等待。
+    """
+
+    def __init__(self, archive: str):
+        self.archive = archive
+        self.lock = threading.Lock()
+        self._tf: Optional[tarfile.TarFile] = None
+        self._seen: dict[str, tarfile.TarInfo] = {}
+        self._compressed = not archive.lower().endswith(".tar")
+        self._recent: "OrderedDict[str, bytes]" = OrderedDict()
+        self._recent_bytes = 0
+
+    def _reopen(self):
+        self.close()
+        self._tf = tarfile.open(self.archive, "r:*")
+        self._seen = {}
+
+    def _find(self, name: str) -> tarfile.TarInfo:
+        if self._tf is None:
+            self._reopen()
+        info = self._seen.get(name) or self._advance(name)
+        if info is None:
+            raise FileNotFoundError(f"{name} not found in {self.archive}")
+        return info
+
+    def _advance(self, name: str) -> Optional[tarfile.TarInfo]:
+        while True:
+            info = self._tf.next()
+            if info is None:
+                return None
+            if info.isfile():
+                self._seen[info.name] = info
+                if info.name == name:
+                    return info
+                if self._buffered(info):
+                    # 跳过的成员可能正被另一个并行任务请求：顺路读出，之后不必回退解压
+                    self._remember(info.name, self._tf.extractfile(info).read())
+
+    def _buffered(self, info: tarfile.TarInfo) -> bool:
+        return self._compressed and info.size <= TAR_BUFFER_MEMBER_BYTES
+
+    def _remember(self, name: str, data: bytes):
+        old = self._recent.pop(name, None)
+        if old is not None:
+            self._recent_bytes -= len(old)
+        self._recent[name] = data
+        self._recent_bytes += len(data)
+        while self._recent_bytes > TAR_RECENT_BYTES:
+            _, evicted = self._recent.popitem(last=False)
+            self._recent_bytes -= len(evicted)
+
+    @contextmanager
+    def open(self, name: str):
+        """成员的只读流：缓冲的成员为内存流（不持锁），其余为持锁期间的解压流。"""
+        self.lock.acquire()
+        try:
+            data = self._recent.get(name)
+            if data is None:
+                info = self._find(name)
+                if not self._buffered(info):
+                    with self._tf.extractfile(info) as f:
+                        yield f
+                    return
+                data = self._tf.extractfile(info).read()
+                self._remember(name, data)
+        finally:
+            self.lock.release()
+        yield io.BytesIO(data)
+
+    def size(self, name: str) -> int:
+        with self.lock:
+            return self._find(name).size
+
+    def close(self):
+        self._recent.clear()
+        self._recent_bytes = 0
+        if self._tf is not None:
+            try:
+                self._tf.close()
+            except OSError:
+                pass
+            self._tf = None
+
+
+_cursors: dict[tuple[str, int], _TarCursor] = {}
+_cursors_lock = threading.Lock()
+
+
+def _tar_cursor(archive: str) -> _TarCursor:
+    # 以 mtime 区分：压缩包被替换后不会读到旧的位置
+    key = (archive, os.stat(archive).st_mtime_ns)
+    with _cursors_lock:
+        cursor = _cursors.get(key)
+        if cursor is None:
+            cursor = _cursors[key] = _TarCursor(archive)
+        return cursor
+
+
+def close_archives() -> None:
+    """关闭保持打开的 tar 包并清空成员大小索引（批量任务结束时调用，长期运行的进程不会累积）。"""
+    with _cursors_lock:
+        cursors = list(_cursors.values())
+        _cursors.clear()
+    with _sizes_lock:
+        _sizes.clear()
+    for cursor in cursors:
+        with cursor.lock:
+            cursor.close()
+
+
+@contextmanager
+def open_source(path: str):
+    """以二进制只读方式打开图片：普通文件或压缩包成员（zip 为解压流，tar 见 _TarCursor.open）。"""
+    member = split_member(path)
+    if member is None:
+        with open(path, "rb") as f:
+            yield f
+        return
+    archive, name = member
+    if archive.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive) as zf, zf.open(name) as f:
+            yield f
+        return
+    with _tar_cursor(archive).open(name) as f:
+        yield f
+
+
+@contextmanager
+def image_source(path: str):
+    """传给 Image.open 的参数：普通文件仍传路径（行为不变），压缩包成员传打开的流。"""
+    if not is_member(path):
+        yield path
+        return
+    with open_source(path) as f:
+        yield f
+
+
+def iter_source_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """逐块产出图片数据，作为 FFmpeg 的 stdin（在 ffmpeg_runner 的写入线程中按需读取）。"""
+    with open_source(path) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield chunk
+
+
+def source_stat(path: str) -> tuple[int, int]:
+    """(mtime_ns, 字节数)。压缩包成员取压缩包的 mtime 和成员解压后的大小；不存在时抛 OSError。"""
+    member = split_member(path)
+    if member is None:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    archive, name = member
+    mtime_ns = os.stat(archive).st_mtime_ns
+    size = _size_index(archive, mtime_ns).get(name)
+    if size is not None:
+        return mtime_ns, size
+    try:
+        if archive.lower().endswith(".zip"):
+            with zipfile.ZipFile(archive) as zf:
+                return mtime_ns, zf.getinfo(name).file_size
+        return mtime_ns, _tar_cursor(archive).size(name)
+    except (KeyError, zipfile.BadZipFile, tarfile.TarError) as e:
+        raise FileNotFoundError(f"{path}: {e}") from None
+
+
+def source_size(path: str) -> int:
+    return source_stat(path)[1]
+
+
+def source_exists(path: str) -> bool:
+    """普通文件等价于 os.path.isfile；压缩包成员检查压缩包中是否有该成员。"""
+    if not is_member(path):
+        return os.path.isfile(path)
+    try:
+        source_stat(path)
+        return True
+    except OSError:
+        return False
+    except Exception:
+        logger.exception(f"Failed to stat archive member: {path}")
+        return False
@@ -0,0 +1,183 @@
+"""本机编码参数自动调优。
+
+用一小组校准图片（默认由 FFmpeg 的 testsrc2 生成，不依赖 Pillow）依次尝试
+不同的 x264 preset、每任务线程数和并行任务数，测量吞吐（张/秒）、平均输出大小
+和 FFmpeg 峰值内存，按目标选出最佳组合并保存为 "tuned" 编码配置。
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass, replace
+from typing import Callable, Optional
+
+import converter_engine as engine
+from encoder_profiles import TUNED, EncoderProfile, save_tuned_profile
+from ffmpeg_runner import popen_kwargs
+from logging_config import logger
+
+CALIBRATION_SIZES = [(640, 480), (1920, 1080), (4000, 3000)]
+CALIBRATION_COPIES = 3
+CANDIDATE_PRESETS = ["ultrafast", "superfast", "veryfast", "medium"]
+GOALS = ("throughput", "balanced", "smallest")
+# smallest 目标下，吞吐低于最快候选的该比例则不予考虑
+MIN_RATE_RATIO = 0.25
+
+
+@dataclass
+class Measurement:
+    profile: EncoderProfile
+    jobs: int
+    images: int = 0
+    ok: int = 0
+    fail: int = 0
+    images_per_second: float = 0.0
+    bytes_per_output: float = 0.0
+    peak_rss_kb: Optional[int] = None
+
+    def describe(self) -> str:
+        rss = f"{self.peak_rss_kb / 1024:.0f} MB" if self.peak_rss_kb else "n/a"
+        return (
+            f"preset={self.profile.preset:<9} threads={self.profile.threads} jobs={self.jobs:<3} "
+            f"{self.images_per_second:7.2f} 张/秒  {self.bytes_per_output / 1024:8.1f} KB/个  峰值内存 {rss}"
+            + (f"  失败 {self.fail}" if self.fail else "")
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "preset": self.profile.preset,
+            "crf": self.profile.crf,
+            "threads": self.profile.threads,
+            "jobs": self.jobs,
+            "images_per_second": round(self.images_per_second, 3),
+            "bytes_per_output": round(self.bytes_per_output, 1),
+            "peak_rss_kb": self.peak_rss_kb,
+            "fail": self.fail,
+        }
+
+
+def generate_calibration_set(dest_dir: str, ffmpeg_bin: str = "ffmpeg") -> list[str]:
+    """用 testsrc2 生成不同尺寸的 JPEG 校准图片。"""
+    os.makedirs(dest_dir, exist_ok=True)
+    images: list[str] = []
+    for w, h in CALIBRATION_SIZES:
+        pattern = os.path.join(dest_dir, f"calib_{w}x{h}_%02d.jpg")
+        subprocess.run(
+            [
+                ffmpeg_bin, "-y", "-v", "error",
+                "-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate=1",
+                "-frames:v", str(CALIBRATION_COPIES),
+                pattern,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            **popen_kwargs()
+        )
+        images.extend(pattern % (i + 1) for i in range(CALIBRATION_COPIES))
+    return images
+
+
+def candidate_grid(goal: str, cpu: Optional[int] = None) -> list[tuple[EncoderProfile, int]]:
+    """(编码配置, 并行任务数) 候选：每任务线程数 × 任务数 ≈ CPU 核心数。"""
+    cpu = cpu or engine.default_jobs()
+    crf = 26 if goal == "smallest" else 23
+    thread_counts = sorted({t for t in (1, 2, 4) if t <= cpu} or {1})
+    grid = []
+    for preset in CANDIDATE_PRESETS:
+        for threads in thread_counts:
+            profile = EncoderProfile(name=TUNED, preset=preset, crf=crf, threads=threads)
+            grid.append((profile, max(1, cpu // threads)))
+    return grid
+
+
+def measure(
+    images: list[str],
+    profile: EncoderProfile,
+    jobs: int,
+    base_options: engine.ConvertOptions,
+    work_dir: str,
+) -> Measurement:
+    options = replace(
+        base_options,
+        profile=profile,
+        jobs=jobs,
+        output_dir=work_dir,
+        cache_dir="",
+        # 不做内存准入：否则 jobs 与线程数会被预算改写，测到的不是这个候选组合
+        memory_budget=0,
+    )
+    m = Measurement(profile=profile, jobs=jobs, images=len(images))
+    peaks: list[int] = []
+
+    def on_result(res: engine.JobResult):
+        if res.peak_rss_kb:
+            peaks.append(res.peak_rss_kb)
+
+    summary = engine.run_batch(images, options, on_result=on_result)
+    m.ok = summary.ok
+    m.fail = summary.fail
+    m.images_per_second = summary.images_per_second
+    m.bytes_per_output = summary.output_bytes / summary.ok if summary.ok else 0.0
+    m.peak_rss_kb = max(peaks) if peaks else None
+    return m
+
+
+def pick_best(measurements: list[Measurement], goal: str) -> Optional[Measurement]:
+    valid = [m for m in measurements if m.fail == 0 and m.ok > 0]
+    if not valid:
+        return None
+    if goal == "throughput":
+        return max(valid, key=lambda m: m.images_per_second)
+    if goal == "smallest":
+        best_rate = max(m.images_per_second for m in valid)
+        fast_enough = [m for m in valid if m.images_per_second >= best_rate * MIN_RATE_RATIO]
+        return min(fast_enough, key=lambda m: (m.bytes_per_output, -m.images_per_second))
+    # balanced：每秒能产出的“每 KB 图片数”最高
+    return max(valid, key=lambda m: m.images_per_second / max(m.bytes_per_output, 1.0))
+
+
+def autotune(
+    goal: str = "throughput",
+    images: Optional[list[str]] = None,
+    base_options: Optional[engine.ConvertOptions] = None,
+    on_measurement: Optional[Callable[[Measurement], None]] = None,
+    save: bool = True,
+) -> tuple[Optional[Measurement], list[Measurement]]:
+    """运行调优；返回 (最佳测量, 全部测量)。save=True 时把最佳配置保存为 tuned。"""
+    if goal not in GOALS:
+        raise ValueError(f"unknown goal: {goal}")
+    base_options = base_options or engine.ConvertOptions()
+
+    tmp_root = tempfile.mkdtemp(prefix="pic_to_video_autotune_")
+    try:
+        if not images:
+            images = generate_calibration_set(os.path.join(tmp_root, "calibration"), base_options.ffmpeg_bin)
+
+        measurements: list[Measurement] = []
+        for i, (profile, jobs) in enumerate(candidate_grid(goal)):
+            work_dir = os.path.join(tmp_root, f"run_{i}")
+            m = measure(images, profile, jobs, base_options, work_dir)
+            logger.info(f"Autotune candidate: {m.as_dict()}")
+            measurements.append(m)
+            if on_measurement:
+                on_measurement(m)
+            shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+    best = pick_best(measurements, goal)
+    if best is not None and save:
+        tuned = replace(best.profile, jobs=best.jobs)
+        path = save_tuned_profile(
+            tuned,
+            {
+                "goal": goal,
+                "images": len(images),
+                "best": best.as_dict(),
+                "candidates": [m.as_dict() for m in measurements],
+            },
+        )
+        logger.info(f"Autotune saved tuned profile to {path}: {best.as_dict()}")
+    return best, measurements
@@ -0,0 +1,159 @@
+"""批量转换日志（journal），用于崩溃/重启后续跑。
+
+每个任务的状态变化（queued -> running -> done/failed）逐行追加为 JSON，第一行是批次头
+（输入路径和转换参数）。进程崩溃时最多丢失最后一行未写完的记录，加载时忽略即可。
+续跑时只跳过状态为 done、输出文件仍存在且大小一致、源图片未修改的任务，其余（未开始、运行中断、失败）重新转换。
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from archive_source import source_exists, source_stat
+from logging_config import logger
+
+JOURNAL_VERSION = 1
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class BatchJournal:
+    def __init__(self, path: str, header: Optional[dict] = None):
+        """打开 path 处的 journal；文件不存在时用 header 新建。"""
+        self.path = path
+        self.header: dict = {}
+        self.finished = False
+        self._lock = threading.Lock()
+        self._jobs: dict[str, dict] = {}
+        existed = self._load()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        if not existed:
+            self.header = dict(header or {})
+            self._append({"version": JOURNAL_VERSION, "created": time.time(), "header": self.header}, sync=True)
+
+    @classmethod
+    def create(cls, path: str, header: dict) -> "BatchJournal":
+        """新建 journal（覆盖同名旧文件）。"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return cls(path, header)
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return False
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                # 崩溃时写了一半的最后一行
+                continue
+            if "header" in rec:
+                self.header = rec["header"]
+            elif rec.get("event") == "finished":
+                self.finished = True
+            elif "path" in rec:
+                self._jobs[rec["path"]] = rec
+                self.finished = False
+        logger.info(f"Batch journal loaded: {self.path}, jobs={len(self._jobs)}, finished={self.finished}")
+        return True
+
+    def _append(self, rec: dict, sync: bool = False) -> None:
+        try:
+            self._file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+        except Exception:
+            logger.exception(f"Failed to write batch journal {self.path}")
+
+    def mark(self, path: str, state: str, **fields) -> None:
+        """记录任务状态；done/failed 会 fsync，保证掉电后也能知道哪些任务已完成。"""
+        rec = {"path": path, "state": state, **fields}
+        with self._lock:
+            self._jobs[path] = rec
+            self.finished = False
+            self._append(rec, sync=state in (DONE, FAILED))
+
+    def mark_finished(self) -> None:
+        """批次正常结束（包括用户取消）；未写此记录的 journal 视为被中断。"""
+        with self._lock:
+            self.finished = True
+            self._append({"event": "finished", "time": time.time()}, sync=True)
+
+    def state(self, path: str) -> Optional[str]:
+        with self._lock:
+            rec = self._jobs.get(path)
+        return rec.get("state") if rec else None
+
+    def output(self, path: str) -> str:
+        with self._lock:
+            rec = self._jobs.get(path)
+        return rec.get("output", "") if rec else ""
+
+    def is_done(self, path: str) -> bool:
+        """任务已完成、输出文件仍完整存在，且源图片此后没有修改。"""
+        with self._lock:
+            rec = self._jobs.get(path)
+        if not rec or rec.get("state") != DONE:
+            return False
+        try:
+            if os.path.getsize(rec.get("output", "")) != rec.get("size"):
+                return False
+            # 源图片在完成后被替换/修改过，需要重新转换
+            return not rec.get("source_mtime_ns") or source_stat(path)[0] == rec["source_mtime_ns"]
+        except OSError:
+            return False
+
+    def remaining(self, paths: list[str]) -> list[str]:
+        return [p for p in paths if not self.is_done(p)]
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            out: dict[str, int] = {}
+            for rec in self._jobs.values():
+                out[rec.get("state", "")] = out.get(rec.get("state", ""), 0) + 1
+            return out
+
+    def compact(self, prune_missing: bool = False) -> None:
+        """重写为批次头 + 每个任务的最后一条记录（长期运行的监视模式用，避免文件无限增长）。
+
+        prune_missing=True 时同时丢弃源文件已不存在的任务（监视目录中被删除的文件）。
+        """
+        with self._lock:
+            if prune_missing:
+                for path in [p for p in self._jobs if not source_exists(p)]:
+                    del self._jobs[path]
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"version": JOURNAL_VERSION, "created": time.time(), "header": self.header},
+                                       ensure_ascii=False) + "\n")
+                    for rec in self._jobs.values():
+                        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._file.close()
+                os.replace(tmp, self.path)
+            except Exception:
+                logger.exception(f"Failed to compact batch journal {self.path}")
+            finally:
+                if self._file.closed:
+                    self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._file.close()
+            except OSError:
+                pass
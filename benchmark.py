@@ -0,0 +1,478 @@
+"""可复现的性能基准。
+
+在本地生成合成语料（JPEG/PNG/BMP/TIFF/WebP，缩略图到 100 MP，含/不含透明通道），
+先测量文件头索引的探测速率，再分别跑图片转视频和 WebP 格式转换两条流水线，记录单张延迟分位数、批量吞吐、
+FFmpeg 与 Python 进程峰值内存和输出大小，结果写成 JSON；compare 对比两份结果并标出回退项。
+
+语料内容由固定种子生成，同一 Pillow 版本下逐字节一致，生成后按 manifest 复用。
+每个阶段在独立的 spawn 子进程中运行，Python 峰值内存不受语料生成和前一阶段影响。
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import converter_engine as engine
+from ffmpeg_runner import popen_kwargs
+from image_metadata import PROBE_THREADS, HeaderIndex
+from logging_config import logger
+from metrics import latency_stats, percentile
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，Python 峰值内存记为 None
+    resource = None
+
+RESULT_VERSION = 1
+CORPUS_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+
+SIZE_TIERS: dict[str, tuple[int, int]] = {
+    "thumb": (160, 120),
+    "vga": (640, 480),
+    "fhd": (1920, 1080),
+    "12mp": (4000, 3000),
+    "100mp": (12000, 8400),
+}
+# 100 MP 档单张 BMP/TIFF 约 300-400 MB，默认不生成，--sizes all 时包含
+DEFAULT_TIERS = ("thumb", "vga", "fhd", "12mp")
+
+# (扩展名, Pillow 格式, 是否带透明通道)
+FORMAT_VARIANTS = [
+    ("jpg", "JPEG", False),
+    ("png", "PNG", False),
+    ("png", "PNG", True),
+    ("bmp", "BMP", False),
+    ("tiff", "TIFF", False),
+    ("tiff", "TIFF", True),
+    ("webp", "WEBP", False),
+    ("webp", "WEBP", True),
+]
+
+STAGE_PROBE = "header_probe"
+STAGE_VIDEO = "video"
+IMAGE_STAGES = {"image_png": "png", "image_jpg": "jpg"}
+
+# compare：指标 -> 方向（+1 越大越好，-1 越小越好）
+COMPARED_METRICS = {
+    "throughput": +1,
+    "latency.p50": -1,
+    "latency.p95": -1,
+    "ffmpeg_peak_rss_kb": -1,
+    "python_peak_rss_kb": -1,
+    "output_bytes": -1,
+}
+DEFAULT_THRESHOLD = 10.0
+
+
+@dataclass
+class CorpusImage:
+    path: str
+    tier: str
+    format: str
+    alpha: bool
+    width: int
+    height: int
+    size: int
+
+
+def parse_tiers(text: str) -> list[str]:
+    if not text or text == "default":
+        return list(DEFAULT_TIERS)
+    if text == "all":
+        return list(SIZE_TIERS)
+    tiers = [t.strip() for t in text.split(",") if t.strip()]
+    unknown = [t for t in tiers if t not in SIZE_TIERS]
+    if unknown:
+        raise ValueError(f"unknown size tiers: {', '.join(unknown)}")
+    return tiers
+
+
+def _synthetic_image(size: tuple[int, int], alpha: bool, seed: int):
+    """渐变 + 分形 + 固定种子噪声纹理：既有平滑区域也有细节，压缩表现接近照片。"""
+    from PIL import Image
+
+    w, h = size
+    base_w = min(w, 1024)
+    base_h = max(1, round(h * base_w / w))
+    gradient = Image.linear_gradient("L").resize((base_w, base_h))
+    radial = Image.radial_gradient("L").resize((base_w, base_h))
+    fractal = Image.effect_mandelbrot((base_w, base_h), (-2.2, -1.2, 1.0, 1.2), 60)
+    im = Image.merge("RGB", (gradient, fractal, radial))
+    if im.size != size:
+        im = im.resize(size, Image.Resampling.BILINEAR)
+
+    rng = random.Random(seed)
+    tile_size = 256
+    noise_tile = Image.frombytes("L", (tile_size, tile_size), rng.randbytes(tile_size * tile_size))
+    noise = Image.new("L", size)
+    for y in range(0, h, tile_size):
+        for x in range(0, w, tile_size):
+            noise.paste(noise_tile, (x, y))
+    im = Image.blend(im, Image.merge("RGB", (noise, noise, noise)), 0.12)
+
+    if alpha:
+        mask = Image.radial_gradient("L").resize(size, Image.Resampling.BILINEAR)
+        im.putalpha(Image.eval(mask, lambda v: 255 - v))
+    return im
+
+
+def _corpus_signature(tiers: list[str]) -> dict:
+    from PIL import __version__ as pillow_version
+
+    return {"corpus_version": CORPUS_VERSION, "pillow": pillow_version, "tiers": tiers}
+
+
+def _write_corpus_image(dest_dir: str, tier: str, seed: int, ext: str, pil_format: str, alpha: bool) -> CorpusImage:
+    w, h = SIZE_TIERS[tier]
+    # 文件名主干各不相同，否则同一尺寸档的多种格式会输出到同一个 <stem>.mp4
+    path = os.path.join(dest_dir, f"{tier}_{'rgba' if alpha else 'rgb'}_{ext}.{ext}")
+    im = _synthetic_image((w, h), alpha, seed)
+    save_args = {"quality": 90} if pil_format in ("JPEG", "WEBP") else {}
+    im.save(path, pil_format, **save_args)
+    return CorpusImage(path=path, tier=tier, format=ext, alpha=alpha, width=w, height=h, size=os.path.getsize(path))
+
+
+def generate_corpus(
+    dest_dir: str,
+    tiers: Optional[list[str]] = None,
+    on_image: Optional[Callable[[CorpusImage], None]] = None,
+) -> list[CorpusImage]:
+    """生成（或复用）合成语料；manifest 与当前参数一致且文件都在时直接返回。"""
+    tiers = tiers or list(DEFAULT_TIERS)
+    os.makedirs(dest_dir, exist_ok=True)
+    manifest_path = os.path.join(dest_dir, MANIFEST_NAME)
+    signature = _corpus_signature(tiers)
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("signature") == signature:
+            images = [CorpusImage(**item) for item in manifest.get("images", [])]
+            if images and all(os.path.isfile(img.path) for img in images):
+                return images
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logger.exception(f"Invalid benchmark manifest {manifest_path}; regenerating corpus")
+
+    specs = [
+        (tier, seed, ext, pil_format, alpha)
+        for tier in tiers
+        for seed, (ext, pil_format, alpha) in enumerate(FORMAT_VARIANTS)
+    ]
+    images: list[CorpusImage] = []
+    # 在独立进程中生成：大图占用的内存不计入本进程（之后 spawn 的阶段进程会继承 fork 时的峰值）
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(_write_corpus_image, dest_dir, *spec) for spec in specs]
+        for fut in futures:
+            img = fut.result()
+            images.append(img)
+            logger.info(f"Benchmark corpus image written: {img.path} ({img.size} bytes)")
+            if on_image:
+                on_image(img)
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"signature": signature, "images": [asdict(i) for i in images]}, f, ensure_ascii=False, indent=2)
+    return images
+
+
+def _maxrss_kb(children: bool = False) -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _run_video_stage(images: list[dict], options: engine.ConvertOptions) -> dict:
+    per_image: list[dict] = []
+
+    def on_result(res: engine.JobResult):
+        meta = images[res.index]
+        per_image.append({
+            "name": os.path.basename(meta["path"]),
+            "tier": meta["tier"],
+            "format": meta["format"],
+            "alpha": meta["alpha"],
+            "ok": res.ok,
+            "elapsed": round(res.elapsed, 4),
+            "decode_time": round(res.decode_time, 4),
+            "output_size": res.output_size,
+            "peak_rss_kb": res.peak_rss_kb,
+        })
+
+    summary = engine.run_batch([m["path"] for m in images], options, on_result=on_result)
+    rss = [r["peak_rss_kb"] for r in per_image if r["peak_rss_kb"]]
+    return {
+        "total": summary.total,
+        "ok": summary.ok,
+        "fail": summary.fail,
+        "elapsed": round(summary.elapsed, 4),
+        "throughput": round(summary.images_per_second, 3),
+        "output_bytes": summary.output_bytes,
+        "ffmpeg_peak_rss_kb": max(rss) if rss else None,
+        # ffmpeg 也是本进程的子进程，这里只统计 Python 自身
+        "python_peak_rss_kb": _maxrss_kb(),
+        "per_image": per_image,
+    }
+
+
+def _run_probe_stage(images: list[dict]) -> dict:
+    """建立整个语料的文件头索引（与 convert --longest-first 相同的并行探测），吞吐即探测速率。
+
+    尺寸或透明通道与语料 manifest 不符的记为失败。
+    """
+    headers = HeaderIndex()
+    latencies: dict[str, float] = {}
+
+    def probe(path: str):
+        t = time.perf_counter()
+        info = headers.get(path)
+        latencies[path] = time.perf_counter() - t
+        return info
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=PROBE_THREADS) as pool:
+        infos = list(pool.map(probe, [m["path"] for m in images]))
+    elapsed = time.perf_counter() - started
+
+    per_image = []
+    for meta, info in zip(images, infos):
+        per_image.append({
+            "name": os.path.basename(meta["path"]),
+            "tier": meta["tier"],
+            "format": meta["format"],
+            "alpha": meta["alpha"],
+            "ok": info is not None and (info.width, info.height, info.has_alpha) == (
+                meta["width"], meta["height"], meta["alpha"]
+            ),
+            "elapsed": round(latencies[meta["path"]], 6),
+        })
+    ok = sum(1 for r in per_image if r["ok"])
+    return {
+        "total": len(images),
+        "ok": ok,
+        "fail": len(images) - ok,
+        "elapsed": round(elapsed, 4),
+        "throughput": round(len(images) / elapsed, 3) if elapsed > 0 else 0.0,
+        "output_bytes": 0,
+        "ffmpeg_peak_rss_kb": None,
+        "python_peak_rss_kb": _maxrss_kb(),
+        "per_image": per_image,
+    }
+
+
+def _run_image_stage(images: list[dict], output_dir: str, fmt: str, jobs: int) -> dict:
+    per_image: list[dict] = []
+
+    def on_result(res: engine.ImageResult):
+        meta = images[res.index]
+        per_image.append({
+            "name": os.path.basename(meta["path"]),
+            "tier": meta["tier"],
+            "alpha": meta["alpha"],
+            "ok": res.ok,
+            "elapsed": round(res.elapsed, 4),
+            "output_size": res.output_bytes,
+            "error": res.error,
+        })
+
+    summary = engine.convert_images([m["path"] for m in images], output_dir, fmt, jobs=jobs, on_result=on_result)
+    return {
+        "total": summary.total,
+        "ok": summary.ok,
+        "fail": summary.fail,
+        "elapsed": round(summary.elapsed, 4),
+        "throughput": round(summary.files_per_second, 3),
+        "output_bytes": summary.output_bytes,
+        "encode_time": round(summary.encode_time, 4),
+        "ffmpeg_peak_rss_kb": None,
+        # 进程池工作进程是本进程的子进程（已全部回收）
+        "python_peak_rss_kb": max(_maxrss_kb() or 0, _maxrss_kb(children=True) or 0) or None,
+        "per_image": per_image,
+    }
+
+
+def run_stage(stage: str, images: list[dict], options: engine.ConvertOptions, work_dir: str) -> dict:
+    """执行一个阶段（在 spawn 子进程中调用）。"""
+    output_dir = os.path.join(work_dir, stage)
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        if stage == STAGE_PROBE:
+            return _run_probe_stage(images)
+        if stage == STAGE_VIDEO:
+            return _run_video_stage(images, replace(options, output_dir=output_dir, cache_dir=""))
+        return _run_image_stage(images, output_dir, IMAGE_STAGES[stage], options.jobs)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def _merge_runs(runs: list[dict]) -> dict:
+    """多次重复：延迟合并计算分位数，吞吐取中位数，内存取最大值。"""
+    per_image = [r for run in runs for r in run["per_image"]]
+    latencies = [r["elapsed"] for r in per_image if r["ok"]]
+    ffmpeg_rss = [run["ffmpeg_peak_rss_kb"] for run in runs if run["ffmpeg_peak_rss_kb"]]
+    python_rss = [run["python_peak_rss_kb"] for run in runs if run["python_peak_rss_kb"]]
+    last = runs[-1]
+    return {
+        "total": last["total"],
+        "ok": last["ok"],
+        "fail": max(run["fail"] for run in runs),
+        "repeat": len(runs),
+        "elapsed": round(percentile([run["elapsed"] for run in runs], 50), 4),
+        "throughput": round(percentile([run["throughput"] for run in runs], 50), 3),
+        "latency": latency_stats(latencies),
+        "output_bytes": last["output_bytes"],
+        "ffmpeg_peak_rss_kb": max(ffmpeg_rss) if ffmpeg_rss else None,
+        "python_peak_rss_kb": max(python_rss) if python_rss else None,
+        "per_image": last["per_image"],
+    }
+
+
+def _ffmpeg_version(ffmpeg_bin: str) -> str:
+    try:
+        out = subprocess.run(
+            [ffmpeg_bin, "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, **popen_kwargs()
+        ).stdout
+        return out.decode("utf-8", errors="replace").splitlines()[0] if out else ""
+    except OSError:
+        return ""
+
+
+def machine_info(ffmpeg_bin: str) -> dict:
+    try:
+        from PIL import __version__ as pillow_version
+    except ImportError:
+        pillow_version = ""
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": _ffmpeg_version(ffmpeg_bin),
+        "pillow": pillow_version,
+    }
+
+
+def run_benchmark(
+    corpus_dir: str,
+    options: engine.ConvertOptions,
+    tiers: Optional[list[str]] = None,
+    stages: Optional[list[str]] = None,
+    repeat: int = 1,
+    on_stage: Optional[Callable[[str, dict], None]] = None,
+    on_image: Optional[Callable[[CorpusImage], None]] = None,
+) -> dict:
+    """生成语料并运行各阶段，返回可直接 json.dump 的结果。"""
+    tiers = tiers or list(DEFAULT_TIERS)
+    stages = stages or [STAGE_PROBE, STAGE_VIDEO, *IMAGE_STAGES]
+    corpus = generate_corpus(corpus_dir, tiers, on_image=on_image)
+    corpus_dicts = [asdict(i) for i in corpus]
+    webps = [i for i in corpus_dicts if i["format"] == "webp"]
+
+    result = {
+        "version": RESULT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": machine_info(options.ffmpeg_bin),
+        "config": {
+            "profile": asdict(options.profile),
+            "duration": options.duration,
+            "jobs": options.jobs,
+            "ingest": options.ingest,
+            "fast_still": options.fast_still,
+            "tiers": tiers,
+            "repeat": repeat,
+        },
+        "corpus": {
+            "dir": os.path.abspath(corpus_dir),
+            "images": len(corpus),
+            "bytes": sum(i.size for i in corpus),
+        },
+        "stages": {},
+    }
+
+    work_dir = tempfile.mkdtemp(prefix="pic_to_video_bench_")
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        for stage in stages:
+            images = webps if stage in IMAGE_STAGES else corpus_dicts
+            runs = []
+            for _ in range(max(1, repeat)):
+                # 每次都在全新的进程中运行，峰值内存互不影响
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    runs.append(pool.submit(run_stage, stage, images, options, work_dir).result())
+            merged = _merge_runs(runs)
+            result["stages"][stage] = merged
+            logger.info(
+                f"Benchmark stage {stage}: throughput={merged['throughput']}/s, "
+                f"p50={merged['latency']['p50']}s, p95={merged['latency']['p95']}s, fail={merged['fail']}"
+            )
+            if on_stage:
+                on_stage(stage, merged)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+
+def save_result(result: dict, path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def load_result(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != RESULT_VERSION:
+        raise ValueError(f"unsupported benchmark result version in {path}: {data.get('version')}")
+    return data
+
+
+def _metric(stage: dict, name: str) -> Optional[float]:
+    value = stage
+    for part in name.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value if isinstance(value, (int, float)) else None
+
+
+@dataclass
+class MetricDelta:
+    stage: str
+    metric: str
+    base: float
+    new: float
+    change_pct: float
+    regression: bool
+
+
+def compare_results(base: dict, new: dict, threshold_pct: float = DEFAULT_THRESHOLD) -> list[MetricDelta]:
+    """逐阶段对比；按指标方向变差超过 threshold_pct% 的记为回退。新增失败任务总是回退。"""
+    deltas: list[MetricDelta] = []
+    for stage, new_stage in new.get("stages", {}).items():
+        base_stage = base.get("stages", {}).get(stage)
+        if base_stage is None:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            b = _metric(base_stage, metric)
+            n = _metric(new_stage, metric)
+            if b is None or n is None or b == 0:
+                continue
+            change = (n - b) * 100.0 / b
+            deltas.append(MetricDelta(stage, metric, b, n, change, change * direction < -threshold_pct))
+        b_fail, n_fail = base_stage.get("fail", 0), new_stage.get("fail", 0)
+        if n_fail != b_fail:
+            deltas.append(MetricDelta(stage, "fail", b_fail, n_fail, 0.0, n_fail > b_fail))
+    return deltas
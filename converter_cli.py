@@ -0,0 +1,705 @@
+"""命令行入口（无需显示器，可用于 cron / CI）。
+
+用法示例：
+    python -m converter_cli convert <目录或图片...> --jobs 8 --duration 3 --out DIR
+    python -m converter_cli convert <目录或图片...> --journal batch.jsonl   # 中断后：resume batch.jsonl
+    python -m converter_cli convert <目录或图片...> --renditions 1080,720,480,480:webm
+    python -m converter_cli convert bundle.zip images.tar.gz --out DIR   # 直接读取压缩包中的图片
+    python -m converter_cli watch <目录...> --out DIR --settle 2
+    python -m converter_cli serve --port 8765 --jobs 4   # curl --data-binary @a.png 'localhost:8765/jobs?name=a.png'
+    python -m converter_cli image-format <目录或图片...> --format png --out DIR
+    python -m converter_cli image-format <目录或图片...> --profile all --out DIR   # 对比各配置的耗时与体积
+    python -m converter_cli benchmark --output bench.json
+    python -m converter_cli benchmark-compare base.json new.json
+    python -m converter_cli --metrics-jsonl spans.jsonl --metrics-prom /var/lib/node_exporter/pic_to_video.prom convert DIR
+
+退出码：0 全部成功；1 存在失败任务；2 参数错误/没有可转换的文件；3 未找到 FFmpeg。
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+from typing import Optional
+
+import converter_engine as engine
+import http_service
+import metrics
+import watch_folder
+from batch_journal import BatchJournal
+from dir_scanner import DirIndex, default_index_path
+from image_metadata import HeaderIndex, default_header_index_path
+from image_profiles import DEFAULT_IMAGE_PROFILE, IMAGE_FORMATS, IMAGE_PROFILE_ALL, IMAGE_PROFILES
+from encoder_profiles import DEFAULT_PROFILE, available_profiles, get_profile, tuned_profile_path
+from logging_config import logger
+from memory_scheduler import MEMORY_BUDGET_AUTO
+from output_cache import DEFAULT_MAX_BYTES, app_cache_dir, default_cache_dir
+from renditions import parse_ladder
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+EXIT_NO_FFMPEG = 3
+
+
+def _print(text: str, quiet: bool = False):
+    if not quiet:
+        print(text, flush=True)
+
+
+def _cache_dir(args) -> str:
+    """输出缓存默认关闭：--cache 使用默认目录，--cache-dir 使用指定目录。"""
+    if args.no_cache or not (args.cache or args.cache_dir):
+        return ""
+    return args.cache_dir or default_cache_dir()
+
+
+def _convert_options(args) -> engine.ConvertOptions:
+    profile = get_profile(args.profile)
+    return engine.ConvertOptions(
+        duration=args.duration,
+        output_dir=args.out or "",
+        jobs=args.jobs or profile.jobs or engine.default_jobs(),
+        profile=profile,
+        ffmpeg_bin=args.ffmpeg,
+        fast_still=not args.no_fast_still,
+        cache_dir=_cache_dir(args),
+        cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+        ingest=args.ingest,
+        memory_budget=args.mem_budget_mb * 1024 * 1024 if args.mem_budget_mb >= 0 else MEMORY_BUDGET_AUTO,
+        renditions=parse_ladder(args.renditions),
+        pack_max=max(1, getattr(args, "pack", 1)),
+    )
+
+
+def cmd_convert(args) -> int:
+    if not engine.check_ffmpeg(args.ffmpeg):
+        print("未找到 FFmpeg。请确保已安装 FFmpeg 并添加到系统 PATH 环境变量中。", file=sys.stderr)
+        return EXIT_NO_FFMPEG
+
+    # 边扫描边转换：扫描到的图片立即进入转换队列
+    index = DirIndex(args.dir_index) if args.dir_index else None
+    started_paths: dict[int, str] = {}
+
+    options = _convert_options(args)
+    if args.slideshow:
+        return _convert_slideshow(args, options, engine.collect_images(args.paths, index))
+
+    journal = None
+    if args.journal:
+        journal = BatchJournal(args.journal, header={"args": _journal_args(args)})
+        done = journal.counts().get("done", 0)
+        if done:
+            _print(f"续跑：journal 中已有 {done} 张完成，输出仍存在的将跳过", args.quiet)
+
+    files = engine.iter_collect_images(args.paths, index)
+    headers = HeaderIndex(args.header_index) if args.longest_first or args.header_index else None
+    if args.longest_first:
+        # 需要完整队列才能排序：先扫描完并读取全部文件头，再开始转换
+        files = engine.order_longest_first(files, headers)
+        _print(f"文件头索引：{len(files)} 张，新探测 {headers.probed} 张，索引命中 {headers.hits} 张；按耗时从大到小排序", args.quiet)
+
+    _print(f"开始批量转换：并行 {options.jobs} 个任务，编码配置 {args.profile}", args.quiet)
+
+    def on_result(res: engine.JobResult):
+        status = "OK  " if res.ok else "FAIL"
+        decode = f", 解码 {res.decode_time:.2f}s" if res.decode_time else ""
+        retried = ", 内存不足已重试" if res.oom_retried else ""
+        _print(f"[{res.index + 1}] {status} {res.input_path} ({res.elapsed:.2f}s{decode}{retried})", args.quiet)
+        if not res.ok:
+            print(res.log, file=sys.stderr)
+
+    def on_progress(idx: int, progress):
+        name = os.path.basename(started_paths.get(idx, ""))
+        print(f"[{idx + 1}] {name} {progress.describe()}", file=sys.stderr, flush=True)
+
+    try:
+        summary = engine.run_batch(
+            files, options, on_result=on_result,
+            on_progress=on_progress if args.progress else None,
+            on_start=started_paths.__setitem__,
+            journal=journal,
+            headers=headers,
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+        if headers is not None:
+            headers.save()
+    if summary.total == 0 and summary.skipped == 0:
+        print("未找到支持的图片文件（支持：jpg/png/bmp/tiff/webp/gif，可在 zip/tar 压缩包内）。", file=sys.stderr)
+        return EXIT_USAGE
+    if summary.skipped:
+        print(f"按 journal 跳过已完成 {summary.skipped} 张", flush=True)
+    print(
+        f"批量完成：共 {summary.total} 张，成功 {summary.ok}，失败 {summary.fail}，耗时 {summary.elapsed:.2f}s，"
+        f"吞吐 {summary.images_per_second:.2f} 张/秒，输出 {summary.output_bytes} bytes",
+        flush=True,
+    )
+    if summary.memory_budget:
+        print(
+            f"内存预算 {summary.memory_budget // (1024 * 1024)} MB，预算占用峰值 {summary.memory_peak // (1024 * 1024)} MB，"
+            f"内存不足重试 {summary.oom_retries} 次",
+            flush=True,
+        )
+    if options.cache_dir:
+        print(
+            f"缓存命中 {summary.cache_hits}，未命中 {summary.cache_misses}，节省 {summary.bytes_saved} bytes",
+            flush=True,
+        )
+    return EXIT_OK if summary.fail == 0 else EXIT_FAILURES
+
+
+def _convert_slideshow(args, options: engine.ConvertOptions, files: list[str]) -> int:
+    if not files:
+        print("未找到支持的图片文件（支持：jpg/png/bmp/tiff/webp/gif，可在 zip/tar 压缩包内）。", file=sys.stderr)
+        return EXIT_USAGE
+    if options.renditions:
+        print("幻灯片模式只输出单个视频，已忽略 --renditions。", file=sys.stderr)
+
+    _print(f"开始生成幻灯片：共 {len(files)} 张图片，每张 {options.duration} 秒 -> {args.slideshow}", args.quiet)
+
+    def on_progress(progress):
+        print(f"{os.path.basename(args.slideshow)} {progress.describe()}", file=sys.stderr, flush=True)
+
+    res = engine.convert_slideshow(
+        files, args.slideshow, options, on_progress=on_progress if args.progress else None
+    )
+    if not res.ok:
+        print(res.log, file=sys.stderr)
+    print(
+        f"幻灯片{'完成' if res.ok else '失败'}：{len(files)} 张图片，耗时 {res.elapsed:.2f}s，"
+        f"吞吐 {len(files) / res.elapsed if res.elapsed > 0 else 0.0:.2f} 张/秒，输出 {res.output_size} bytes",
+        flush=True,
+    )
+    return EXIT_OK if res.ok else EXIT_FAILURES
+
+
+def cmd_autotune(args) -> int:
+    import autotune
+
+    if not engine.check_ffmpeg(args.ffmpeg):
+        print("未找到 FFmpeg。请确保已安装 FFmpeg 并添加到系统 PATH 环境变量中。", file=sys.stderr)
+        return EXIT_NO_FFMPEG
+
+    images = engine.collect_images(args.images) if args.images else None
+    if args.images and not images:
+        print("校准目录中未找到支持的图片文件。", file=sys.stderr)
+        return EXIT_USAGE
+
+    base = engine.ConvertOptions(duration=args.duration, ffmpeg_bin=args.ffmpeg)
+    print(f"开始自动调优（目标：{args.goal}）...", flush=True)
+    best, _measurements = autotune.autotune(
+        goal=args.goal,
+        images=images,
+        base_options=base,
+        on_measurement=lambda m: print("  " + m.describe(), flush=True),
+        save=not args.no_save,
+    )
+    if best is None:
+        print("所有候选配置均失败，未保存调优结果。", file=sys.stderr)
+        return EXIT_FAILURES
+
+    print("最佳配置：" + best.describe(), flush=True)
+    if not args.no_save:
+        print(f"已保存为编码配置 \"tuned\"：{tuned_profile_path()}（convert --profile tuned 使用）", flush=True)
+    return EXIT_OK
+
+
+def cmd_benchmark(args) -> int:
+    import benchmark
+
+    if not engine.check_ffmpeg(args.ffmpeg):
+        print("未找到 FFmpeg。请确保已安装 FFmpeg 并添加到系统 PATH 环境变量中。", file=sys.stderr)
+        return EXIT_NO_FFMPEG
+    try:
+        tiers = benchmark.parse_tiers(args.sizes)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_USAGE
+
+    profile = get_profile(args.profile)
+    options = engine.ConvertOptions(
+        duration=args.duration,
+        jobs=args.jobs or profile.jobs or engine.default_jobs(),
+        profile=profile,
+        ffmpeg_bin=args.ffmpeg,
+        ingest=args.ingest,
+    )
+
+    def on_stage(stage: str, s: dict):
+        lat = s["latency"]
+        def mb(kb):
+            return f"{kb / 1024:.0f} MB" if kb else "n/a"
+
+        print(
+            f"  {stage:<10} {s['ok']}/{s['total']} 成功  吞吐 {s['throughput']:.2f}/秒  "
+            f"延迟 p50 {lat['p50']:.3f}s p95 {lat['p95']:.3f}s p99 {lat['p99']:.3f}s  "
+            f"FFmpeg 峰值 {mb(s['ffmpeg_peak_rss_kb'])}  Python 峰值 {mb(s['python_peak_rss_kb'])}  输出 {s['output_bytes']} bytes",
+            flush=True,
+        )
+
+    print(f"准备基准语料：{args.corpus}（尺寸档：{', '.join(tiers)}）", flush=True)
+    try:
+        result = benchmark.run_benchmark(
+            args.corpus, options, tiers=tiers, stages=args.stage or None, repeat=args.repeat, on_stage=on_stage,
+            on_image=lambda img: _print(f"  生成 {os.path.basename(img.path)}（{img.size} bytes）", args.quiet),
+        )
+    except ImportError:
+        print("生成基准语料需要 Pillow（pip install pillow）。", file=sys.stderr)
+        return EXIT_USAGE
+
+    benchmark.save_result(result, args.output)
+    print(f"结果已写入：{args.output}", flush=True)
+
+    if args.baseline:
+        return _report_comparison(benchmark.load_result(args.baseline), result, args.threshold)
+    failed = sum(s["fail"] for s in result["stages"].values())
+    return EXIT_OK if failed == 0 else EXIT_FAILURES
+
+
+def _report_comparison(base: dict, new: dict, threshold: float) -> int:
+    import benchmark
+
+    deltas = benchmark.compare_results(base, new, threshold)
+    if not deltas:
+        print("两份结果没有可对比的阶段。", file=sys.stderr)
+        return EXIT_USAGE
+    for d in deltas:
+        mark = "回退" if d.regression else "    "
+        print(f"{mark} {d.stage:<10} {d.metric:<20} {d.base:>14.3f} -> {d.new:>14.3f}  ({d.change_pct:+.1f}%)")
+    regressions = [d for d in deltas if d.regression]
+    print(f"共 {len(regressions)} 项回退（阈值 {threshold:.1f}%）", flush=True)
+    return EXIT_FAILURES if regressions else EXIT_OK
+
+
+def cmd_benchmark_compare(args) -> int:
+    import benchmark
+
+    try:
+        base = benchmark.load_result(args.base)
+        new = benchmark.load_result(args.new)
+    except (OSError, ValueError) as e:
+        print(f"无法读取基准结果：{e}", file=sys.stderr)
+        return EXIT_USAGE
+    return _report_comparison(base, new, args.threshold)
+
+
+def cmd_image_format(args) -> int:
+    webps = [p for p in engine.collect_images(args.paths) if p.lower().endswith('.webp')]
+    if not webps:
+        print("未找到 WebP 文件。", file=sys.stderr)
+        return EXIT_USAGE
+
+    def on_result(res: engine.ImageResult):
+        if res.ok:
+            _print(f"成功：{res.input_path} -> {res.output_path}", args.quiet)
+        else:
+            print(f"失败：{res.input_path}，原因：{res.error}", file=sys.stderr)
+
+    names = list(IMAGE_PROFILES) if args.profile == IMAGE_PROFILE_ALL else [args.profile]
+    summaries = []
+    for name in names:
+        # all：每个配置写到输出目录下的同名子目录，互不覆盖
+        out = args.out or ""
+        if len(names) > 1:
+            out = os.path.join(out or os.getcwd(), name)
+        summaries.append(engine.convert_images(
+            webps, out, args.format, jobs=args.jobs, on_result=on_result, profile=IMAGE_PROFILES[name],
+        ))
+    for summary in summaries:
+        print(
+            f"图片转换完成（{summary.profile}）：成功 {summary.ok}，失败 {summary.fail}，耗时 {summary.elapsed:.2f}s，"
+            f"编码 {summary.encode_time:.2f}s，输出 {summary.output_bytes} bytes，"
+            f"{summary.files_per_second:.2f} 个/秒，{summary.mb_per_second:.2f} MB/s",
+            flush=True,
+        )
+    return EXIT_OK if all(s.fail == 0 for s in summaries) else EXIT_FAILURES
+
+
+# 写入 journal 的参数中不包含这些（不影响输出，或续跑时由 resume 重新指定）
+_JOURNAL_SKIP_ARGS = {"func", "command", "journal", "no_journal", "metrics_jsonl", "metrics_prom"}
+
+
+def _journal_args(args) -> dict:
+    data = {k: v for k, v in vars(args).items() if k not in _JOURNAL_SKIP_ARGS}
+    # watch 的监视目录同样记为 paths，可以用 resume 一次性补转
+    data["paths"] = [os.path.abspath(p) for p in (getattr(args, "paths", None) or args.dirs)]
+    if data.get("out"):
+        data["out"] = os.path.abspath(data["out"])
+    return data
+
+
+def cmd_resume(args) -> int:
+    if not os.path.isfile(args.journal):
+        print(f"journal 不存在：{args.journal}", file=sys.stderr)
+        return EXIT_USAGE
+    journal = BatchJournal(args.journal)
+    stored = journal.header.get("args") or {}
+    journal.close()
+    if not stored.get("paths"):
+        print(f"journal 中没有批次参数：{args.journal}", file=sys.stderr)
+        return EXIT_USAGE
+
+    # 先按 convert 的默认值解析，再用 journal 中记录的参数覆盖
+    convert_args = build_parser().parse_args(["convert", *stored["paths"]])
+    for key, value in stored.items():
+        setattr(convert_args, key, value)
+    convert_args.journal = args.journal
+    if args.jobs:
+        convert_args.jobs = args.jobs
+    convert_args.quiet = convert_args.quiet or args.quiet
+    return cmd_convert(convert_args)
+
+
+def _ladder_arg(value: str) -> str:
+    # 保留原始字符串（journal 中按 JSON 记录参数），这里只做校验
+    try:
+        parse_ladder(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def _add_encode_args(p: argparse.ArgumentParser) -> None:
+    """convert 与 watch 共用的转换参数。"""
+    p.add_argument("--jobs", "-j", type=int, default=0, help="并行 FFmpeg 任务数（默认取编码配置推荐值或 CPU 核心数）")
+    p.add_argument("--duration", "-d", type=int, default=3, help="视频时长（秒）；动图不足该时长时循环播放到该时长")
+    p.add_argument("--profile", "-p", choices=available_profiles(), default=DEFAULT_PROFILE, help="编码配置")
+    p.add_argument("--out", "-o", default="", help="输出目录（默认与图片同目录）")
+    p.add_argument("--ffmpeg", default="ffmpeg", help="FFmpeg 可执行文件路径")
+    p.add_argument("--no-fast-still", action="store_true", help="关闭静态图快速路径（按 30fps 逐帧编码）")
+    p.add_argument(
+        "--ingest",
+        choices=[engine.INGEST_FFMPEG, engine.INGEST_PILLOW],
+        default=engine.INGEST_FFMPEG,
+        help="图片解码方式：ffmpeg 直接读取，或 pillow 预解码缩放后通过管道传入（大图省内存）",
+    )
+    p.add_argument(
+        "--mem-budget-mb",
+        type=int,
+        default=-1,
+        help="按图片尺寸估算内存并在该预算内准入任务（MB；默认取可用内存的 70%%，0 表示不限制）",
+    )
+    p.add_argument(
+        "--cache",
+        action="store_true",
+        help=f"启用输出缓存：相同图片、相同参数直接复用上次的输出（默认关闭；缓存目录默认 {default_cache_dir()}）",
+    )
+    p.add_argument("--cache-dir", default="", help="输出缓存目录（指定即启用缓存）")
+    p.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="缓存容量上限（MB）")
+    p.add_argument("--no-cache", action="store_true", help="不使用输出缓存（默认即不使用，可覆盖 --cache/--cache-dir）")
+    p.add_argument(
+        "--renditions",
+        type=_ladder_arg,
+        default="",
+        metavar="SPEC",
+        help="一次解码输出多个分辨率，如 1080,720,480,720:webm（输出 名称_720p.mp4 等；不经过输出缓存）",
+    )
+
+
+def _watch_journal_path(args) -> str:
+    """按监视目录 + 输出目录区分的默认 journal，重启后不重复转换已完成的图片。"""
+    key = json.dumps([sorted(os.path.abspath(r) for r in args.dirs), os.path.abspath(args.out) if args.out else ""])
+    return os.path.join(app_cache_dir(), "watch", hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".jsonl")
+
+
+def _format_latency(stats: dict) -> str:
+    return f"p50 {stats['p50']:.2f}s，p95 {stats['p95']:.2f}s，最大 {stats['max']:.2f}s"
+
+
+def cmd_watch(args) -> int:
+    if not engine.check_ffmpeg(args.ffmpeg):
+        print("未找到 FFmpeg。请确保已安装 FFmpeg 并添加到系统 PATH 环境变量中。", file=sys.stderr)
+        return EXIT_NO_FFMPEG
+    missing = [d for d in args.dirs if not os.path.isdir(d)]
+    if missing:
+        print(f"目录不存在：{', '.join(missing)}", file=sys.stderr)
+        return EXIT_USAGE
+
+    options = _convert_options(args)
+    journal = None
+    if not args.no_journal:
+        journal = BatchJournal(args.journal or _watch_journal_path(args), header={"args": _journal_args(args)})
+        journal.compact(prune_missing=True)
+
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    backend = "系统通知" if watch_folder.Observer is not None and not args.polling else "轮询"
+    _print(
+        f"开始监视 {', '.join(args.dirs)}（{backend}，去抖 {args.settle:g}s，并行 {options.jobs}），按 Ctrl+C 停止",
+        args.quiet,
+    )
+
+    def on_result(res: engine.JobResult, latency: float):
+        status = "OK  " if res.ok else "FAIL"
+        _print(f"[{res.index + 1}] {status} {res.input_path}（到达 -> MP4 {latency:.2f}s）", args.quiet)
+        if not res.ok:
+            print(res.log, file=sys.stderr)
+
+    def on_report(summary: watch_folder.WatchSummary, settling: int):
+        _print(
+            f"已转换 {summary.ok}，失败 {summary.fail}，写入中 {settling}；"
+            f"延迟 {_format_latency(summary.latency_stats())}",
+            args.quiet,
+        )
+
+    try:
+        summary = watch_folder.watch(
+            args.dirs, options, stop_event,
+            on_result=on_result,
+            on_report=on_report,
+            report_interval=args.report_interval,
+            settle=args.settle,
+            poll_interval=args.poll_interval,
+            use_native=not args.polling,
+            include_existing=not args.new_only,
+            journal=journal,
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+    print(
+        f"监视结束：转换 {summary.ok}，失败 {summary.fail}，跳过已完成 {summary.skipped}；"
+        f"到达 -> MP4 延迟 {_format_latency(summary.latency_stats())}",
+        flush=True,
+    )
+    return EXIT_OK if summary.fail == 0 else EXIT_FAILURES
+
+
+def cmd_serve(args) -> int:
+    if not engine.check_ffmpeg(args.ffmpeg):
+        print("未找到 FFmpeg。请确保已安装 FFmpeg 并添加到系统 PATH 环境变量中。", file=sys.stderr)
+        return EXIT_NO_FFMPEG
+
+    service = http_service.ConversionService(
+        _convert_options(args),
+        work_dir=args.work_dir,
+        max_queue=args.max_queue,
+        max_upload_bytes=int(args.max_upload_mb * 1024 * 1024),
+    )
+    try:
+        server = http_service.make_server(service, args.host, args.port, args.max_connections)
+    except OSError as e:
+        print(f"无法监听 {args.host}:{args.port}：{e}", file=sys.stderr)
+        service.shutdown()
+        return EXIT_USAGE
+
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    host, port = server.server_address[:2]
+    thread = threading.Thread(target=server.serve_forever, name="http-service", daemon=True)
+    thread.start()
+    print(
+        f"转换服务已启动：http://{host}:{port}（并行 {service.jobs}，队列上限 {service.max_queue}，"
+        f"工作目录 {service.work_dir}），按 Ctrl+C 停止",
+        flush=True,
+    )
+    while not stop_event.wait(0.5):
+        pass
+
+    server.shutdown()
+    server.server_close()
+    service.shutdown()
+    stats = service.stats()
+    print(
+        f"服务已停止：完成 {stats['completed']}，失败 {stats['failed']}，拒绝 {stats['rejected']}；"
+        f"延迟 {_format_latency(stats['latency'])}",
+        flush=True,
+    )
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="converter_cli", description="图片转视频（命令行版）")
+    parser.add_argument(
+        "--metrics-jsonl",
+        default="",
+        metavar="PATH",
+        help=f"把各阶段耗时/字节数逐条追加为 JSON 行（默认读取环境变量 {metrics.ENV_JSONL}）",
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        default="",
+        metavar="PATH",
+        help=f"定期写出 Prometheus 文本格式指标，供 node_exporter textfile collector 采集（默认读取环境变量 {metrics.ENV_PROM}）",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", help="把图片批量转换为 MP4")
+    p.add_argument("paths", nargs="+", help="图片文件、文件夹（递归）或 zip/tar 压缩包（直接读取，不解压）")
+    _add_encode_args(p)
+    p.add_argument("--slideshow", metavar="OUT.mp4", default="", help="把所有图片按顺序合成为一个视频（单次 FFmpeg 编码）")
+    p.add_argument(
+        "--dir-index",
+        nargs="?",
+        const=default_index_path(),
+        default="",
+        help="使用按目录 mtime 持久化的扫描索引，未变化的目录重扫时直接复用（可指定索引文件路径）",
+    )
+    p.add_argument(
+        "--header-index",
+        nargs="?",
+        const=default_header_index_path(),
+        default="",
+        help="持久化图片文件头索引（尺寸/模式/透明/EXIF 方向），未修改的图片不再重复读取（可指定索引文件路径）",
+    )
+    p.add_argument(
+        "--pack",
+        type=int,
+        default=1,
+        metavar="K",
+        help="一个 FFmpeg 进程最多转换 K 张小图（按图片尺寸自动减少，大图仍单独转换），适合大量缩略图",
+    )
+    p.add_argument(
+        "--longest-first",
+        action="store_true",
+        help="先读取全部图片的文件头，按估算耗时从大到小转换，缩短并行批量的总耗时（扫描与转换不再重叠）",
+    )
+    p.add_argument(
+        "--journal",
+        metavar="PATH",
+        default="",
+        help="把每个任务的状态记录到该文件；文件已存在时跳过其中已完成的任务（续跑，不适用于 --slideshow）",
+    )
+    p.add_argument("--progress", action="store_true", help="在 stderr 输出每个任务的实时进度")
+    p.add_argument("--quiet", "-q", action="store_true", help="只输出失败信息和汇总")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("watch", help="监视文件夹，持续把新投放/修改的图片转换为 MP4")
+    p.add_argument("dirs", nargs="+", help="要监视的文件夹（递归）")
+    _add_encode_args(p)
+    p.add_argument(
+        "--settle",
+        type=float,
+        default=watch_folder.DEFAULT_SETTLE_SECONDS,
+        help="文件大小和修改时间连续多少秒不变才视为写完（秒）",
+    )
+    p.add_argument(
+        "--poll-interval",
+        type=float,
+        default=watch_folder.DEFAULT_POLL_INTERVAL,
+        help="轮询模式下的扫描间隔（秒）",
+    )
+    p.add_argument("--polling", action="store_true", help="不使用系统文件通知（watchdog），始终轮询")
+    p.add_argument("--new-only", action="store_true", help="忽略启动时已存在的图片，只处理之后新增/修改的")
+    p.add_argument("--journal", metavar="PATH", default="", help="journal 路径（默认按监视目录存放在缓存目录下）")
+    p.add_argument("--no-journal", action="store_true", help="不记录 journal（重启后会重新转换已有图片）")
+    p.add_argument("--report-interval", type=float, default=60.0, help="输出累计延迟统计的间隔（秒）")
+    p.add_argument("--quiet", "-q", action="store_true", help="只输出失败信息和汇总")
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("serve", help="启动本地 HTTP 转换服务（上传图片或提交路径，取回 MP4）")
+    _add_encode_args(p)
+    p.add_argument("--host", default=http_service.DEFAULT_HOST, help="监听地址（默认只允许本机访问）")
+    p.add_argument("--port", type=int, default=http_service.DEFAULT_PORT, help="监听端口（0 表示随机）")
+    p.add_argument(
+        "--max-queue",
+        type=int,
+        default=http_service.DEFAULT_MAX_QUEUE,
+        help="排队任务数上限，超出时返回 429",
+    )
+    p.add_argument(
+        "--max-connections",
+        type=int,
+        default=http_service.DEFAULT_MAX_CONNECTIONS,
+        help="同时处理的请求数上限，超出时返回 503",
+    )
+    p.add_argument(
+        "--max-upload-mb",
+        type=float,
+        default=http_service.DEFAULT_MAX_UPLOAD_BYTES / (1024 * 1024),
+        help="单个上传的大小上限（MB），超出时返回 413",
+    )
+    p.add_argument("--work-dir", default="", help="上传和输出文件的存放目录（默认在缓存目录下）")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("resume", help="按 journal 中记录的参数续跑中断的批量转换（跳过已完成，重试失败）")
+    p.add_argument("journal", help="convert --journal 写出的文件")
+    p.add_argument("--jobs", "-j", type=int, default=0, help="覆盖原来的并行任务数")
+    p.add_argument("--quiet", "-q", action="store_true", help="只输出失败信息和汇总")
+    p.set_defaults(func=cmd_resume)
+
+    p = sub.add_parser("autotune", help="在本机测量候选编码参数并保存最佳配置（tuned）")
+    p.add_argument("images", nargs="*", help="校准图片或文件夹（默认自动生成）")
+    p.add_argument("--goal", choices=["throughput", "balanced", "smallest"], default="throughput", help="调优目标")
+    p.add_argument("--duration", "-d", type=int, default=3, help="校准视频时长（秒）")
+    p.add_argument("--ffmpeg", default="ffmpeg", help="FFmpeg 可执行文件路径")
+    p.add_argument("--no-save", action="store_true", help="只输出测量结果，不保存")
+    p.set_defaults(func=cmd_autotune)
+
+    p = sub.add_parser("benchmark", help="用合成语料测量转换流水线的延迟/吞吐/内存，结果写成 JSON")
+    p.add_argument("--corpus", default=os.path.join(app_cache_dir(), "benchmark_corpus"), help="语料目录（已生成则复用）")
+    p.add_argument("--sizes", default="default", help="尺寸档，逗号分隔（thumb,vga,fhd,12mp,100mp），或 all")
+    p.add_argument(
+        "--stage", action="append", choices=["header_probe", "video", "image_png", "image_jpg"], help="只运行指定阶段（可重复）"
+    )
+    p.add_argument("--repeat", type=int, default=1, help="每个阶段重复次数")
+    p.add_argument("--output", "-o", default="benchmark.json", help="结果 JSON 路径")
+    p.add_argument("--baseline", default="", help="与该基准结果对比并报告回退")
+    p.add_argument("--threshold", type=float, default=10.0, help="回退判定阈值（百分比）")
+    p.add_argument("--jobs", "-j", type=int, default=0, help="并行任务数（默认取编码配置推荐值或 CPU 核心数）")
+    p.add_argument("--duration", "-d", type=int, default=3, help="视频时长（秒）")
+    p.add_argument("--profile", "-p", choices=available_profiles(), default=DEFAULT_PROFILE, help="编码配置")
+    p.add_argument(
+        "--ingest", choices=[engine.INGEST_FFMPEG, engine.INGEST_PILLOW], default=engine.INGEST_FFMPEG, help="图片解码方式"
+    )
+    p.add_argument("--ffmpeg", default="ffmpeg", help="FFmpeg 可执行文件路径")
+    p.add_argument("--quiet", "-q", action="store_true", help="不输出语料生成进度")
+    p.set_defaults(func=cmd_benchmark)
+
+    p = sub.add_parser("benchmark-compare", help="对比两份基准结果，标出回退项")
+    p.add_argument("base", help="基准结果 JSON")
+    p.add_argument("new", help="新结果 JSON")
+    p.add_argument("--threshold", type=float, default=10.0, help="回退判定阈值（百分比）")
+    p.set_defaults(func=cmd_benchmark_compare)
+
+    p = sub.add_parser("image-format", help="把 WebP 转换为 PNG/JPG/无损 WebP")
+    p.add_argument("paths", nargs="+", help="图片文件、文件夹（递归）或 zip/tar 压缩包（直接读取，不解压）")
+    p.add_argument("--format", "-f", choices=list(IMAGE_FORMATS), default="png", help="webp 为无损 WebP")
+    p.add_argument(
+        "--profile", choices=[*IMAGE_PROFILES, IMAGE_PROFILE_ALL], default=DEFAULT_IMAGE_PROFILE,
+        help="编码配置：fast 最快、max 最小（默认，与旧版输出一致）；all 依次运行全部配置并分别汇总",
+    )
+    p.add_argument("--jobs", "-j", type=int, default=engine.default_jobs(), help="并行进程数（默认 CPU 核心数）")
+    p.add_argument("--out", "-o", default="", help="输出目录（默认与图片同目录）")
+    p.add_argument("--quiet", "-q", action="store_true", help="只输出失败信息和汇总")
+    p.set_defaults(func=cmd_image_format)
+
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if getattr(args, "jobs", 1) < 0 or getattr(args, "duration", 1) < 1 or getattr(args, "repeat", 1) < 1:
+        print("--jobs 不能为负数，--duration 和 --repeat 必须为正整数", file=sys.stderr)
+        return EXIT_USAGE
+    logger.info(f"CLI invoked: {args.command}")
+    metrics.configure(args.metrics_jsonl, args.metrics_prom)
+    try:
+        return args.func(args)
+    finally:
+        metrics.flush()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
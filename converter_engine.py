@@ -0,0 +1,1610 @@
+"""图片转视频核心引擎。
+
+不依赖 Tk，可在无显示环境（渲染服务器、cron、CI）下运行；
+GUI（image_to_video_converter.py）和命令行（converter_cli.py）都是它的客户端。
+"""
+
+import importlib.util
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+import metrics
+from archive_source import close_archives, image_source, is_member, is_tar_member, iter_source_chunks, member_output_dir, source_exists, source_size, source_stat
+from batch_journal import DONE, FAILED, QUEUED, RUNNING, BatchJournal
+from dir_scanner import DirIndex, iter_images
+from logging_config import logger
+from ffmpeg_probe import probe_ffmpeg
+from ffmpeg_runner import FFmpegProgress, run_ffmpeg, with_progress_args
+from encoder_profiles import DEFAULT_PROFILE, PROFILES, EncoderProfile
+from frame_ingest import AnimationStream, RawFrame, load_canvas_frame, load_frame
+from image_metadata import HeaderIndex, ImageInfo, probe_header
+from image_profiles import DEFAULT_IMAGE_PROFILE, IMAGE_PROFILES, ImageProfile, output_name, save_params
+from memory_scheduler import MEMORY_BUDGET_AUTO, MemoryBudget, estimate_job_memory, is_oom_failure, job_threads, resolve_budget
+from output_cache import DEFAULT_MAX_BYTES, OutputCache, discard_partial, discard_stale_partials, hash_file, make_key, open_cache, partial_path
+from renditions import VP9_ENCODER, WEBM, Rendition
+
+SUPPORTED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp', '.gif')
+# 可能是多帧动图的格式（转换前读文件头确认）
+ANIMATED_EXTENSIONS = ('.webp', '.gif')
+# 压缩包成员通过 stdin 交给 FFmpeg（-f image2pipe）时能按帧切分的格式；
+# TIFF 没有管道解析器，压缩包中的 TIFF 改用 Pillow 预解码
+PIPE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.gif')
+
+
+def scale_pad_filter(max_width: int = 1280) -> str:
+    """限制分辨率 + pad 到偶数，提升兼容性并减少编码压力。"""
+    return f"scale={max_width}:-2:force_original_aspect_ratio=decrease,pad=ceil(iw/2)*2:ceil(ih/2)*2,format=yuv420p"
+
+
+SCALE_PAD_FILTER = scale_pad_filter()
+
+
+def planned_scale_pad_filter(info: Optional[ImageInfo], max_width: int = 1280) -> str:
+    """按文件头去掉确定是空操作的滤镜，其余情况与 scale_pad_filter 完全相同。
+
+    宽度正好等于 max_width、高度为偶数且无需按 EXIF 转置时，scale 和 pad 都不改变画面，只保留格式转换。
+    更窄的图片仍需 scale：scale=W:-2 会把它们放大到 W，跳过会改变输出分辨率。
+    """
+    if info is not None and info.width == max_width and info.height % 2 == 0 and not info.transposed:
+        return "format=yuv420p"
+    return scale_pad_filter(max_width)
+
+# 静态图快速路径的输出帧率：图片只解码/缩放一次，由 loop 滤镜复制成 duration*STILL_FPS 帧，
+# 重复帧在 x264 中几乎都是 skip 块，编码耗时和文件大小基本与时长无关。
+STILL_FPS = 1
+
+# 幻灯片模式统一画布尺寸（不同分辨率的图片等比缩放后居中补边）
+SLIDESHOW_SIZE = (1280, 720)
+
+# 输入解码方式：ffmpeg = FFmpeg 直接读图片；pillow = Pillow 预解码缩放后通过 stdin 传原始帧
+INGEST_FFMPEG = "ffmpeg"
+INGEST_PILLOW = "pillow"
+
+
+def default_jobs() -> int:
+    """默认并行任务数：CPU 核心数。"""
+    return os.cpu_count() or 1
+
+
+def is_supported_file(file_path: str) -> bool:
+    ext = os.path.splitext(file_path)[1].lower()
+    return ext in SUPPORTED_EXTENSIONS
+
+
+def iter_collect_images(paths: Iterable[str], index: Optional[DirIndex] = None) -> Iterator[str]:
+    """流式把文件/文件夹解析成图片路径（递归、去重），可直接交给 run_batch 边扫边转。"""
+    return iter_images(paths, is_supported_file, index)
+
+
+def collect_images(paths: Iterable[str], index: Optional[DirIndex] = None) -> list[str]:
+    """把文件/文件夹解析成图片文件列表（支持递归遍历文件夹，结果去重）。"""
+    return list(iter_collect_images(paths, index))
+
+
+def default_output_dir(file_path: str) -> str:
+    """默认输出目录：与输入图片同级目录。
+
+    压缩包成员输出到压缩包旁与其同名的目录中，并保留包内的子目录结构（见 archive_source.member_output_dir）。
+    """
+    if is_member(file_path):
+        return member_output_dir(file_path)
+    try:
+        return str(Path(file_path).resolve().parent)
+    except Exception:
+        return os.path.dirname(file_path)
+
+
+def check_ffmpeg(ffmpeg_bin: str = "ffmpeg") -> bool:
+    """FFmpeg 是否可用（探测结果按可执行文件路径 + mtime 缓存，未变化时不启动子进程）。"""
+    return probe_ffmpeg(ffmpeg_bin) is not None
+
+
+@dataclass
+class ConvertOptions:
+    """一次批量转换的参数。output_dir 为空时输出到各图片所在目录。"""
+    duration: int = 3
+    output_dir: str = ""
+    jobs: int = field(default_factory=default_jobs)
+    ffmpeg_bin: str = "ffmpeg"
+    # 静态图快速路径（False 时按 30fps 逐帧解码编码，与旧版输出一致）
+    fast_still: bool = True
+    # 输出缓存目录（空字符串表示不使用缓存）
+    cache_dir: str = ""
+    cache_max_bytes: int = DEFAULT_MAX_BYTES
+    ingest: str = INGEST_FFMPEG
+    # 编码参数（preset/crf/线程数/输出宽度），见 encoder_profiles
+    profile: EncoderProfile = PROFILES[DEFAULT_PROFILE]
+    # 内存预算（字节）：-1 按可用内存自动计算，0 不限制
+    memory_budget: int = MEMORY_BUDGET_AUTO
+    # 多分辨率输出（见 renditions）；为空时按 profile.max_width 输出单个 MP4
+    renditions: tuple[Rendition, ...] = ()
+    # 一个 FFmpeg 进程最多处理几张小图（1 表示每张图片单独启动 FFmpeg），见 iter_packs
+    pack_max: int = 1
+
+
+def options_to_dict(options: ConvertOptions) -> dict:
+    """可 JSON 序列化的参数（写入 batch journal，续跑时还原）。"""
+    return asdict(options)
+
+
+def options_from_dict(data: dict) -> ConvertOptions:
+    data = dict(data)
+    profile = data.pop("profile", None)
+    renditions = data.pop("renditions", None)
+    known = {f for f in ConvertOptions.__dataclass_fields__}
+    options = ConvertOptions(**{k: v for k, v in data.items() if k in known})
+    if profile:
+        options.profile = EncoderProfile(**profile)
+    if renditions:
+        options.renditions = tuple(Rendition(**r) for r in renditions)
+    return options
+
+
+@dataclass
+class JobResult:
+    """单个转换任务的结果；log 为该任务的完整日志文本。"""
+    index: int
+    input_path: str
+    output_path: str = ""
+    ok: bool = False
+    return_code: Optional[int] = None
+    output_size: int = 0
+    elapsed: float = 0.0
+    log: str = ""
+    cache_hit: bool = False
+    # Pillow 预解码耗时（仅 ingest=pillow 时有值）
+    decode_time: float = 0.0
+    # FFmpeg 进程峰值内存（KB），平台不支持时为 None
+    peak_rss_kb: Optional[int] = None
+    # 调度器估算的内存占用（字节，0 表示未启用内存预算）
+    memory_estimate: int = 0
+    # 因内存不足用低内存配置重试过
+    oom_retried: bool = False
+    # 多分辨率输出时的全部输出文件（output_path 为其中第一个，output_size 为总大小）
+    outputs: list[str] = field(default_factory=list)
+
+
+@dataclass
+class BatchSummary:
+    total: int = 0
+    ok: int = 0
+    fail: int = 0
+    output_bytes: int = 0
+    elapsed: float = 0.0
+    cancelled: bool = False
+    cache_hits: int = 0
+    cache_misses: int = 0
+    bytes_saved: int = 0
+    oom_retries: int = 0
+    memory_budget: int = 0
+    memory_peak: int = 0
+    # 按 batch journal 已完成而跳过的任务数
+    skipped: int = 0
+
+    @property
+    def images_per_second(self) -> float:
+        return (self.ok + self.fail) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def add(self, res: JobResult) -> None:
+        if res.ok:
+            self.ok += 1
+            self.output_bytes += res.output_size
+        else:
+            self.fail += 1
+        if res.oom_retried:
+            self.oom_retries += 1
+
+
+def still_video_filter(duration: int, base_filter: str = SCALE_PAD_FILTER, fps: int = STILL_FPS) -> str:
+    """快速路径滤镜：缩放/pad 一次后用 loop 复制出 duration 秒的帧。"""
+    frames = max(1, int(duration) * fps)
+    return f"{base_filter},loop=loop={frames - 1}:size=1:start=0,setpts=N/{fps}/TB"
+
+
+def thread_args(profile: EncoderProfile) -> list[str]:
+    """编码器线程参数。属于输出选项，必须放在 -i 之后（放在 -i 之前只限制解码器，x264 仍按核数自动开线程）。"""
+    return ["-threads", str(profile.threads), "-thread_type", profile.thread_type]
+
+
+def encoder_args(profile: EncoderProfile) -> list[str]:
+    return [
+        "-c:v", "libx264",
+        *thread_args(profile),
+        # ultrafast 内存/CPU压力更小；stillimage 更适合静态图
+        "-preset", profile.preset,
+        "-tune", profile.tune,
+        "-crf", str(profile.crf),
+        "-pix_fmt", "yuv420p",
+        "-movflags", "+faststart",
+        "-f", "mp4",
+    ]
+
+
+def build_ffmpeg_cmd(
+    input_path: str,
+    output_path: str,
+    options: ConvertOptions,
+    raw_size: Optional[tuple[int, int]] = None,
+    info: Optional[ImageInfo] = None,
+) -> list[str]:
+    """raw_size 不为空时，输入为 stdin 上已缩放好的单帧 rgb24 原始数据；info 为文件头信息，用于省掉空操作滤镜。
+
+    input_path 为压缩包成员时，输入为 stdin 上的图片文件数据（见 ffmpeg_stdin）。
+    """
+    if raw_size is not None:
+        input_args = [
+            "-f", "rawvideo",
+            "-pix_fmt", "rgb24",
+            "-s", f"{raw_size[0]}x{raw_size[1]}",
+            "-i", "pipe:0",
+        ]
+        fps = STILL_FPS if options.fast_still else 30
+        filter_args = ["-vf", still_video_filter(options.duration, "format=yuv420p", fps), "-r", str(fps)]
+    elif is_member(str(input_path)):
+        # 压缩包成员：编码后的图片从 stdin 传入，管道不能 -loop 重读，统一用 loop 滤镜复制帧
+        input_args = ["-f", "image2pipe", "-i", "pipe:0"]
+        fps = STILL_FPS if options.fast_still else 30
+        filter_args = [
+            "-vf", still_video_filter(options.duration, planned_scale_pad_filter(info, options.profile.max_width), fps),
+            "-r", str(fps),
+        ]
+    elif options.fast_still:
+        # 单帧输入，不使用 -loop 1（否则 FFmpeg 会每一帧都重新解码图片）
+        input_args = ["-i", str(input_path)]
+        filter_args = [
+            "-vf", still_video_filter(options.duration, planned_scale_pad_filter(info, options.profile.max_width)),
+            "-r", str(STILL_FPS),
+        ]
+    else:
+        input_args = ["-loop", "1", "-framerate", "30", "-i", str(input_path), "-t", str(options.duration)]
+        filter_args = ["-vf", "fps=30," + planned_scale_pad_filter(info, options.profile.max_width)]
+
+    return [
+        options.ffmpeg_bin,
+        "-y",
+        *input_args,
+        *filter_args,
+        *encoder_args(options.profile),
+        str(output_path)
+    ]
+
+
+def ladder_scale_filter(rendition: Rendition) -> str:
+    """缩放到 rendition 的框内（保持比例），再用与 scale_pad_filter 相同的方式 pad 到偶数。"""
+    return (
+        f"scale={rendition.width}:{rendition.height}:force_original_aspect_ratio=decrease,"
+        f"pad=ceil(iw/2)*2:ceil(ih/2)*2,format=yuv420p"
+    )
+
+
+def rendition_encoder_args(rendition: Rendition, profile: EncoderProfile) -> list[str]:
+    if rendition.container == WEBM:
+        # 恒定质量模式；realtime + cpu-used 8 是 libvpx 最快的档位，静态图的画质差异很小
+        return [
+            "-c:v", VP9_ENCODER,
+            *thread_args(profile),
+            "-crf", str(rendition.crf),
+            "-b:v", "0",
+            "-deadline", "realtime",
+            "-cpu-used", "8",
+            "-row-mt", "1",
+            "-pix_fmt", "yuv420p",
+            "-f", "webm",
+        ]
+    args = encoder_args(profile)
+    if rendition.crf:
+        args[args.index("-crf") + 1] = str(rendition.crf)
+    return args
+
+
+def build_ladder_cmd(
+    input_path: str,
+    write_paths: list[str],
+    options: ConvertOptions,
+    renditions: tuple[Rendition, ...],
+    raw_size: Optional[tuple[int, int]] = None,
+    animation_fps: int = 0,
+) -> list[str]:
+    """一次解码、多路编码：split 把解码后的帧分给每个 rendition，各自缩放后写到 write_paths 中对应的文件。
+
+    animation_fps 不为 0 时，stdin 上是按该帧率排好的 raw_size 动图帧（见 frame_ingest.AnimationStream），
+    每路逐帧缩放，不再用 loop 复制单帧。
+    """
+    fps = animation_fps or (STILL_FPS if options.fast_still else 30)
+    if raw_size is not None:
+        input_args = [
+            "-f", "rawvideo",
+            "-pix_fmt", "rgb24",
+            "-s", f"{raw_size[0]}x{raw_size[1]}",
+            *(["-framerate", str(animation_fps)] if animation_fps else []),
+            "-i", "pipe:0",
+        ]
+        head = ""
+    elif is_member(input_path):
+        input_args = ["-f", "image2pipe", "-i", "pipe:0"]
+        head = ""
+    elif options.fast_still:
+        input_args = ["-i", str(input_path)]
+        head = ""
+    else:
+        input_args = ["-loop", "1", "-framerate", "30", "-i", str(input_path), "-t", str(options.duration)]
+        head = "fps=30,"
+
+    n = len(renditions)
+    branches = [f"[0:v]{head}split={n}" + "".join(f"[s{i}]" for i in range(n))]
+    for i, r in enumerate(renditions):
+        chain = ladder_scale_filter(r)
+        if animation_fps:
+            chain += ",format=yuv420p"
+        elif options.fast_still or raw_size is not None or is_member(input_path):
+            # 缩放在 loop 之前：每路只缩放一帧
+            chain = still_video_filter(options.duration, chain, fps)
+        branches.append(f"[s{i}]{chain}[v{i}]")
+
+    output_args: list[str] = []
+    for i, (r, path) in enumerate(zip(renditions, write_paths)):
+        output_args += ["-map", f"[v{i}]", "-r", str(fps), *rendition_encoder_args(r, options.profile), str(path)]
+
+    return [
+        options.ffmpeg_bin,
+        "-y",
+        *input_args,
+        "-filter_complex", ";".join(branches),
+        *output_args,
+    ]
+
+
+def rendition_output_paths(file_path: str, options: ConvertOptions) -> list[str]:
+    output_dir = options.output_dir or default_output_dir(file_path)
+    stem = Path(file_path).stem
+    return [str(Path(output_dir) / f"{stem}{r.suffix}") for r in options.renditions]
+
+
+def output_path_for(file_path: str, options: ConvertOptions) -> str:
+    """输出路径；多分辨率输出时为第一个 rendition 的文件。"""
+    if options.renditions:
+        return rendition_output_paths(file_path, options)[0]
+    output_dir = options.output_dir or default_output_dir(file_path)
+    return str(Path(output_dir) / f"{Path(file_path).stem}.mp4")
+
+
+def cache_key_for(file_path: str, options: ConvertOptions) -> str:
+    """缓存键：图片内容哈希 + 与路径无关的完整 FFmpeg 参数 + FFmpeg 可执行文件及其版本。
+
+    升级 FFmpeg 或用 --ffmpeg 换一份可执行文件后，同样的参数也可能编出不同的输出，旧缓存不再命中。
+    """
+    caps = probe_ffmpeg(options.ffmpeg_bin)
+    binary = f"ffmpeg={caps.path}|{caps.version}" if caps else f"ffmpeg={options.ffmpeg_bin}"
+    params = build_ffmpeg_cmd("{input}", "{output}", options)[1:] + [f"ingest={options.ingest}", binary]
+    return make_key(hash_file(file_path), params)
+
+
+ProgressCallback = Callable[[int, FFmpegProgress], None]
+
+
+def execute_ffmpeg(
+    cmd: list[str],
+    output_path: Path,
+    duration: float,
+    result: JobResult,
+    log: list[str],
+    stdin_data=None,
+    on_progress: Optional[Callable[[FFmpegProgress], None]] = None,
+    label: str = "",
+    bytes_in: int = 0,
+    write_path: Optional[Path] = None,
+    extra_outputs: Optional[list[tuple[Path, Path]]] = None,
+) -> None:
+    """运行 FFmpeg 并校验输出文件，把返回码/大小/成功与否写入 result，日志追加到 log。
+
+    write_path 为 cmd 实际写入的临时文件（见 output_cache.partial_path）：校验通过后原子改名为
+    output_path，失败时删除，因此 output_path 上不会出现写了一半的文件。
+    extra_outputs 为同一条命令的其余 (临时文件, 输出文件)（多分辨率输出），须全部非空才算成功。
+    bytes_in 为输入图片总字节数，只用于 encode 阶段的指标。
+    """
+    write_path = write_path or output_path
+    pairs = [(write_path, output_path), *(extra_outputs or [])]
+    cmd = with_progress_args(cmd)
+    ffmpeg_cmd_str = " ".join(cmd)
+    logger.info("FFmpeg command: " + ffmpeg_cmd_str)
+    log.append("FFmpeg 指令:\n" + ffmpeg_cmd_str + "\n\n")
+
+    def progress(p: FFmpegProgress):
+        logger.info(
+            f"FFmpeg progress. Input: {label}, percent={p.percent:.1f}, "
+            f"frame={p.frame}, fps={p.fps:.1f}, speed={p.speed:.2f}x"
+        )
+        if on_progress:
+            on_progress(p)
+
+    def discard():
+        for w, o in pairs:
+            if w != o:
+                discard_partial(str(w))
+
+    try:
+        with metrics.span("encode", bytes_in=bytes_in, input=label) as sp:
+            run = run_ffmpeg(cmd, duration, stdin_data=stdin_data, on_progress=progress)
+            sp.ok = run.return_code == 0
+            sp.attrs["peak_rss_kb"] = run.peak_rss_kb
+    except Exception as e:
+        log.append(f"执行 FFmpeg 时出错:\n{str(e)}\n")
+        logger.exception("Exception while running FFmpeg")
+        discard()
+        return
+
+    result.return_code = run.return_code
+    result.peak_rss_kb = run.peak_rss_kb
+    with metrics.span("verify", output=str(output_path)) as sp:
+        sizes = [w.stat().st_size if w.exists() else -1 for w, _ in pairs]
+        out_size = sizes[0] if len(sizes) == 1 else (sum(sizes) if min(sizes) >= 0 else -1)
+        file_ok = min(sizes) > 0
+        for w, o in pairs:
+            if result.return_code != 0 or not file_ok or w == o:
+                break
+            try:
+                os.replace(w, o)
+            except OSError as e:
+                logger.exception(f"Failed to move {w} -> {o}")
+                log.append(f"无法写入输出文件 {o}：{str(e)}\n")
+                file_ok = False
+        sp.ok = file_ok
+        sp.bytes_out = sum(max(size, 0) for size in sizes)
+    logger.info(
+        f"FFmpeg exited. return_code={result.return_code}, file_ok={file_ok}, output_exists={out_size >= 0}"
+    )
+
+    if result.return_code == 0 and file_ok:
+        result.ok = True
+        result.output_size = out_size
+        if extra_outputs:
+            files = "".join(f"  {o}（{size} bytes）\n" for (_, o), size in zip(pairs, sizes))
+            log.append(f"转换成功！\n输出文件:\n{files}总大小: {result.output_size} bytes\n")
+        else:
+            log.append(f"转换成功！\n输出文件: {output_path}\n大小: {result.output_size} bytes\n")
+    else:
+        debug = []
+        debug.append("转换失败（请查看下方日志/错误信息）\n")
+        debug.append("FFmpeg 命令:\n" + ffmpeg_cmd_str)
+        debug.append(f"返回码: {result.return_code}")
+        debug.append(f"最后进度: {run.progress.describe()}")
+        for (_, o), size in zip(pairs, sizes):
+            name = f" {o.name}" if extra_outputs else ""
+            if size >= 0:
+                debug.append(f"输出文件{name}大小: {size} bytes")
+            else:
+                debug.append(f"输出文件{name}不存在")
+        if run.stderr_tail:
+            debug.append("\nFFmpeg 错误输出(stderr，末尾部分):\n" + run.stderr_tail)
+        log.append("\n\n".join(debug) + "\n")
+        discard()
+
+
+def needs_pillow_ingest(file_path: str, options: ConvertOptions) -> bool:
+    """是否由 Pillow 预解码：选择了 pillow 输入方式，或 FFmpeg 无法从管道读取的压缩包成员。"""
+    if options.ingest == INGEST_PILLOW:
+        return True
+    return is_member(file_path) and os.path.splitext(file_path)[1].lower() not in PIPE_EXTENSIONS
+
+
+def ffmpeg_stdin(file_path: str, frame: Optional[RawFrame]):
+    """FFmpeg 的 stdin：预解码的原始帧，或压缩包成员的数据流（按块读取，不落盘），否则为 None。"""
+    if frame is not None:
+        return frame.data
+    if is_member(file_path):
+        return iter_source_chunks(file_path)
+    return None
+
+
+def _pillow_frame(file_path: str, width: int, result: JobResult, log: list[str]) -> Optional[RawFrame]:
+    """Pillow 预解码；Pillow 不可用或无法解码时返回 None（回退到 FFmpeg 直接读图）。"""
+    try:
+        frame = load_frame(file_path, width)
+    except Exception as e:
+        logger.exception(f"Pillow ingest failed, falling back to ffmpeg: {file_path}")
+        log.append(f"Pillow 预解码失败，改用 FFmpeg 解码：{str(e)}\n")
+        return None
+    result.decode_time = frame.decode_time
+    logger.info(
+        f"Pillow ingest. Input: {file_path}, source={frame.source_size}, "
+        f"frame={frame.width}x{frame.height}, decode={frame.decode_time:.3f}s"
+    )
+    log.append(
+        f"Pillow 预解码：{frame.source_size[0]}x{frame.source_size[1]} -> "
+        f"{frame.width}x{frame.height}，耗时 {frame.decode_time:.3f}s\n"
+    )
+    return frame
+
+
+def convert_one(
+    file_path: str,
+    options: ConvertOptions,
+    index: int = 0,
+    on_progress: Optional[ProgressCallback] = None,
+    info: Optional[ImageInfo] = None,
+) -> JobResult:
+    """转换单张图片（阻塞直到 FFmpeg 结束）。on_progress(index, progress) 在工作线程中回调。
+
+    info 为预先探测的文件头信息（见 image_metadata.HeaderIndex），用于规划滤镜；为空时使用完整滤镜。
+    """
+    # 先判断动图：多分辨率输出也要逐帧编码，而不是只取第一帧（FFmpeg 也无法解码动画 WebP）
+    if info is None and os.path.splitext(file_path)[1].lower() in ANIMATED_EXTENSIONS:
+        info = probe_header(file_path)
+    if options.renditions:
+        return convert_ladder(file_path, options, index=index, on_progress=on_progress, info=info)
+    if info is not None and info.animated:
+        return convert_animation(file_path, options, index=index, on_progress=on_progress)
+    result = JobResult(index=index, input_path=file_path)
+    log: list[str] = []
+    started = time.perf_counter()
+
+    try:
+        if not file_path or not source_exists(file_path):
+            log.append(f"图片不存在：{file_path}\n")
+            return result
+
+        input_path = Path(file_path)
+        output_path = Path(output_path_for(file_path, options))
+        result.output_path = str(output_path)
+        os.makedirs(output_path.parent, exist_ok=True)
+        # 失败时不保留上一次的旧输出，避免被误认为本次转换成功
+        if output_path.exists():
+            output_path.unlink()
+        # FFmpeg 写到同目录临时文件，成功后原子改名（也不会截断写穿缓存文件的硬链接）
+        write_path = Path(partial_path(str(output_path)))
+
+        frame = _pillow_frame(file_path, options.profile.max_width, result, log) if needs_pillow_ingest(file_path, options) else None
+        cmd = build_ffmpeg_cmd(
+            file_path, str(write_path), options,
+            raw_size=(frame.width, frame.height) if frame is not None else None,
+            info=info,
+        )
+        logger.info(f"Starting conversion. Input: {input_path}, Output: {output_path}, Duration: {options.duration}s")
+        execute_ffmpeg(
+            cmd, output_path, options.duration, result, log,
+            stdin_data=ffmpeg_stdin(file_path, frame),
+            on_progress=(lambda p: on_progress(index, p)) if on_progress else None,
+            label=input_path.name,
+            bytes_in=source_size(file_path),
+            write_path=write_path,
+        )
+        return result
+    except Exception as e:
+        logger.exception("convert_one exception")
+        log.append(f"转换时发生异常:\n{str(e)}\n")
+        return result
+    finally:
+        result.elapsed = time.perf_counter() - started
+        result.log = "".join(log)
+
+
+def build_animation_cmd(output_path: str, options: ConvertOptions, size: tuple[int, int], fps: int) -> list[str]:
+    """输入为 stdin 上按固定帧率排好的 rgb24 帧（见 frame_ingest.AnimationStream）。"""
+    return [
+        options.ffmpeg_bin,
+        "-y",
+        "-f", "rawvideo",
+        "-pix_fmt", "rgb24",
+        "-s", f"{size[0]}x{size[1]}",
+        "-framerate", str(fps),
+        "-i", "pipe:0",
+        "-vf", "format=yuv420p",
+        "-r", str(fps),
+        *encoder_args(options.profile),
+        str(output_path)
+    ]
+
+
+def convert_animation(
+    file_path: str,
+    options: ConvertOptions,
+    index: int = 0,
+    on_progress: Optional[ProgressCallback] = None,
+) -> JobResult:
+    """动图转视频：Pillow 逐帧解码并按每帧自身时长通过管道传给 FFmpeg，
+    动画不足 options.duration 秒时循环播放到该时长（需要 Pillow）。"""
+    result = JobResult(index=index, input_path=file_path)
+    log: list[str] = []
+    started = time.perf_counter()
+
+    try:
+        output_path = Path(output_path_for(file_path, options))
+        result.output_path = str(output_path)
+        os.makedirs(output_path.parent, exist_ok=True)
+        if output_path.exists():
+            output_path.unlink()
+        write_path = Path(partial_path(str(output_path)))
+
+        stream = AnimationStream(file_path, options.profile.max_width, options.duration)
+        cmd = build_animation_cmd(str(write_path), options, (stream.width, stream.height), stream.fps)
+        logger.info(
+            f"Starting animation conversion. Input: {file_path}, Output: {output_path}, "
+            f"frame={stream.width}x{stream.height}, min_duration={options.duration}s"
+        )
+        execute_ffmpeg(
+            cmd, output_path, options.duration, result, log,
+            stdin_data=stream.frames(),
+            on_progress=(lambda p: on_progress(index, p)) if on_progress else None,
+            label=output_path.name,
+            bytes_in=source_size(file_path),
+            write_path=write_path,
+        )
+        result.decode_time = stream.decode_time
+        log.append(
+            f"动图：{stream.source_size[0]}x{stream.source_size[1]} -> {stream.width}x{stream.height}，"
+            f"解码 {stream.decoded} 帧（完整播放 {stream.loops} 遍），输出 {stream.seconds:.2f}s，"
+            f"解码耗时 {stream.decode_time:.3f}s\n"
+        )
+        return result
+    except Exception as e:
+        logger.exception("convert_animation exception")
+        log.append(f"转换动图时发生异常:\n{str(e)}\n")
+        return result
+    finally:
+        result.elapsed = time.perf_counter() - started
+        result.log = "".join(log)
+
+
+def available_renditions(options: ConvertOptions, log: list[str]) -> tuple[Rendition, ...]:
+    """去掉本机 FFmpeg 缺少编码器的 rendition（目前只有 WebM 依赖 libvpx-vp9），并记入日志。"""
+    renditions = options.renditions
+    if not any(r.container == WEBM for r in renditions):
+        return renditions
+    caps = probe_ffmpeg(options.ffmpeg_bin)
+    if caps is None or caps.has_encoder(VP9_ENCODER):
+        return renditions
+    skipped = [r for r in renditions if r.container == WEBM]
+    logger.warning(f"FFmpeg has no {VP9_ENCODER} encoder; skipping WebM renditions: {[r.name for r in skipped]}")
+    log.append(f"FFmpeg 不支持 {VP9_ENCODER}，跳过 WebM 输出：{', '.join(r.name for r in skipped)}\n")
+    return tuple(r for r in renditions if r.container != WEBM)
+
+
+def convert_ladder(
+    file_path: str,
+    options: ConvertOptions,
+    index: int = 0,
+    on_progress: Optional[ProgressCallback] = None,
+    info: Optional[ImageInfo] = None,
+) -> JobResult:
+    """一次 FFmpeg 调用输出 options.renditions 中的全部分辨率（图片只解码一次）。
+
+    info.animated 为真时由 AnimationStream 逐帧解码（与 convert_animation 相同的时长规则），各路共用同一帧流。
+    """
+    result = JobResult(index=index, input_path=file_path)
+    log: list[str] = []
+    started = time.perf_counter()
+
+    try:
+        if not file_path or not source_exists(file_path):
+            log.append(f"图片不存在：{file_path}\n")
+            return result
+
+        renditions = available_renditions(options, log)
+        if not renditions:
+            log.append("没有可用的输出格式。\n")
+            return result
+        output_paths = [Path(p) for p in rendition_output_paths(file_path, replace(options, renditions=renditions))]
+        result.output_path = str(output_paths[0])
+        os.makedirs(output_paths[0].parent, exist_ok=True)
+        for out in output_paths:
+            if out.exists():
+                out.unlink()
+        write_paths = [Path(partial_path(str(out))) for out in output_paths]
+
+        frame = None
+        stream = None
+        width = max(r.width for r in renditions)
+        if info is not None and info.animated:
+            stream = AnimationStream(file_path, width, options.duration)
+            raw_size = (stream.width, stream.height)
+            stdin_data = stream.frames()
+        else:
+            if needs_pillow_ingest(file_path, options):
+                frame = _pillow_frame(file_path, width, result, log)
+            raw_size = (frame.width, frame.height) if frame is not None else None
+            stdin_data = ffmpeg_stdin(file_path, frame)
+
+        cmd = build_ladder_cmd(
+            file_path, [str(w) for w in write_paths], options, renditions,
+            raw_size=raw_size,
+            animation_fps=stream.fps if stream is not None else 0,
+        )
+        logger.info(
+            f"Starting ladder conversion. Input: {file_path}, renditions={[r.suffix for r in renditions]}, "
+            f"Duration: {options.duration}s"
+        )
+        execute_ffmpeg(
+            cmd, output_paths[0], options.duration, result, log,
+            stdin_data=stdin_data,
+            on_progress=(lambda p: on_progress(index, p)) if on_progress else None,
+            label=os.path.basename(file_path),
+            bytes_in=source_size(file_path),
+            write_path=write_paths[0],
+            extra_outputs=list(zip(write_paths[1:], output_paths[1:])),
+        )
+        if stream is not None:
+            result.decode_time = stream.decode_time
+            log.append(
+                f"动图：{stream.source_size[0]}x{stream.source_size[1]}，解码 {stream.decoded} 帧"
+                f"（完整播放 {stream.loops} 遍），输出 {stream.seconds:.2f}s\n"
+            )
+        if result.ok:
+            result.outputs = [str(out) for out in output_paths]
+        return result
+    except Exception as e:
+        logger.exception("convert_ladder exception")
+        log.append(f"转换时发生异常:\n{str(e)}\n")
+        return result
+    finally:
+        result.elapsed = time.perf_counter() - started
+        result.log = "".join(log)
+
+
+def slideshow_filter(canvas: tuple[int, int] = SLIDESHOW_SIZE) -> str:
+    """幻灯片滤镜：与单图相同的 scale/pad 思路，但 pad 到固定画布，保证整段视频分辨率一致。"""
+    w, h = canvas
+    return (
+        f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+        f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1,format=yuv420p"
+    )
+
+
+def _codec_family(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return {".jpeg": ".jpg", ".tif": ".tiff"}.get(ext, ext)
+
+
+def write_concat_list(files: list[str], duration: int, list_path: str) -> None:
+    """写 ffconcat 列表；最后一张需重复一次，否则 concat demuxer 会忽略其 duration。"""
+    def quote(p: str) -> str:
+        return "'" + os.path.abspath(p).replace("'", "'\\''") + "'"
+
+    lines = ["ffconcat version 1.0"]
+    for f in files:
+        lines.append(f"file {quote(f)}")
+        lines.append(f"duration {duration}")
+    lines.append(f"file {quote(files[-1])}")
+    with open(list_path, "w", encoding="utf-8") as fh:
+        fh.write("\n".join(lines) + "\n")
+
+
+def build_slideshow_cmd(
+    input_arg: str,
+    output_path: str,
+    options: ConvertOptions,
+    total_seconds: int,
+    canvas: tuple[int, int] = SLIDESHOW_SIZE,
+    raw: bool = False,
+) -> list[str]:
+    """raw=False：input_arg 为 ffconcat 列表；raw=True：stdin 上每张图一帧已缩放好的 rgb24。"""
+    fps = STILL_FPS if options.fast_still else 30
+    if raw:
+        input_args = [
+            "-f", "rawvideo",
+            "-pix_fmt", "rgb24",
+            "-s", f"{canvas[0]}x{canvas[1]}",
+            # 每帧持续 duration 秒，由 -r 在输出端补足帧数
+            "-framerate", f"1/{options.duration}",
+            "-i", "pipe:0",
+        ]
+        vf = "format=yuv420p"
+    else:
+        input_args = ["-f", "concat", "-safe", "0", "-i", input_arg]
+        vf = slideshow_filter(canvas)
+
+    return [
+        options.ffmpeg_bin,
+        "-y",
+        *input_args,
+        "-vf", vf,
+        "-fps_mode", "cfr",
+        "-r", str(fps),
+        "-t", str(total_seconds),
+        *encoder_args(options.profile),
+        str(output_path)
+    ]
+
+
+def convert_slideshow(
+    files: list[str],
+    output_path: str,
+    options: ConvertOptions,
+    canvas: tuple[int, int] = SLIDESHOW_SIZE,
+    on_progress: Optional[Callable[[FFmpegProgress], None]] = None,
+) -> JobResult:
+    """把整个队列在一次 FFmpeg 调用中编码成一个视频，每张图片显示 options.duration 秒。
+
+    所有图片格式相同时使用 concat demuxer，由 FFmpeg 解码并用 scale/pad 统一分辨率；
+    格式混杂时（concat demuxer 不能在文件间切换解码器）改用 Pillow 逐张解码，
+    按需通过 stdin 传入原始帧，内存中最多只有一帧。
+    """
+    result = JobResult(index=0, input_path=f"{len(files)} 张图片", output_path=output_path)
+    log: list[str] = []
+    started = time.perf_counter()
+    list_path = ""
+
+    try:
+        files = [f for f in files if f and source_exists(f)]
+        if not files:
+            log.append("没有可用的图片。\n")
+            return result
+
+        out = Path(output_path)
+        os.makedirs(out.parent, exist_ok=True)
+        if out.exists():
+            out.unlink()
+        write_path = partial_path(output_path)
+
+        total_seconds = options.duration * len(files)
+        # concat demuxer 只能读磁盘上的文件：含压缩包成员时同样走 Pillow 管道
+        mixed = len({_codec_family(f) for f in files}) > 1 or any(is_member(f) for f in files)
+        if mixed:
+            def frames():
+                for f in files:
+                    yield load_canvas_frame(f, canvas).data
+
+            cmd = build_slideshow_cmd("pipe:0", write_path, options, total_seconds, canvas, raw=True)
+            stdin_data = frames()
+            log.append(f"幻灯片：{len(files)} 张图片格式不一致或来自压缩包，使用 Pillow 逐张解码后通过管道传入。\n")
+        else:
+            fd, list_path = tempfile.mkstemp(suffix=".ffconcat", prefix="slideshow_")
+            os.close(fd)
+            write_concat_list(files, options.duration, list_path)
+            cmd = build_slideshow_cmd(list_path, write_path, options, total_seconds, canvas)
+            stdin_data = None
+
+        logger.info(
+            f"Starting slideshow. images={len(files)}, output={output_path}, "
+            f"duration_each={options.duration}s, mixed_formats={mixed}"
+        )
+        execute_ffmpeg(
+            cmd, out, total_seconds, result, log,
+            stdin_data=stdin_data, on_progress=on_progress, label=out.name,
+            bytes_in=sum(source_size(f) for f in files),
+            write_path=Path(write_path),
+        )
+        return result
+    except Exception as e:
+        logger.exception("convert_slideshow exception")
+        log.append(f"生成幻灯片时发生异常:\n{str(e)}\n")
+        return result
+    finally:
+        if list_path:
+            try:
+                os.remove(list_path)
+            except OSError:
+                pass
+        result.elapsed = time.perf_counter() - started
+        result.log = "".join(log)
+
+
+class _KeyClaims:
+    """同一批次内相同缓存键只编码一次：第一个任务负责编码，其余任务等待后从缓存取。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: dict[str, threading.Event] = {}
+
+    def claim(self, key: str) -> tuple[threading.Event, bool]:
+        with self._lock:
+            event = self._events.get(key)
+            if event is not None:
+                return event, False
+            event = self._events[key] = threading.Event()
+            return event, True
+
+
+def cached_result(
+    file_path: str,
+    options: ConvertOptions,
+    cache: OutputCache,
+    key: str,
+    index: int = 0,
+    started: float = 0.0,
+) -> Optional[JobResult]:
+    """缓存命中时把输出链接/复制到位并返回结果，未命中返回 None。"""
+    output_path = output_path_for(file_path, options)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if not cache.get(key, output_path):
+        return None
+    size = os.path.getsize(output_path)
+    logger.info(f"Cache hit. Input: {file_path}, Output: {output_path}")
+    return JobResult(
+        index=index,
+        input_path=file_path,
+        output_path=output_path,
+        ok=True,
+        return_code=0,
+        output_size=size,
+        elapsed=time.perf_counter() - started if started else 0.0,
+        log=f"缓存命中，跳过编码。\n输出文件: {output_path}\n大小: {size} bytes\n",
+        cache_hit=True,
+    )
+
+
+def convert_cached(
+    file_path: str,
+    options: ConvertOptions,
+    cache: OutputCache,
+    claims: _KeyClaims,
+    index: int = 0,
+    on_progress: Optional[ProgressCallback] = None,
+    convert: Optional[Callable[..., JobResult]] = None,
+) -> JobResult:
+    """先查输出缓存，未命中再调用 convert（默认 convert_one）并把结果写入缓存。"""
+    convert = convert or convert_one
+    started = time.perf_counter()
+    try:
+        key = cache_key_for(file_path, options)
+    except Exception:
+        logger.exception(f"Failed to compute cache key for {file_path}")
+        return convert(file_path, options, index=index, on_progress=on_progress)
+
+    event, owner = claims.claim(key)
+    if not owner:
+        event.wait()
+
+    try:
+        hit = cached_result(file_path, options, cache, key, index, started)
+        if hit is not None:
+            return hit
+
+        result = convert(file_path, options, index=index, on_progress=on_progress)
+        if result.ok:
+            cache.put(key, result.output_path)
+        return result
+    finally:
+        if owner:
+            event.set()
+
+
+def low_memory_options(options: ConvertOptions) -> ConvertOptions:
+    """内存不足重试用的配置：单线程 ultrafast，并用 Pillow 按目标尺寸预解码（可用时）。"""
+    # 只检查 Pillow 是否已安装，真正的导入在 frame_ingest 中按需进行
+    ingest = INGEST_PILLOW if importlib.util.find_spec("PIL") is not None else options.ingest
+    return replace(options, ingest=ingest, profile=replace(options.profile, threads=1, preset="ultrafast"))
+
+
+def convert_scheduled(
+    file_path: str,
+    options: ConvertOptions,
+    budget: MemoryBudget,
+    index: int = 0,
+    on_progress: Optional[ProgressCallback] = None,
+    info: Optional[ImageInfo] = None,
+) -> JobResult:
+    """按估算内存向预算申请额度后再转换；因内存不足失败时独占预算、换低内存配置重试一次。
+
+    先按单线程编码的估算准入，准入后再用剩余预算追加编码线程（-threads），
+    小图可以用满分到的 CPU 核数，超大图只能少开或单线程。
+    """
+    info = info or probe_header(file_path)
+    # 动图总是由 Pillow 逐帧解码
+    pillow = options.ingest == INGEST_PILLOW or (info is not None and info.animated)
+    # 只有直接读取文件的非 fast_still 输入使用 -loop 1（见 build_ffmpeg_cmd / build_ladder_cmd）
+    looped = not options.fast_still and not pillow and not is_member(file_path)
+
+    def estimate(threads: int) -> int:
+        profile = replace(options.profile, threads=threads)
+        if not options.renditions:
+            return estimate_job_memory(info, profile, pillow, looped=looped)
+        # 每路 rendition 各有一套编码器缓冲；按各自宽度分别估算再相加（解码部分重复计入，偏保守）
+        return sum(
+            estimate_job_memory(info, replace(profile, max_width=r.width), pillow, looped=looped) for r in options.renditions
+        )
+
+    cost = estimate(1)
+    per_thread = estimate(2) - cost
+    with budget.reserve(cost) as lease:
+        threads = 1 + budget.extend(lease, per_thread, job_threads(options.profile, options.jobs) - 1)
+        job_options = replace(options, profile=replace(options.profile, threads=threads))
+        result = convert_one(file_path, job_options, index=index, on_progress=on_progress, info=info)
+        cost = lease.cost
+    result.memory_estimate = cost
+    logger.info(
+        f"Scheduled job. Input: {file_path}, size={f'{info.width}x{info.height} {info.mode}' if info else 'unknown'}, "
+        f"threads={threads}, estimate={cost // (1024 * 1024)}MB, budget_used_peak={budget.peak // (1024 * 1024)}MB"
+    )
+    if result.ok or not is_oom_failure(result.return_code, result.log):
+        return result
+
+    logger.warning(f"Out of memory, retrying with low-memory settings alone: {file_path}")
+    with budget.exclusive():
+        retry = convert_one(file_path, low_memory_options(options), index=index, on_progress=on_progress, info=info)
+    retry.memory_estimate = cost
+    retry.oom_retried = True
+    retry.elapsed += result.elapsed
+    retry.log = result.log + "\n内存不足，已改用低内存配置（单线程、Pillow 预解码）单独重试：\n\n" + retry.log
+    return retry
+
+
+# 打包模式：一个 FFmpeg 进程内所有图片解码后的像素总数上限（决定每包张数，小图多装、大图少装）
+PACK_PIXEL_BUDGET = 16_000_000
+# 超过该像素数的图片单独转换（打包省下的进程启动开销相对其编码耗时可以忽略）
+PACK_MAX_IMAGE_PIXELS = PACK_PIXEL_BUDGET // 4
+
+
+def packable(options: ConvertOptions, info: Optional[ImageInfo], path: str = "") -> bool:
+    """只有由 FFmpeg 直接读取的普通静态小图才打包；尺寸未知的图片和压缩包成员（stdin 只有一路）单独转换。"""
+    return (
+        options.pack_max > 1
+        and not is_member(path)
+        and not options.renditions
+        and options.ingest == INGEST_FFMPEG
+        and info is not None
+        and not info.animated
+        and info.pixels <= PACK_MAX_IMAGE_PIXELS
+    )
+
+
+def iter_packs(
+    paths: Iterable[str],
+    options: ConvertOptions,
+    info_for: Callable[[str], Optional[ImageInfo]],
+) -> Iterator[list[tuple[str, Optional[ImageInfo]]]]:
+    """把相邻的小图分组：每组不超过 options.pack_max 张，且解码像素总数不超过 PACK_PIXEL_BUDGET。
+
+    不能打包的图片单独成组；pack_max <= 1 时每组一张（不读文件头）。
+    """
+    pack: list[tuple[str, Optional[ImageInfo]]] = []
+    pixels = 0
+    for path in paths:
+        if options.pack_max <= 1:
+            yield [(path, None)]
+            continue
+        info = info_for(path)
+        if not packable(options, info, path):
+            yield [(path, info)]
+            continue
+        if pack and (len(pack) >= options.pack_max or pixels + info.pixels > PACK_PIXEL_BUDGET):
+            yield pack
+            pack, pixels = [], 0
+        pack.append((path, info))
+        pixels += info.pixels
+    if pack:
+        yield pack
+
+
+def build_pack_cmd(
+    inputs: list[str],
+    write_paths: list[str],
+    options: ConvertOptions,
+    infos: list[Optional[ImageInfo]],
+) -> list[str]:
+    """多输入多输出：第 i 张图片经自己的滤镜链（与 build_ffmpeg_cmd 相同）编码到 write_paths[i]。"""
+    input_args: list[str] = []
+    chains: list[str] = []
+    output_args: list[str] = []
+    for i, (path, info) in enumerate(zip(inputs, infos)):
+        base = planned_scale_pad_filter(info, options.profile.max_width)
+        if options.fast_still:
+            input_args += ["-i", str(path)]
+            chains.append(f"[{i}:v]{still_video_filter(options.duration, base)}[v{i}]")
+            rate = ["-r", str(STILL_FPS)]
+        else:
+            input_args += ["-loop", "1", "-framerate", "30", "-t", str(options.duration), "-i", str(path)]
+            chains.append(f"[{i}:v]fps=30,{base}[v{i}]")
+            rate = []
+        output_args += ["-map", f"[v{i}]", *rate, *encoder_args(options.profile), str(write_paths[i])]
+
+    return [
+        options.ffmpeg_bin,
+        "-y",
+        *input_args,
+        "-filter_complex", ";".join(chains),
+        *output_args,
+    ]
+
+
+def convert_pack(
+    items: list[tuple[int, str, Optional[ImageInfo]]],
+    options: ConvertOptions,
+    budget: Optional[MemoryBudget] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    convert: Optional[Callable[..., JobResult]] = None,
+) -> list[JobResult]:
+    """一个 FFmpeg 进程转换多张图片（items 为 (index, 路径, 文件头信息)），返回与 items 对应的结果。
+
+    每张图片写自己的临时文件，全部校验通过后分别原子改名。FFmpeg 失败时（任一输入无法解码，
+    整个进程都会退出）用 convert（默认 convert_one）逐张单独重转，失败只归到真正出错的图片上。
+    """
+    started = time.perf_counter()
+    results = [JobResult(index=idx, input_path=path) for idx, path, _ in items]
+    output_paths = [Path(output_path_for(path, options)) for _, path, _ in items]
+    write_paths = [Path(partial_path(str(out))) for out in output_paths]
+    pack = JobResult(index=items[0][0], input_path=f"{len(items)} 张图片")
+    log: list[str] = []
+
+    try:
+        for out in output_paths:
+            os.makedirs(out.parent, exist_ok=True)
+            if out.exists():
+                out.unlink()
+        cmd = build_pack_cmd([path for _, path, _ in items], [str(w) for w in write_paths], options,
+                             [info for _, _, info in items])
+        looped = not options.fast_still
+        cost = sum(estimate_job_memory(info, options.profile, looped=looped) for _, _, info in items) if budget else 0
+        logger.info(f"Starting packed conversion. images={len(items)}, estimate={cost // (1024 * 1024)}MB")
+
+        def progress(p: FFmpegProgress):
+            for idx, _, _ in items:
+                on_progress(idx, p)
+
+        with budget.reserve(cost) if budget is not None else nullcontext():
+            execute_ffmpeg(
+                cmd, output_paths[0], options.duration, pack, log,
+                on_progress=progress if on_progress else None,
+                label=f"{len(items)} images",
+                bytes_in=sum(os.path.getsize(path) for _, path, _ in items),
+                write_path=write_paths[0],
+                extra_outputs=list(zip(write_paths[1:], output_paths[1:])),
+            )
+    except Exception as e:
+        logger.exception("convert_pack exception")
+        log.append(f"打包转换时发生异常:\n{str(e)}\n")
+        for w in write_paths:
+            discard_partial(str(w))
+
+    elapsed = time.perf_counter() - started
+    if not pack.ok:
+        logger.warning(f"Packed conversion failed (return_code={pack.return_code}); converting {len(items)} images one by one")
+        retried = []
+        for idx, path, _ in items:
+            one = (convert or convert_one)(path, options, index=idx, on_progress=on_progress)
+            one.elapsed += elapsed
+            one.log = f"打包转换失败，已单独重试：\n\n{one.log}"
+            retried.append(one)
+        return retried
+
+    pack_log = "".join(log)
+    for res, out in zip(results, output_paths):
+        res.output_path = str(out)
+        res.ok = True
+        res.return_code = pack.return_code
+        res.output_size = os.path.getsize(out)
+        res.peak_rss_kb = pack.peak_rss_kb
+        res.elapsed = elapsed
+        res.log = f"与其他 {len(items) - 1} 张图片在同一 FFmpeg 进程中转换。\n输出文件: {out}\n大小: {res.output_size} bytes\n\n{pack_log}"
+    return results
+
+
+class JobPipeline:
+    """单个任务的执行链：输出缓存 -> 内存预算准入 -> convert_one，并记录 batch journal。
+
+    run_batch 与监视文件夹（watch_folder）共用；run() 可在多个工作线程中并发调用。
+    """
+
+    def __init__(
+        self,
+        options: ConvertOptions,
+        journal: Optional[BatchJournal] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        headers: Optional[HeaderIndex] = None,
+    ):
+        self.options = options
+        self.journal = journal
+        self.on_progress = on_progress
+        # 队列的文件头索引；为空时每个任务单独探测（长期运行的监视/服务模式不累积索引）
+        self.headers = headers
+        self.cache = open_cache(options.cache_dir, options.cache_max_bytes)
+        self._claims = _KeyClaims()
+        self.memory_budget = resolve_budget(options.memory_budget)
+        self.budget = MemoryBudget(self.memory_budget) if self.memory_budget else None
+
+    def header_info(self, path: str) -> Optional[ImageInfo]:
+        return self.headers.get(path) if self.headers is not None else probe_header(path)
+
+    def _convert(self, path: str, opts: ConvertOptions, index: int = 0, on_progress=None) -> JobResult:
+        info = self.header_info(path)
+        if self.budget is None:
+            return convert_one(path, opts, index=index, on_progress=on_progress, info=info)
+        return convert_scheduled(path, opts, self.budget, index=index, on_progress=on_progress, info=info)
+
+    def _run(self, idx: int, path: str, options: ConvertOptions) -> JobResult:
+        # 输出缓存按单个输出文件存储，多分辨率输出不经过缓存
+        if self.cache is None or options.renditions:
+            return self._convert(path, options, index=idx, on_progress=self.on_progress)
+        return convert_cached(
+            path, options, self.cache, self._claims,
+            index=idx, on_progress=self.on_progress, convert=self._convert,
+        )
+
+    def admit(self, path: str) -> bool:
+        """入队前检查 journal：已完成（输出完整、源文件未变）返回 False，否则记为 queued。"""
+        journal = self.journal
+        if journal is None:
+            return True
+        if journal.is_done(path):
+            return False
+        if journal.state(path) == RUNNING:
+            # 上次运行到一半被中断，清理遗留的临时输出
+            discard_stale_partials(journal.output(path))
+        journal.mark(path, QUEUED)
+        return True
+
+    def _journal_start(self, path: str, options: ConvertOptions) -> int:
+        """记为 running，返回源文件 mtime_ns（完成时一并记录）。"""
+        try:
+            source_mtime_ns = source_stat(path)[0]
+        except OSError:
+            source_mtime_ns = 0
+        self.journal.mark(path, RUNNING, output=output_path_for(path, options))
+        return source_mtime_ns
+
+    def _journal_end(self, path: str, res: JobResult, source_mtime_ns: int) -> None:
+        if res.ok:
+            # 多分辨率输出时 output_size 是总大小，journal 校验的是第一个输出文件
+            size = os.path.getsize(res.output_path) if res.outputs else res.output_size
+            self.journal.mark(path, DONE, output=res.output_path, size=size, source_mtime_ns=source_mtime_ns)
+        else:
+            self.journal.mark(path, FAILED, return_code=res.return_code)
+
+    def run(self, idx: int, path: str, options: Optional[ConvertOptions] = None) -> JobResult:
+        """转换一张图片；options 可覆盖本任务的参数（如输出目录），缓存和内存预算仍然共用。"""
+        options = options or self.options
+        if self.journal is None:
+            return self._run(idx, path, options)
+        source_mtime_ns = self._journal_start(path, options)
+        res = self._run(idx, path, options)
+        self._journal_end(path, res, source_mtime_ns)
+        return res
+
+    def run_pack(self, items: list[tuple[int, str, Optional[ImageInfo]]]) -> list[JobResult]:
+        """转换 iter_packs 分出的一组图片（同一个 FFmpeg 进程）；缓存命中的图片不进入打包。"""
+        if len(items) == 1:
+            return [self.run(items[0][0], items[0][1])]
+        options = self.options
+        started = time.perf_counter()
+        mtimes = {path: self._journal_start(path, options) for _, path, _ in items} if self.journal else {}
+        results: dict[int, JobResult] = {}
+        keys: dict[int, str] = {}
+        todo = []
+        for idx, path, info in items:
+            if self.cache is not None:
+                try:
+                    keys[idx] = cache_key_for(path, options)
+                    hit = cached_result(path, options, self.cache, keys[idx], idx, started)
+                except Exception:
+                    logger.exception(f"Output cache lookup failed for {path}")
+                    hit = None
+                if hit is not None:
+                    results[idx] = hit
+                    continue
+            todo.append((idx, path, info))
+
+        if len(todo) == 1:
+            idx, path, info = todo[0]
+            results[idx] = self._convert(path, options, index=idx, on_progress=self.on_progress)
+        elif todo:
+            for res in convert_pack(todo, options, self.budget, self.on_progress, convert=self._convert):
+                results[res.index] = res
+
+        out = []
+        for idx, path, _ in items:
+            res = results[idx]
+            if self.cache is not None and res.ok and not res.cache_hit and idx in keys:
+                self.cache.put(keys[idx], res.output_path)
+            if self.journal is not None:
+                self._journal_end(path, res, mtimes[path])
+            out.append(res)
+        return out
+
+    def finish(self, summary: BatchSummary) -> None:
+        """把缓存/内存预算统计写入 summary，并结束 journal。"""
+        summary.memory_budget = self.memory_budget
+        budget = self.budget
+        if budget is not None:
+            summary.memory_peak = budget.peak
+            logger.info(
+                f"Memory scheduler: budget={budget.total // (1024 * 1024)}MB, peak={budget.peak // (1024 * 1024)}MB, "
+                f"waits={budget.waits}, oom_retries={summary.oom_retries}"
+            )
+
+        cache = self.cache
+        if cache is not None:
+            cache.flush()
+            summary.cache_hits = cache.hits
+            summary.cache_misses = cache.misses
+            summary.bytes_saved = cache.bytes_saved
+            logger.info(f"Output cache: hits={cache.hits}, misses={cache.misses}, bytes_saved={cache.bytes_saved}")
+
+        if self.journal is not None:
+            self.journal.mark_finished()
+            logger.info(f"Batch journal {self.journal.path}: skipped={summary.skipped}, states={self.journal.counts()}")
+
+
+def job_cost(info: Optional[ImageInfo]) -> int:
+    """任务耗时的排序依据：解码像素数（无法探测的图片视为最大，排在最前）。"""
+    return info.pixels if info is not None else 1 << 62
+
+
+def order_longest_first(paths: Iterable[str], headers: HeaderIndex) -> list[str]:
+    """建立整个队列的文件头索引，按估算耗时从大到小排序（同等成本保持原顺序）。
+
+    并行批量中最慢的任务先启动，不会在队列末尾单独拖长总耗时。
+    tar 包只能顺序读取，其成员保持原来的位置和顺序，只在其余文件之间排序。
+    """
+    infos = headers.probe_all(paths)
+    ranked = iter(sorted((p for p in infos if not is_tar_member(p)), key=lambda p: job_cost(infos[p]), reverse=True))
+    ordered = [p if is_tar_member(p) else next(ranked) for p in infos]
+    headers.save()
+    return ordered
+
+
+def run_batch(
+    files: Iterable[str],
+    options: ConvertOptions,
+    on_result: Optional[Callable[[JobResult], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    on_start: Optional[Callable[[int, str], None]] = None,
+    journal: Optional[BatchJournal] = None,
+    headers: Optional[HeaderIndex] = None,
+) -> BatchSummary:
+    """用 options.jobs 个并行 FFmpeg 任务转换一批图片（阻塞）。
+
+    on_result 在调用线程中按队列顺序回调，便于日志稳定输出；
+    on_start(index, path) 和 on_progress(index, progress) 在各工作线程中回调。
+    cancel_event 被置位后不再启动新任务，已在运行的任务会正常结束。
+    journal 不为空时记录每个任务的状态，并跳过其中已完成（输出仍完整存在）的任务。
+    headers 为预先建立的文件头索引（见 order_longest_first），任务直接复用其中的探测结果。
+    options.pack_max > 1 时相邻的小图按 iter_packs 分组，每组只启动一个 FFmpeg 进程，结果仍逐张回调。
+    """
+    summary = BatchSummary()
+    started = time.perf_counter()
+    jobs = max(1, options.jobs)
+    if hasattr(files, "__len__"):
+        jobs = min(jobs, len(files) or 1)
+    if headers is None and options.pack_max > 1:
+        # 分组时已读过的文件头在转换时复用
+        headers = HeaderIndex()
+    pipeline = JobPipeline(options, journal, on_progress, headers)
+    logger.info(
+        f"Batch started. jobs={jobs}, pack_max={options.pack_max}, cache={options.cache_dir or 'off'}, "
+        f"memory_budget={pipeline.memory_budget // (1024 * 1024) if pipeline.budget else 'off'}MB"
+    )
+
+    def job(items: list[tuple[int, str, Optional[ImageInfo]]]) -> list[Optional[JobResult]]:
+        if cancel_event is not None and cancel_event.is_set():
+            return [None] * len(items)
+        if on_start:
+            for idx, path, _ in items:
+                on_start(idx, path)
+        return pipeline.run_pack(items)
+
+    def unfinished(paths: Iterable[str]) -> Iterator[str]:
+        for path in paths:
+            if pipeline.admit(path):
+                yield path
+            else:
+                summary.skipped += 1
+
+    # files 可以是生成器（例如正在进行的目录扫描）：每次只预取少量任务，
+    # 扫描与转换重叠进行，无需等待整个队列就绪。
+    source = iter_packs(iter(files) if journal is None else unfinished(files), options, pipeline.header_info)
+    exhausted = False
+    max_in_flight = jobs * 2
+    in_flight: dict[Future, list[int]] = {}
+    pending: dict[int, Optional[JobResult]] = {}
+    next_index = 0
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while True:
+            while not exhausted and len(in_flight) < max_in_flight:
+                if cancel_event is not None and cancel_event.is_set():
+                    summary.cancelled = True
+                    exhausted = True
+                    break
+                try:
+                    pack = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                items = [(summary.total + i, path, info) for i, (path, info) in enumerate(pack)]
+                summary.total += len(items)
+                in_flight[pool.submit(job, items)] = [idx for idx, _, _ in items]
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                pending.update(zip(in_flight.pop(fut), fut.result()))
+
+            # 按队列顺序回调
+            while next_index in pending:
+                res = pending.pop(next_index)
+                next_index += 1
+                if res is None:
+                    summary.cancelled = True
+                    continue
+                summary.add(res)
+                if on_result:
+                    on_result(res)
+
+    pipeline.finish(summary)
+    close_archives()
+
+    summary.elapsed = time.perf_counter() - started
+    logger.info(
+        f"Batch finished. total={summary.total}, ok={summary.ok}, fail={summary.fail}, elapsed={summary.elapsed:.2f}s, "
+        f"rate={summary.images_per_second:.2f} img/s"
+    )
+    metrics.flush()
+    return summary
+
+
+def convert_image_file(
+    src: str,
+    output_dir: str,
+    fmt: str,
+    profile: ImageProfile = IMAGE_PROFILES[DEFAULT_IMAGE_PROFILE],
+    timing: Optional[dict] = None,
+) -> str:
+    """把一张 webp 转换成 png/jpg/无损 webp，返回输出路径（失败抛异常）。
+
+    timing 不为空时写入 encode（编码并写文件的耗时，不含解码）。
+    """
+    from PIL import Image
+
+    dst_path = Path(output_dir) / output_name(src, fmt)
+    # 先写临时文件再原子改名，中途崩溃不会留下不完整的输出
+    tmp_path = partial_path(str(dst_path))
+    pil_format, params = save_params(fmt, profile)
+
+    try:
+        with image_source(src) as source, Image.open(source) as im:
+            if fmt == 'jpg':
+                # jpg 不支持透明，转换为 RGB
+                if im.mode in ('RGBA', 'LA'):
+                    bg = Image.new('RGB', im.size, (255, 255, 255))
+                    bg.paste(im, mask=im.split()[-1])
+                    im_out = bg
+                else:
+                    im_out = im.convert('RGB')
+            else:
+                im_out = im
+                im_out.load()
+            started = time.perf_counter()
+            im_out.save(tmp_path, pil_format, **params)
+            if timing is not None:
+                timing["encode"] = time.perf_counter() - started
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        discard_partial(tmp_path)
+        raise
+
+    return str(dst_path)
+
+
+@dataclass
+class ImageResult:
+    index: int
+    input_path: str
+    output_path: str = ""
+    ok: bool = False
+    error: str = ""
+    input_bytes: int = 0
+    output_bytes: int = 0
+    elapsed: float = 0.0
+    # 编码（Image.save）耗时，不含解码
+    encode_time: float = 0.0
+
+
+@dataclass
+class ImageBatchSummary:
+    total: int = 0
+    ok: int = 0
+    fail: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    elapsed: float = 0.0
+    cancelled: bool = False
+    profile: str = DEFAULT_IMAGE_PROFILE
+    # 成功任务的编码耗时之和（各进程 CPU 时间，不是墙钟时间）
+    encode_time: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return (self.ok + self.fail) / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.input_bytes / (1024 * 1024) / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def convert_image_job(
+    index: int,
+    src: str,
+    output_dir: str,
+    fmt: str,
+    profile: ImageProfile = IMAGE_PROFILES[DEFAULT_IMAGE_PROFILE],
+) -> ImageResult:
+    """进程池中执行的单个图片转换任务（不抛异常，错误写入结果）。"""
+    result = ImageResult(index=index, input_path=src)
+    started = time.perf_counter()
+    timing: dict = {}
+    try:
+        result.input_bytes = source_size(src)
+        output_dir = output_dir or default_output_dir(src)
+        os.makedirs(output_dir, exist_ok=True)
+        result.output_path = convert_image_file(src, output_dir, fmt, profile, timing)
+        result.encode_time = timing.get("encode", 0.0)
+        result.output_bytes = os.path.getsize(result.output_path)
+        result.ok = True
+    except Exception as e:
+        result.error = str(e)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def convert_images(
+    files: Iterable[str],
+    output_dir: str,
+    fmt: str,
+    jobs: int = 0,
+    on_result: Optional[Callable[[ImageResult], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    profile: ImageProfile = IMAGE_PROFILES[DEFAULT_IMAGE_PROFILE],
+) -> ImageBatchSummary:
+    """用进程池把一批 webp 转换成 png/jpg/无损 webp（阻塞）。
+
+    编码参数与 convert_image_file 相同，输出逐字节一致。on_result 在调用线程中按队列顺序回调；
+    cancel_event 被置位后取消尚未开始的任务。
+    """
+    queue = list(files)
+    summary = ImageBatchSummary(total=len(queue), profile=profile.name)
+    started = time.perf_counter()
+    jobs = max(1, min(jobs or default_jobs(), len(queue) or 1))
+    logger.info(f"Image batch started. total={len(queue)}, jobs={jobs}, format={fmt}, profile={profile.name}")
+
+    pending: dict[int, Optional[ImageResult]] = {}
+    next_index = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(convert_image_job, idx, src, output_dir, fmt, profile): idx for idx, src in enumerate(queue)
+        }
+        for fut in as_completed(futures):
+            if cancel_event is not None and cancel_event.is_set() and not summary.cancelled:
+                summary.cancelled = True
+                for other in futures:
+                    other.cancel()
+            # 已取消的任务记为 None，有序回调时跳过
+            res = None if fut.cancelled() else fut.result()
+            pending[futures[fut]] = res
+            if res is not None:
+                # 任务在子进程中执行，耗时在父进程统一记录
+                metrics.record(
+                    "image_convert", res.elapsed, res.input_bytes, res.output_bytes, res.ok,
+                    input=res.input_path, format=fmt, profile=profile.name, encode_time=round(res.encode_time, 6),
+                )
+
+            while next_index in pending:
+                res = pending.pop(next_index)
+                next_index += 1
+                if res is None:
+                    continue
+                if res.ok:
+                    summary.ok += 1
+                    summary.input_bytes += res.input_bytes
+                    summary.output_bytes += res.output_bytes
+                    summary.encode_time += res.encode_time
+                else:
+                    summary.fail += 1
+                if on_result:
+                    on_result(res)
+
+    summary.elapsed = time.perf_counter() - started
+    logger.info(
+        f"Image batch finished. profile={profile.name}, ok={summary.ok}, fail={summary.fail}, "
+        f"elapsed={summary.elapsed:.2f}s, encode={summary.encode_time:.2f}s, output_bytes={summary.output_bytes}, "
+        f"rate={summary.files_per_second:.2f} files/s, {summary.mb_per_second:.2f} MB/s"
+    )
+    metrics.flush()
+    return summary
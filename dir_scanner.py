@@ -0,0 +1,155 @@
+"""基于 os.scandir 的流式目录扫描。
+
+边扫描边产出图片路径，转换队列不必等整棵目录树扫描完成；
+scandir 的目录项自带文件类型信息，不需要再对每个文件单独 stat。
+可选的 DirIndex 按目录 mtime 持久化每个目录的扫描结果，未变化的目录重扫时直接复用。
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional
+
+from archive_source import is_archive, iter_members
+import metrics
+from logging_config import logger
+from output_cache import app_cache_dir
+
+INDEX_FILE_NAME = "dir_index.json"
+
+
+def default_index_path() -> str:
+    return os.path.join(app_cache_dir(), INDEX_FILE_NAME)
+
+
+class DirIndex:
+    """目录索引：{目录: {"mtime_ns", "files", "dirs"}}。
+
+    目录的 mtime 在其中的条目增删/改名时变化，因此 mtime 未变即可复用上次的文件名列表。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._dirs: dict[str, dict] = {}
+        self.reused = 0
+        self.scanned = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._dirs = dict(json.load(f).get("dirs", {}))
+        except FileNotFoundError:
+            self._dirs = {}
+        except Exception:
+            logger.exception(f"Failed to load directory index {self.path}; starting empty")
+            self._dirs = {}
+
+    def lookup(self, dir_path: str, mtime_ns: int) -> Optional[tuple[list[str], list[str]]]:
+        with self._lock:
+            entry = self._dirs.get(dir_path)
+            if entry is None or entry.get("mtime_ns") != mtime_ns:
+                return None
+            self.reused += 1
+            return list(entry.get("files", [])), list(entry.get("dirs", []))
+
+    def update(self, dir_path: str, mtime_ns: int, files: list[str], dirs: list[str]):
+        with self._lock:
+            self._dirs[dir_path] = {"mtime_ns": mtime_ns, "files": files, "dirs": dirs}
+            self.scanned += 1
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"dirs": self._dirs}, f)
+                os.replace(tmp, self.path)
+                self._dirty = False
+            except Exception:
+                logger.exception(f"Failed to save directory index {self.path}")
+
+
+def _list_dir(dir_path: str, accept: Callable[[str], bool]) -> tuple[list[str], list[str]]:
+    """一次 scandir 得到 (图片文件名, 子目录名)；类型判断复用目录项缓存的 d_type。"""
+    files: list[str] = []
+    dirs: list[str] = []
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            try:
+                # 与 os.walk 默认行为一致：不进入符号链接目录
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif accept(entry.name) and entry.is_file():
+                    files.append(entry.name)
+            except OSError:
+                continue
+    return files, dirs
+
+
+def iter_dir(root: str, accept: Callable[[str], bool], index: Optional[DirIndex] = None) -> Iterator[str]:
+    """深度优先遍历 root，按 os.walk 的自顶向下顺序逐个产出匹配的文件。"""
+    stack = [root]
+    while stack:
+        dir_path = stack.pop()
+        started = time.perf_counter()
+        try:
+            listing = None
+            mtime_ns = 0
+            if index is not None:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+                listing = index.lookup(dir_path, mtime_ns)
+            if listing is None:
+                listing = _list_dir(dir_path, accept)
+                if index is not None:
+                    index.update(dir_path, mtime_ns, *listing)
+        except OSError:
+            logger.exception(f"Failed to scan directory: {dir_path}")
+            metrics.record("scan", time.perf_counter() - started, ok=False, dir=dir_path)
+            continue
+
+        files, dirs = listing
+        metrics.record("scan", time.perf_counter() - started, dir=dir_path, files=len(files), dirs=len(dirs))
+        for name in files:
+            yield os.path.join(dir_path, name)
+        # 逆序压栈，保证子目录按列举顺序处理
+        for name in reversed(dirs):
+            stack.append(os.path.join(dir_path, name))
+
+
+def iter_images(
+    paths: Iterable[str],
+    accept: Callable[[str], bool],
+    index: Optional[DirIndex] = None,
+) -> Iterator[str]:
+    """把文件/文件夹/压缩包流式展开成去重后的图片路径（压缩包成员路径见 archive_source）。"""
+    seen: set[str] = set()
+    for p in paths:
+        if not p:
+            continue
+        try:
+            if os.path.isdir(p):
+                found = iter_dir(p, accept, index)
+            elif os.path.isfile(p) and accept(p):
+                found = iter([p])
+            elif os.path.isfile(p) and is_archive(p):
+                # 压缩包：逐个列出其中的图片成员，不解压
+                found = iter_members(p, accept)
+            else:
+                continue
+            for fp in found:
+                if fp not in seen:
+                    seen.add(fp)
+                    yield fp
+        except Exception:
+            logger.exception(f"Failed to collect images from path: {p}")
+    if index is not None:
+        index.save()
+        logger.info(f"Directory index: reused={index.reused}, scanned={index.scanned}")
@@ -0,0 +1,95 @@
+"""命名编码配置（profile）。
+
+throughput 与旧版硬编码参数一致（ultrafast / crf 23 / 单线程），适合大量并行任务；
+balanced 和 smallest 用更多 CPU 换更小的文件。
+autotune 在本机测得的最佳配置保存为 "tuned"。
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, fields
+from typing import Optional
+
+from logging_config import logger
+from output_cache import app_cache_dir
+
+TUNED_PROFILE_FILE = "tuned_profile.json"
+TUNED = "tuned"
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    name: str
+    preset: str = "ultrafast"
+    crf: int = 23
+    # FFmpeg -threads；0 表示由 FFmpeg 自动决定
+    threads: int = 1
+    thread_type: str = "slice"
+    tune: str = "stillimage"
+    # 输出宽度（scale=W:-2）
+    max_width: int = 1280
+    # 推荐并行任务数；0 表示使用 CPU 核心数
+    jobs: int = 0
+
+
+PROFILES: dict[str, EncoderProfile] = {
+    # 降低内存占用：单线程（部分机器/环境下大图编码可能出现 Cannot allocate memory），靠多任务并行吃满 CPU
+    "throughput": EncoderProfile("throughput", preset="ultrafast", crf=23, threads=1),
+    "balanced": EncoderProfile("balanced", preset="veryfast", crf=23, threads=2),
+    "smallest": EncoderProfile("smallest", preset="slow", crf=26, threads=0),
+}
+DEFAULT_PROFILE = "throughput"
+
+
+def tuned_profile_path() -> str:
+    return os.path.join(app_cache_dir(), TUNED_PROFILE_FILE)
+
+
+def load_tuned_profile(path: Optional[str] = None) -> Optional[EncoderProfile]:
+    path = path or tuned_profile_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.exception(f"Failed to load tuned profile {path}")
+        return None
+
+    known = {f.name for f in fields(EncoderProfile)}
+    values = {k: v for k, v in data.get("profile", {}).items() if k in known}
+    values["name"] = TUNED
+    try:
+        return EncoderProfile(**values)
+    except TypeError:
+        logger.exception(f"Invalid tuned profile {path}")
+        return None
+
+
+def save_tuned_profile(profile: EncoderProfile, measurements: dict, path: Optional[str] = None) -> str:
+    """保存本机最佳配置（连同测量数据，便于事后查看）。"""
+    path = path or tuned_profile_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {"profile": asdict(profile), "measurements": measurements}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def available_profiles() -> list[str]:
+    names = list(PROFILES)
+    if load_tuned_profile() is not None:
+        names.append(TUNED)
+    return names
+
+
+def get_profile(name: str) -> EncoderProfile:
+    """按名称取配置；tuned 不存在或名称未知时回退到默认配置。"""
+    if name == TUNED:
+        tuned = load_tuned_profile()
+        if tuned is not None:
+            return tuned
+        logger.info("Tuned profile not found; using default profile")
+    return PROFILES.get(name, PROFILES[DEFAULT_PROFILE])
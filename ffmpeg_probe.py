@@ -0,0 +1,151 @@
+"""FFmpeg 能力探测（版本、编码器、滤镜）及其磁盘缓存。
+
+探测需要启动三次 FFmpeg，冷启动时可能要几百毫秒。结果按可执行文件的绝对路径 +
+mtime + 大小缓存到磁盘，FFmpeg 未升级/替换时后续启动直接读缓存，不再启动子进程。
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from ffmpeg_runner import popen_kwargs
+from logging_config import logger
+from output_cache import app_cache_dir
+
+PROBE_FILE_NAME = "ffmpeg_probe.json"
+PROBE_TIMEOUT = 15
+
+_memo: dict[str, "FFmpegCapabilities"] = {}
+_memo_lock = threading.Lock()
+
+
+@dataclass
+class FFmpegCapabilities:
+    path: str
+    version: str = ""
+    encoders: list[str] = field(default_factory=list)
+    filters: list[str] = field(default_factory=list)
+    # True 表示本次来自磁盘缓存（未启动 FFmpeg）
+    cached: bool = False
+
+    def has_encoder(self, name: str) -> bool:
+        return name in self.encoders
+
+    def has_filter(self, name: str) -> bool:
+        return name in self.filters
+
+
+def default_probe_path() -> str:
+    return os.path.join(app_cache_dir(), PROBE_FILE_NAME)
+
+
+def resolve_binary(ffmpeg_bin: str) -> Optional[str]:
+    """按 PATH 解析为绝对路径；找不到时返回 None。"""
+    found = shutil.which(ffmpeg_bin)
+    return os.path.abspath(found) if found else None
+
+
+def _run(path: str, *args: str) -> str:
+    out = subprocess.run(
+        [path, "-hide_banner", *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        timeout=PROBE_TIMEOUT,
+        **popen_kwargs()
+    ).stdout
+    return out.decode("utf-8", errors="replace")
+
+
+def parse_encoders(text: str) -> list[str]:
+    """解析 `ffmpeg -encoders`：分隔线 ------ 之后每行为 "标志 名称 描述"。"""
+    names = []
+    started = False
+    for line in text.splitlines():
+        if line.strip().startswith("------"):
+            started = True
+            continue
+        parts = line.split()
+        if started and len(parts) >= 2:
+            names.append(parts[1])
+    return names
+
+
+def parse_filters(text: str) -> list[str]:
+    """解析 `ffmpeg -filters`：每行为 "标志 名称 输入->输出 描述"。"""
+    names = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 3 and "->" in parts[2]:
+            names.append(parts[1])
+    return names
+
+
+def _load_cache(cache_path: str) -> dict:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return dict(json.load(f))
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        logger.exception(f"Failed to load ffmpeg probe cache {cache_path}")
+        return {}
+
+
+def _save_cache(cache_path: str, data: dict) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        tmp = cache_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, cache_path)
+    except Exception:
+        logger.exception(f"Failed to save ffmpeg probe cache {cache_path}")
+
+
+def probe_ffmpeg(ffmpeg_bin: str = "ffmpeg", cache_path: Optional[str] = None) -> Optional[FFmpegCapabilities]:
+    """探测 FFmpeg；不可用时返回 None。同一进程内和磁盘上都会缓存结果。"""
+    path = resolve_binary(ffmpeg_bin)
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+    memo_key = f"{path}:{st.st_mtime_ns}:{st.st_size}"
+    with _memo_lock:
+        if memo_key in _memo:
+            return _memo[memo_key]
+
+    cache_path = cache_path or default_probe_path()
+    cache = _load_cache(cache_path)
+    entry = cache.get(path)
+    if entry and entry.get("stamp") == stamp:
+        caps = FFmpegCapabilities(**entry["caps"])
+        caps.cached = True
+    else:
+        try:
+            version = _run(path, "-version").splitlines()
+            caps = FFmpegCapabilities(
+                path=path,
+                version=version[0] if version else "",
+                encoders=parse_encoders(_run(path, "-encoders")),
+                filters=parse_filters(_run(path, "-filters")),
+            )
+        except (OSError, subprocess.SubprocessError):
+            logger.exception(f"FFmpeg probe failed: {path}")
+            return None
+        cache[path] = {"stamp": stamp, "caps": {k: v for k, v in asdict(caps).items() if k != "cached"}}
+        _save_cache(cache_path, cache)
+        logger.info(
+            f"FFmpeg probed: {caps.version}; encoders={len(caps.encoders)}, filters={len(caps.filters)}"
+        )
+
+    with _memo_lock:
+        _memo[memo_key] = caps
+    return caps
@@ -0,0 +1,186 @@
+"""运行 FFmpeg 并增量解析进度。
+
+用 -progress pipe:1 让 FFmpeg 把机器可读的 key=value 进度写到 stdout，逐行解析后回调；
+stderr 由后台线程读取，只保留最后 STDERR_TAIL_LINES 行用于失败诊断，
+因此无论 FFmpeg 输出多少内容，每个任务的内存占用都是固定的。
+"""
+
+import os
+import subprocess
+import sys
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional, Union
+
+import metrics
+from logging_config import logger
+
+STDERR_TAIL_LINES = 200
+
+
+def popen_kwargs() -> dict:
+    """Windows 下不弹出控制台窗口。"""
+    flags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+    return {"creationflags": flags} if flags else {}
+
+
+@dataclass
+class FFmpegProgress:
+    frame: int = 0
+    fps: float = 0.0
+    speed: float = 0.0
+    out_time: float = 0.0
+    percent: float = 0.0
+    done: bool = False
+
+    def describe(self) -> str:
+        return f"{self.percent:.0f}%（帧 {self.frame}，{self.fps:.1f} fps，{self.speed:.2f}x）"
+
+
+class ProgressParser:
+    """解析 -progress 输出；每遇到一行 progress=continue/end 产出一次快照。"""
+
+    def __init__(self, duration: float):
+        self.duration = max(float(duration), 0.001)
+        self._current = FFmpegProgress()
+
+    @staticmethod
+    def _number(value: str) -> float:
+        try:
+            return float(value.strip().rstrip("x"))
+        except ValueError:
+            return 0.0
+
+    def feed(self, line: str) -> Optional[FFmpegProgress]:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+
+        cur = self._current
+        if key == "frame":
+            cur.frame = int(self._number(value))
+        elif key == "fps":
+            cur.fps = self._number(value)
+        elif key == "speed":
+            cur.speed = self._number(value)
+        elif key == "out_time_us":
+            # 部分版本的 out_time_ms 实际也是微秒，这里只认 out_time_us
+            cur.out_time = max(0.0, self._number(value) / 1_000_000)
+        elif key == "progress":
+            cur.done = value.strip() == "end"
+            cur.percent = 100.0 if cur.done else min(99.9, cur.out_time * 100.0 / self.duration)
+            snapshot = FFmpegProgress(**vars(cur))
+            return snapshot
+        return None
+
+
+@dataclass
+class FFmpegRun:
+    return_code: Optional[int]
+    stderr_tail: str
+    progress: FFmpegProgress
+    # FFmpeg 进程的峰值常驻内存（KB）；平台不支持时为 None
+    peak_rss_kb: Optional[int] = None
+
+
+def wait_with_rusage(process: subprocess.Popen) -> tuple[int, Optional[int]]:
+    """等待子进程结束，返回 (返回码, 峰值 RSS KB)。POSIX 上用 wait4 取得该进程自身的 rusage。"""
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    try:
+        _pid, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # 已被其他地方回收
+        return process.wait(), None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # Linux 的 ru_maxrss 单位为 KB，macOS 为字节
+    peak = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return process.returncode, peak
+
+
+def with_progress_args(cmd: list[str]) -> list[str]:
+    """在可执行文件之后插入进度输出参数。"""
+    return [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+
+
+def run_ffmpeg(
+    cmd: list[str],
+    duration: float,
+    stdin_data: Optional[Union[bytes, Iterable[bytes]]] = None,
+    on_progress: Optional[Callable[[FFmpegProgress], None]] = None,
+) -> FFmpegRun:
+    """运行 FFmpeg（阻塞）。启动失败时抛出原始异常。
+
+    stdin_data 可以是 bytes，也可以是逐块产出 bytes 的迭代器（在写入线程中按需生成，
+    例如逐帧解码的图片），从而不必把全部输入放在内存里。
+    """
+    with metrics.span("ffmpeg_spawn"):
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE if stdin_data is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **popen_kwargs()
+        )
+
+    tail: deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+
+    def drain_stderr():
+        for raw in iter(process.stderr.readline, b""):
+            tail.append(raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+
+    def feed_stdin():
+        try:
+            if isinstance(stdin_data, (bytes, bytearray)):
+                process.stdin.write(stdin_data)
+            else:
+                for chunk in stdin_data:
+                    process.stdin.write(chunk)
+        except (BrokenPipeError, OSError):
+            # FFmpeg 提前退出，错误信息在 stderr 中
+            pass
+        except Exception:
+            # 输入生成失败（如图片无法解码）：关闭 stdin，FFmpeg 会以错误结束
+            logger.exception("Failed to produce ffmpeg stdin data")
+        finally:
+            # 提前结束时立即关闭生成器，释放其打开的输入（如 tar 成员持有的读取锁）
+            close = getattr(stdin_data, "close", None)
+            if close is not None:
+                close()
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    threads = [threading.Thread(target=drain_stderr, daemon=True)]
+    if stdin_data is not None:
+        threads.append(threading.Thread(target=feed_stdin, daemon=True))
+    for t in threads:
+        t.start()
+
+    parser = ProgressParser(duration)
+    last = FFmpegProgress()
+    for raw in iter(process.stdout.readline, b""):
+        snapshot = parser.feed(raw.decode("utf-8", errors="replace"))
+        if snapshot is None:
+            continue
+        last = snapshot
+        if on_progress:
+            try:
+                on_progress(snapshot)
+            except Exception:
+                logger.exception("on_progress callback failed")
+
+    return_code, peak_rss_kb = wait_with_rusage(process)
+    for t in threads:
+        t.join()
+    process.stdout.close()
+    process.stderr.close()
+
+    return FFmpegRun(
+        return_code=return_code,
+        stderr_tail="\n".join(tail),
+        progress=last,
+        peak_rss_kb=peak_rss_kb,
+    )
@@ -0,0 +1,166 @@
+"""可选的 Pillow 预解码阶段。
+
+超大相机 JPEG 交给 FFmpeg 时会先按原始分辨率完整解码再缩放到 1280 宽，
+这正是 "Cannot allocate memory" 的来源。这里用 Pillow 的 JPEG draft 模式在
+DCT 阶段直接按 1/2、1/4、1/8 解码到接近目标尺寸，在进程内完成缩放和偶数对齐，
+再把单帧 rgb24 原始数据通过 stdin 交给 FFmpeg（-f rawvideo）。
+"""
+
+import math
+import time
+from dataclasses import dataclass
+from typing import Iterator
+
+from archive_source import image_source
+
+# 默认与 converter_engine.SCALE_PAD_FILTER 中的 scale=1280:-2 保持一致
+TARGET_WIDTH = 1280
+
+# 动图输出帧率：每帧按自身时长折算为该帧率下的重复次数（按累计时间取整，总时长不漂移）
+ANIMATION_FPS = 30
+# 与浏览器一致：未写时长或不超过 10ms 的帧按 100ms 显示
+DEFAULT_FRAME_MS = 100
+MIN_FRAME_MS = 10
+
+
+@dataclass
+class RawFrame:
+    width: int
+    height: int
+    data: bytes
+    source_size: tuple[int, int]
+    decode_time: float
+
+    @property
+    def pix_fmt(self) -> str:
+        return "rgb24"
+
+
+def target_size(width: int, height: int, target_width: int = TARGET_WIDTH) -> tuple[int, int]:
+    """等价于 FFmpeg 的 scale=W:-2：宽度固定为 target_width，高度按比例取偶数。"""
+    h = max(2, int(round(height * target_width / width / 2.0)) * 2)
+    return target_width, h
+
+
+def load_frame(path, target_width: int = TARGET_WIDTH) -> RawFrame:
+    """解码并缩放图片，返回 rgb24 原始帧（需要 Pillow）。path 可以是路径（含压缩包成员）或文件对象。"""
+    from PIL import Image
+
+    started = time.perf_counter()
+    with image_source(path) as src, Image.open(src) as im:
+        source_size = im.size
+        size = target_size(im.width, im.height, target_width)
+
+        # JPEG：在解码阶段直接降采样，内存和耗时按缩放比例下降
+        if im.format == "JPEG":
+            im.draft("RGB", size)
+
+        frame = im if im.mode == "RGB" else im.convert("RGB")
+        if frame.size != size:
+            # reducing_gap 先用 reduce() 做整数倍快速缩小，再做高质量重采样
+            frame = frame.resize(size, Image.Resampling.BICUBIC, reducing_gap=2.0)
+        data = frame.tobytes()
+
+    return RawFrame(
+        width=size[0],
+        height=size[1],
+        data=data,
+        source_size=source_size,
+        decode_time=time.perf_counter() - started,
+    )
+
+
+def load_canvas_frame(path, canvas: tuple[int, int]) -> RawFrame:
+    """等比缩放到 canvas 内并居中补黑边（等价于 scale=W:H:force_original_aspect_ratio=decrease,pad=W:H）。"""
+    from PIL import Image
+
+    started = time.perf_counter()
+    with image_source(path) as src, Image.open(src) as im:
+        source_size = im.size
+        scale = min(canvas[0] / im.width, canvas[1] / im.height)
+        size = (max(1, int(im.width * scale)), max(1, int(im.height * scale)))
+
+        if im.format == "JPEG":
+            im.draft("RGB", size)
+
+        frame = im if im.mode == "RGB" else im.convert("RGB")
+        if frame.size != size:
+            frame = frame.resize(size, Image.Resampling.BICUBIC, reducing_gap=2.0)
+        out = Image.new("RGB", canvas, (0, 0, 0))
+        out.paste(frame, ((canvas[0] - size[0]) // 2, (canvas[1] - size[1]) // 2))
+        data = out.tobytes()
+
+    return RawFrame(
+        width=canvas[0],
+        height=canvas[1],
+        data=data,
+        source_size=source_size,
+        decode_time=time.perf_counter() - started,
+    )
+
+
+class AnimationStream:
+    """把动图（GIF/WebP）逐帧解码、缩放后按固定帧率产出 rgb24 原始帧，供 FFmpeg 从 stdin 读取。
+
+    帧在 frames() 迭代时才解码，同一帧的重复输出复用同一个 bytes 对象，
+    内存中只有 Pillow 当前帧（及其合成用的上一帧）和一份输出帧，与动画长度无关。
+    动画不足 min_seconds 时从头循环，到 min_seconds 为止；超过时完整播放一遍。
+    """
+
+    def __init__(self, path: str, target_width: int = TARGET_WIDTH, min_seconds: float = 0.0, fps: int = ANIMATION_FPS):
+        from PIL import Image
+
+        with image_source(path) as src, Image.open(src) as im:
+            self.source_size = im.size
+        self.path = path
+        self.width, self.height = target_size(*self.source_size, target_width)
+        self.fps = fps
+        self.min_frames = math.ceil(min_seconds * fps)
+        self.decode_time = 0.0
+        self.decoded = 0
+        self.emitted = 0
+        self.loops = 0
+
+    @property
+    def seconds(self) -> float:
+        return self.emitted / self.fps
+
+    def _frame(self, im) -> bytes:
+        from PIL import Image
+
+        started = time.perf_counter()
+        frame = im.convert("RGB")
+        if frame.size != (self.width, self.height):
+            frame = frame.resize((self.width, self.height), Image.Resampling.BICUBIC, reducing_gap=2.0)
+        data = frame.tobytes()
+        self.decode_time += time.perf_counter() - started
+        self.decoded += 1
+        return data
+
+    def frames(self) -> Iterator[bytes]:
+        from PIL import Image
+
+        elapsed_ms = 0
+        with image_source(self.path) as src, Image.open(src) as im:
+            while True:
+                index = 0
+                while True:
+                    try:
+                        im.seek(index)
+                    except EOFError:
+                        break
+                    index += 1
+                    data = self._frame(im)
+                    duration = im.info.get("duration") or 0
+                    elapsed_ms += duration if duration > MIN_FRAME_MS else DEFAULT_FRAME_MS
+                    repeats = int(elapsed_ms * self.fps / 1000 + 0.5) - self.emitted
+                    if self.loops:
+                        repeats = min(repeats, self.min_frames - self.emitted)
+                    for _ in range(repeats):
+                        self.emitted += 1
+                        yield data
+                    if self.loops and self.emitted >= self.min_frames:
+                        return
+                self.loops += 1
+                if index == 0 or self.emitted >= self.min_frames:
+                    return
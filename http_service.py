@@ -0,0 +1,558 @@
+"""本地 HTTP 转换服务（只用标准库，默认只监听 127.0.0.1）。
+
+    POST   /jobs                 上传图片（请求体为图片字节，?name=xx.png 或 Content-Type 指明格式），
+                                 或提交本机路径（application/json：{"path": "..."}）；返回 202 和任务 id
+    GET    /jobs                 任务列表
+    GET    /jobs/<id>[?wait=N]   任务状态和进度（wait：最多等待 N 秒直到任务结束）
+    GET    /jobs/<id>/result     流式返回生成的 MP4
+    DELETE /jobs/<id>            取消排队中的任务，或删除已结束任务的文件
+    GET    /stats                延迟分位数、吞吐、队列深度（JSON）
+    GET    /metrics              Prometheus 文本格式（含各阶段耗时）
+    GET    /healthz
+
+任务交给 JobPipeline（输出缓存、内存预算与命令行相同），最多 jobs 个并行；
+排队任务数达到 max_queue 时返回 429，同时处理的请求数达到 max_connections 时返回 503。
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from batch_journal import DONE, FAILED, QUEUED, RUNNING
+from converter_engine import BatchSummary, ConvertOptions, JobPipeline, JobResult, is_supported_file
+from ffmpeg_runner import FFmpegProgress
+from logging_config import logger
+from output_cache import app_cache_dir, discard_partial
+
+CANCELLED = "cancelled"
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+# 保留最近多少个已结束任务（更早的连同文件一起删除）
+DEFAULT_KEEP_FINISHED = 1000
+# GET /jobs/<id>?wait=N 的最长等待
+MAX_WAIT_SECONDS = 60
+# 吞吐统计的滑动窗口
+THROUGHPUT_WINDOW = 60.0
+_CHUNK = 1024 * 1024
+
+_CONTENT_TYPE_EXT = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/bmp": ".bmp",
+    "image/tiff": ".tiff",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+_JOB_PATH = re.compile(r"^/jobs/([0-9a-f]+)(/result)?$")
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class ServiceJob:
+    id: str
+    seq: int
+    input_path: str
+    upload: bool
+    options: ConvertOptions
+    state: str = QUEUED
+    progress: float = 0.0
+    created: float = field(default_factory=time.monotonic)
+    started: float = 0.0
+    finished: float = 0.0
+    result: Optional[JobResult] = None
+    future: Optional[Future] = None
+    done: threading.Event = field(default_factory=threading.Event)
+
+    @property
+    def finished_state(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def to_dict(self) -> dict:
+        now = time.monotonic()
+        data = {
+            "id": self.id,
+            "state": self.state,
+            "input": os.path.basename(self.input_path) if self.upload else self.input_path,
+            "progress": round(self.progress, 1),
+            "queue_wait": round((self.started or now) - self.created, 3) if self.state != CANCELLED else None,
+            "elapsed": round((self.finished or now) - self.created, 3),
+            "status_url": f"/jobs/{self.id}",
+        }
+        if self.state == DONE and self.result is not None:
+            data["output_size"] = self.result.output_size
+            data["cache_hit"] = self.result.cache_hit
+            data["result_url"] = f"/jobs/{self.id}/result"
+            if len(self.result.outputs) > 1:
+                # 多分辨率输出：/result?rendition=720p.webm 取指定文件（默认第一个）
+                data["renditions"] = [_rendition_of(p) for p in self.result.outputs]
+        if self.state == FAILED and self.result is not None:
+            data["error"] = self.result.log[-2000:]
+        return data
+
+
+def _rendition_of(output_path: str) -> str:
+    """outputs/<id>_720p.webm -> 720p.webm"""
+    return os.path.basename(output_path).rpartition("_")[2]
+
+
+class ConversionService:
+    def __init__(
+        self,
+        options: ConvertOptions,
+        work_dir: str = "",
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_upload_bytes: int = DEFAULT_MAX_UPLOAD_BYTES,
+        keep_finished: int = DEFAULT_KEEP_FINISHED,
+    ):
+        self.options = options
+        self.work_dir = work_dir or os.path.join(app_cache_dir(), "service")
+        self.upload_dir = os.path.join(self.work_dir, "uploads")
+        self.output_dir = os.path.join(self.work_dir, "outputs")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.max_queue = max_queue
+        self.max_upload_bytes = max_upload_bytes
+        self.keep_finished = keep_finished
+
+        self.jobs = max(1, options.jobs)
+        self.pipeline = JobPipeline(options, on_progress=self._on_progress)
+        self._pool = ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="convert")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, ServiceJob]" = OrderedDict()
+        self._by_seq: dict[int, ServiceJob] = {}
+        self._seq = 0
+        self.queued = 0
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.started_at = time.monotonic()
+        self._latencies: deque[float] = deque(maxlen=10000)
+        self._finish_times: deque[float] = deque()
+
+    # --- 任务 ---
+
+    def is_full(self) -> bool:
+        with self._lock:
+            return self.queued >= self.max_queue
+
+    def reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def new_upload_path(self, ext: str) -> tuple[str, str]:
+        """为上传分配任务 id 和落盘路径（文件名即 id，输出为 outputs/<id>.mp4，互不冲突）。"""
+        job_id = uuid.uuid4().hex[:16]
+        return job_id, os.path.join(self.upload_dir, job_id + ext)
+
+    def submit(self, path: str, upload: bool = False, job_id: str = "") -> ServiceJob:
+        """排队一个任务；队列已满时抛出 QueueFull。"""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull()
+            options = replace(self.options, output_dir=self.output_dir) if upload else self.options
+            job = ServiceJob(id=job_id or uuid.uuid4().hex[:16], seq=self._seq, input_path=path,
+                             upload=upload, options=options)
+            self._seq += 1
+            self._jobs[job.id] = job
+            self._by_seq[job.seq] = job
+            self.queued += 1
+            self.submitted += 1
+            job.future = self._pool.submit(self._execute, job)
+        logger.info(f"Service job queued. id={job.id}, input={path}, upload={upload}")
+        return job
+
+    def _execute(self, job: ServiceJob) -> None:
+        with self._lock:
+            if job.state == CANCELLED:
+                return
+            job.state = RUNNING
+            job.started = time.monotonic()
+            self.queued -= 1
+            self.running += 1
+        metrics.record("service_queue_wait", job.started - job.created)
+
+        try:
+            result = self.pipeline.run(job.seq, job.input_path, job.options)
+        except Exception as e:
+            logger.exception(f"Service job crashed: {job.id}")
+            result = JobResult(index=job.seq, input_path=job.input_path, log=f"转换时发生异常:\n{str(e)}\n")
+
+        now = time.monotonic()
+        with self._lock:
+            job.result = result
+            job.finished = now
+            job.state = DONE if result.ok else FAILED
+            job.progress = 100.0 if result.ok else job.progress
+            self.running -= 1
+            if result.ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._latencies.append(now - job.created)
+            self._finish_times.append(now)
+            self._by_seq.pop(job.seq, None)
+        if job.upload:
+            # 上传的原图只用于本次转换
+            discard_partial(job.input_path)
+        metrics.record("service_job", now - job.created, bytes_out=result.output_size, ok=result.ok)
+        job.done.set()
+        self._evict()
+
+    def _on_progress(self, seq: int, progress: FFmpegProgress) -> None:
+        job = self._by_seq.get(seq)
+        if job is not None:
+            job.progress = progress.percent
+
+    def _evict(self) -> None:
+        """只保留最近 keep_finished 个已结束任务，删除更早任务的上传和输出文件。"""
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j.finished_state]
+            stale = finished[: max(0, len(finished) - self.keep_finished)]
+            for job in stale:
+                self._jobs.pop(job.id, None)
+        for job in stale:
+            self._remove_files(job)
+
+    def _remove_files(self, job: ServiceJob) -> None:
+        if job.upload:
+            discard_partial(job.input_path)
+            if job.result is not None:
+                for path in job.result.outputs or [job.result.output_path]:
+                    if path:
+                        discard_partial(path)
+
+    def get(self, job_id: str) -> Optional[ServiceJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list[dict]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j.to_dict() for j in jobs]
+
+    def delete(self, job_id: str) -> Optional[ServiceJob]:
+        """取消排队中的任务，或删除已结束任务；运行中的任务不能删除（返回该任务，状态不变）。"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state == RUNNING:
+                return job
+            if job.state == QUEUED:
+                job.state = CANCELLED
+                job.finished = time.monotonic()
+                self.queued -= 1
+                self._by_seq.pop(job.seq, None)
+                if job.future is not None:
+                    job.future.cancel()
+            self._jobs.pop(job_id, None)
+        self._remove_files(job)
+        job.done.set()
+        return job
+
+    # --- 统计 ---
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            while self._finish_times and now - self._finish_times[0] > THROUGHPUT_WINDOW:
+                self._finish_times.popleft()
+            recent = len(self._finish_times)
+            latencies = list(self._latencies)
+            uptime = now - self.started_at
+            return {
+                "uptime": round(uptime, 1),
+                "workers": self.jobs,
+                "queued": self.queued,
+                "running": self.running,
+                "max_queue": self.max_queue,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "throughput_per_second": round((self.completed + self.failed) / uptime, 3) if uptime > 0 else 0.0,
+                "recent_throughput_per_second": round(recent / min(uptime, THROUGHPUT_WINDOW), 3) if uptime > 0 else 0.0,
+                "latency": metrics.latency_stats(latencies),
+            }
+
+    def render_metrics(self) -> str:
+        s = self.stats()
+        p = metrics.METRIC_PREFIX
+        lines = [metrics.recorder.render_prometheus().rstrip("\n")]
+        for name, kind, value, help_text in (
+            ("service_queue_depth", "gauge", s["queued"], "Jobs waiting for a worker."),
+            ("service_running_jobs", "gauge", s["running"], "Jobs being converted."),
+            ("service_jobs_submitted_total", "counter", s["submitted"], "Accepted jobs."),
+            ("service_jobs_completed_total", "counter", s["completed"], "Successful jobs."),
+            ("service_jobs_failed_total", "counter", s["failed"], "Failed jobs."),
+            ("service_jobs_rejected_total", "counter", s["rejected"], "Jobs rejected because the queue was full."),
+        ):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            lines.append(f"{p}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def shutdown(self) -> None:
+        """不再执行排队中的任务，等待运行中的任务结束。"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self.pipeline.finish(BatchSummary())
+        metrics.flush()
+
+
+class ConversionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: ConversionService, max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        self.service = service
+        self.slots = threading.BoundedSemaphore(max_connections)
+        super().__init__(address, _Handler)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: ConversionHTTPServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.info(f"HTTP {self.address_string()} {format % args}")
+
+    # --- 响应 ---
+
+    def _send_json(self, status: int, data, headers: Optional[dict] = None) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+        self._status = status
+
+    def _error(self, status: int, message: str, headers: Optional[dict] = None) -> None:
+        self._send_json(status, {"error": message}, headers)
+
+    def _dispatch(self, route) -> None:
+        self._status = 0
+        started = time.perf_counter()
+        if not self.server.slots.acquire(blocking=False):
+            self.close_connection = True
+            self._error(HTTPStatus.SERVICE_UNAVAILABLE, "too many concurrent requests", {"Retry-After": "1"})
+            return
+        try:
+            route()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception as e:
+            logger.exception(f"HTTP handler failed: {self.command} {self.path}")
+            if not self._status:
+                self._error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+        finally:
+            self.server.slots.release()
+            metrics.record(
+                "http_request", time.perf_counter() - started, ok=0 < self._status < 500,
+                method=self.command, path=urlsplit(self.path).path, status=self._status,
+            )
+
+    def do_GET(self):
+        self._dispatch(self._get)
+
+    def do_POST(self):
+        self._dispatch(self._post)
+
+    def do_DELETE(self):
+        self._dispatch(self._delete)
+
+    # --- 路由 ---
+
+    def _get(self) -> None:
+        url = urlsplit(self.path)
+        service = self.server.service
+        if url.path == "/healthz":
+            self._send_json(HTTPStatus.OK, {"ok": True})
+        elif url.path == "/stats":
+            self._send_json(HTTPStatus.OK, service.stats())
+        elif url.path == "/metrics":
+            body = service.render_metrics().encode("utf-8")
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            self._status = HTTPStatus.OK
+        elif url.path == "/jobs":
+            self._send_json(HTTPStatus.OK, {"jobs": service.list()})
+        else:
+            m = _JOB_PATH.match(url.path)
+            job = service.get(m.group(1)) if m else None
+            if job is None:
+                self._error(HTTPStatus.NOT_FOUND, "no such job")
+            elif m.group(2):
+                self._send_result(job, parse_qs(url.query).get("rendition", [""])[0])
+            else:
+                wait = parse_qs(url.query).get("wait", ["0"])[0]
+                try:
+                    wait_seconds = min(float(wait), MAX_WAIT_SECONDS)
+                except ValueError:
+                    wait_seconds = 0.0
+                if wait_seconds > 0:
+                    job.done.wait(wait_seconds)
+                self._send_json(HTTPStatus.OK, job.to_dict())
+
+    def _send_result(self, job: ServiceJob, rendition: str = "") -> None:
+        if job.state != DONE or job.result is None:
+            self._error(HTTPStatus.CONFLICT, f"job is {job.state}")
+            return
+        path = job.result.output_path
+        if rendition:
+            matches = [p for p in job.result.outputs if _rendition_of(p) in (rendition, rendition + ".mp4")]
+            if not matches:
+                self._error(HTTPStatus.NOT_FOUND, f"no such rendition: {rendition}")
+                return
+            path = matches[0]
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self._error(HTTPStatus.GONE, "output file no longer exists")
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            ext = os.path.splitext(path)[1]
+            stem = os.path.splitext(os.path.basename(job.input_path))[0]
+            name = stem + (f"_{_rendition_of(path)}" if len(job.result.outputs) > 1 else ext)
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "video/webm" if ext == ".webm" else "video/mp4")
+            self.send_header("Content-Length", str(size))
+            self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+            self.end_headers()
+            self._status = HTTPStatus.OK
+            shutil.copyfileobj(f, self.wfile, _CHUNK)
+
+    def _post(self) -> None:
+        url = urlsplit(self.path)
+        if url.path != "/jobs":
+            self._error(HTTPStatus.NOT_FOUND, "not found")
+            return
+        service = self.server.service
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self.close_connection = True
+            self._error(HTTPStatus.LENGTH_REQUIRED, "Content-Length required")
+            return
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # 无法确定请求体的边界，连接不能复用
+            self.close_connection = True
+            self._error(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+            return
+        if service.is_full():
+            # 不读取请求体，直接关闭连接，避免为注定被拒绝的上传传输数据
+            self.close_connection = True
+            service.reject()
+            self._error(HTTPStatus.TOO_MANY_REQUESTS, "queue is full", {"Retry-After": "1"})
+            return
+
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if content_type == "application/json":
+            self._submit_path(length)
+        else:
+            self._submit_upload(length, content_type, parse_qs(url.query).get("name", [""])[0])
+
+    def _submit_path(self, length: int) -> None:
+        try:
+            path = json.loads(self.rfile.read(length) or b"{}").get("path", "")
+        except (ValueError, AttributeError):
+            self._error(HTTPStatus.BAD_REQUEST, 'expected JSON {"path": "..."}')
+            return
+        if not path or not is_supported_file(path):
+            self._error(HTTPStatus.BAD_REQUEST, "unsupported image path")
+            return
+        if not os.path.isfile(path):
+            self._error(HTTPStatus.NOT_FOUND, f"no such file: {path}")
+            return
+        self._enqueue(os.path.abspath(path), upload=False)
+
+    def _submit_upload(self, length: int, content_type: str, name: str) -> None:
+        service = self.server.service
+        ext = os.path.splitext(name)[1].lower() if name else _CONTENT_TYPE_EXT.get(content_type, "")
+        if not is_supported_file("x" + ext):
+            self.close_connection = True
+            self._error(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "unsupported image type; pass ?name=file.ext")
+            return
+        if length > service.max_upload_bytes:
+            self.close_connection = True
+            self._error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"upload exceeds {service.max_upload_bytes} bytes")
+            return
+
+        job_id, path = service.new_upload_path(ext)
+        remaining = length
+        try:
+            with open(path, "wb") as f:
+                while remaining > 0:
+                    chunk = self.rfile.read(min(_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    remaining -= len(chunk)
+        except OSError:
+            discard_partial(path)
+            raise
+        if remaining:
+            discard_partial(path)
+            self.close_connection = True
+            self._error(HTTPStatus.BAD_REQUEST, "incomplete upload")
+            return
+        metrics.record("upload", 0.0, bytes_in=length)
+        if not self._enqueue(path, upload=True, job_id=job_id):
+            discard_partial(path)
+
+    def _enqueue(self, path: str, upload: bool, job_id: str = "") -> bool:
+        try:
+            job = self.server.service.submit(path, upload=upload, job_id=job_id)
+        except QueueFull:
+            self._error(HTTPStatus.TOO_MANY_REQUESTS, "queue is full", {"Retry-After": "1"})
+            return False
+        self._send_json(HTTPStatus.ACCEPTED, job.to_dict(), {"Location": f"/jobs/{job.id}"})
+        return True
+
+    def _delete(self) -> None:
+        m = _JOB_PATH.match(urlsplit(self.path).path)
+        job = self.server.service.delete(m.group(1)) if m and not m.group(2) else None
+        if job is None:
+            self._error(HTTPStatus.NOT_FOUND, "no such job")
+        elif job.state == RUNNING:
+            self._error(HTTPStatus.CONFLICT, "job is running")
+        else:
+            self._send_json(HTTPStatus.OK, job.to_dict())
+
+
+def make_server(
+    service: ConversionService,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    max_connections: int = DEFAULT_MAX_CONNECTIONS,
+) -> ConversionHTTPServer:
+    """创建（未启动的）服务器；port=0 时由系统分配端口，见 server.server_address。"""
+    return ConversionHTTPServer((host, port), service, max_connections)
@@ -0,0 +1,206 @@
+"""只读文件头的图片元数据探测。
+
+Pillow 的 Image.open 是惰性的：只解析文件头得到尺寸和像素模式，不解码像素数据，
+因此即使是上百 MP 的图片，探测也只需读取几 KB。
+HeaderIndex 在转换前为整个队列建立紧凑的文件头索引（可持久化），用于按成本排序和规划滤镜。
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import metrics
+from archive_source import image_source, source_stat
+from logging_config import logger
+from output_cache import app_cache_dir
+
+HEADER_INDEX_FILE_NAME = "header_index.json"
+HEADER_INDEX_VERSION = 2
+# 文件头探测以 I/O 为主，并行读取可掩盖冷缓存/网络盘的延迟
+PROBE_THREADS = 8
+
+EXIF_ORIENTATION = 0x0112
+# EXIF Orientation 5-8 表示图片需要旋转 90°/270° 显示（宽高互换）
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+_ALPHA_MODES = ("RGBA", "LA", "PA", "RGBa", "La")
+
+# 每像素解码后字节数（FFmpeg 解码后的像素格式近似）
+_BYTES_PER_PIXEL = {
+    "1": 1,
+    "L": 1,
+    "P": 1,
+    "LA": 2,
+    "I;16": 2,
+    "RGB": 3,
+    "YCbCr": 3,
+    "RGBA": 4,
+    "CMYK": 4,
+    "I": 4,
+    "F": 4,
+}
+
+
+@dataclass
+class ImageInfo:
+    width: int
+    height: int
+    mode: str
+    format: str
+    has_alpha: bool = False
+    # EXIF Orientation（1 为正常方向）
+    orientation: int = 1
+    # 多帧动图（GIF/WebP）
+    animated: bool = False
+
+    @property
+    def transposed(self) -> bool:
+        return self.orientation in _TRANSPOSED_ORIENTATIONS
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    @property
+    def bytes_per_pixel(self) -> float:
+        # 基线 JPEG 由 FFmpeg 解码为 yuv420p/yuvj420p，每像素约 1.5 字节
+        if self.format == "JPEG" and self.mode in ("RGB", "YCbCr"):
+            return 1.5
+        return _BYTES_PER_PIXEL.get(self.mode, 4)
+
+
+def _has_alpha(im) -> bool:
+    return im.mode in _ALPHA_MODES or (im.mode == "P" and "transparency" in im.info)
+
+
+def _orientation(im) -> int:
+    # PNG 没有 eXIf 块时 getexif() 会解码整张图片，这里只认文件头中已解析到的 EXIF
+    if im.format == "PNG" and "exif" not in im.info:
+        return 1
+    try:
+        return int(im.getexif().get(EXIF_ORIENTATION, 1) or 1)
+    except Exception:
+        return 1
+
+
+def probe_header(path: str) -> Optional[ImageInfo]:
+    """读取尺寸/模式/格式/透明通道/EXIF 方向；Pillow 不可用或文件无法识别时返回 None。"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    with metrics.span("header_probe", path=path) as sp:
+        try:
+            with image_source(path) as src, Image.open(src) as im:
+                return ImageInfo(
+                    width=im.width,
+                    height=im.height,
+                    mode=im.mode,
+                    format=im.format or "",
+                    has_alpha=_has_alpha(im),
+                    orientation=_orientation(im),
+                    # GIF 只需定位到第二帧即可判断，不会扫描整个文件
+                    animated=bool(getattr(im, "is_animated", False)),
+                )
+        except Exception as e:
+            sp.ok = False
+            logger.info(f"Header probe failed for {path}: {e}")
+            return None
+
+
+def default_header_index_path() -> str:
+    return os.path.join(app_cache_dir(), HEADER_INDEX_FILE_NAME)
+
+
+class HeaderIndex:
+    """文件头索引：{路径: [mtime_ns, size, 宽, 高, 模式, 格式, 透明, 方向, 动图]}。
+
+    按 mtime_ns + 文件大小校验，未变化的图片不再打开；探测失败也记录（只有前两项），避免反复重试。
+    path 为空时只在内存中使用。
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries: dict[str, list] = {}
+        self.hits = 0
+        self.probed = 0
+        self.probe_time = 0.0
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == HEADER_INDEX_VERSION:
+                self._entries = dict(data.get("images", {}))
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.exception(f"Failed to load header index {self.path}; starting empty")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, path: str) -> Optional[ImageInfo]:
+        """取文件头信息（索引命中则不打开文件）；无法识别时返回 None。"""
+        try:
+            mtime_ns, size = source_stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == mtime_ns and entry[1] == size:
+                self.hits += 1
+                if len(entry) == 2:
+                    return None
+                width, height, mode, fmt, alpha, orientation, animated = entry[2:]
+                return ImageInfo(width, height, mode, fmt, bool(alpha), orientation, bool(animated))
+
+        started = time.perf_counter()
+        info = probe_header(path)
+        elapsed = time.perf_counter() - started
+        entry = [mtime_ns, size]
+        if info is not None:
+            entry += [
+                info.width, info.height, info.mode, info.format,
+                int(info.has_alpha), info.orientation, int(info.animated),
+            ]
+        with self._lock:
+            self._entries[path] = entry
+            self.probed += 1
+            self.probe_time += elapsed
+            self._dirty = True
+        return info
+
+    def probe_all(self, paths: Iterable[str], threads: int = PROBE_THREADS) -> dict[str, Optional[ImageInfo]]:
+        """为整个队列建立索引（并行读取文件头），返回 {路径: ImageInfo 或 None}。"""
+        paths = list(paths)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(threads, len(paths) or 1))) as pool:
+            infos = dict(zip(paths, pool.map(self.get, paths)))
+        logger.info(
+            f"Header index: images={len(paths)}, probed={self.probed}, hits={self.hits}, "
+            f"elapsed={time.perf_counter() - started:.3f}s"
+        )
+        return infos
+
+    def save(self):
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"version": HEADER_INDEX_VERSION, "images": self._entries}, f, separators=(",", ":"))
+                os.replace(tmp, self.path)
+                self._dirty = False
+            except Exception:
+                logger.exception(f"Failed to save header index {self.path}")
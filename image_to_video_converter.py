@@ -1,22 +1,37 @@
+import time
+
+# 启动计时起点（--startup-time 模式下报告到首次绘制的耗时）
+_STARTED_AT = time.perf_counter()
+
 import os
 import sys
 import tkinter as tk
-from PIL import Image
 from tkinter import ttk, filedialog, messagebox
-import subprocess
 import threading
+import multiprocessing
 from pathlib import Path
 from typing import Optional
 
-try:
-    # Drag & drop support (Windows/macOS/Linux) via tkinterdnd2
-    from tkinterdnd2 import TkinterDnD, DND_FILES
-except Exception:
-    TkinterDnD = None
-    DND_FILES = None
-
 # Import the logger we created
 from logging_config import logger
+import converter_engine as engine
+from archive_source import ARCHIVE_EXTENSIONS, is_archive, source_exists
+from batch_journal import BatchJournal
+from encoder_profiles import DEFAULT_PROFILE, available_profiles, get_profile
+from ffmpeg_probe import FFmpegCapabilities, probe_ffmpeg
+from image_profiles import DEFAULT_IMAGE_PROFILE, IMAGE_FORMATS, IMAGE_PROFILE_ALL, IMAGE_PROFILES
+from log_view import LogView
+import metrics
+import ui_events as events
+from output_cache import app_cache_dir, default_cache_dir
+
+# 界面批量转换的 journal（每次新批量覆盖；程序崩溃后下次启动时提示续跑）
+GUI_JOURNAL_FILE_NAME = "gui_batch_journal.jsonl"
+# 图片转换目标格式在下拉框中的显示名
+IMAGE_FORMAT_LABELS = {"png": "PNG", "jpg": "JPG", "webp": "无损 WebP"}
+# 扫描拖入路径时，每找到这么多张图片（或每隔这么久）向界面投递一批
+SCAN_CHUNK_SIZE = 500
+SCAN_POST_INTERVAL = 0.2
 
 
 def get_resource_path(relative_path: str) -> str:
@@ -25,8 +40,23 @@ def get_resource_path(relative_path: str) -> str:
     return os.path.join(base_path, relative_path)
 
 
+def _load_dnd(root):
+    """首次绘制之后再加载 tkinterdnd2：导入模块并在已有的 Tk 解释器中加载 tkdnd 扩展。
+
+    返回 DND_FILES；未安装或加载失败时返回 None。
+    """
+    try:
+        # Drag & drop support (Windows/macOS/Linux) via tkinterdnd2
+        from tkinterdnd2 import TkinterDnD, DND_FILES
+    except Exception:
+        return None
+    # 等价于 TkinterDnD.Tk() 在构造时做的事情，只是推迟到窗口显示之后
+    root.TkdndVersion = TkinterDnD._require(root)
+    return DND_FILES
+
+
 class ImageToVideoConverter:
-    def __init__(self, root):
+    def __init__(self, root, startup_report: bool = False):
         self.root = root
         self.root.title("图片转视频转换器")
         self.root.geometry("600x400")
@@ -38,15 +68,56 @@ class ImageToVideoConverter:
         # 默认输出目录：与输入图片同级目录（选择文件后自动更新）
         self.output_dir: str = ""
         self.duration: tk.IntVar = tk.IntVar(value=3)  # Default 3 seconds
+        # 并行 FFmpeg 任务数（默认 CPU 核心数）
+        self.jobs: tk.IntVar = tk.IntVar(value=os.cpu_count() or 1)
+        # 内容寻址输出缓存：未变化的图片不重复编码
+        self.use_cache: tk.BooleanVar = tk.BooleanVar(value=False)
+        # 大图预解码（Pillow draft 模式），降低 FFmpeg 内存占用
+        self.pillow_ingest: tk.BooleanVar = tk.BooleanVar(value=False)
+        # 编码配置（throughput/balanced/smallest，autotune 后还有 tuned）
+        self.profile_var: tk.StringVar = tk.StringVar(value=DEFAULT_PROFILE)
+        # 幻灯片模式：整个队列合成为一个视频
+        self.slideshow: tk.BooleanVar = tk.BooleanVar(value=False)
 
         # 批量转换状态
         self._batch_total: int = 0
         self._batch_index: int = 0
         self._is_converting: bool = False
+        self._cancel_event: threading.Event = threading.Event()
+        # 当前批量：video / images / slideshow，以及运行中任务 {序号: 文件名} 和最新进度
+        self._batch_kind: str = ""
+        self._batch_options: Optional[engine.ConvertOptions] = None
+        self._running: dict[int, str] = {}
+        self._progress_text: str = ""
+        # 拖入扫描的代号与已收到的图片；新的拖入会让旧扫描投递的结果作废
+        self._scan_generation = 0
+        self._scanned: list[str] = []
+
+        # 工作线程只向事件总线投递事件，界面线程定时处理
+        self.events = events.EventBus()
+        self._handlers = {
+            events.JOB_STARTED: self._on_job_started,
+            events.PROGRESS: self._on_job_progress,
+            events.JOB_FINISHED: self._on_job_done,
+            events.JOB_FAILED: self._on_job_done,
+            events.LOG: lambda ev: self._log_append(ev.payload),
+            events.STATUS: lambda ev: self._set_status(ev.payload),
+            events.BATCH_DONE: self._on_batch_done,
+            events.SCAN_FOUND: self._on_scan_found,
+            events.SCAN_DONE: self._on_scan_done,
+            events.SCAN_FAILED: lambda ev: self._on_drop_failed(ev.payload),
+            events.FFMPEG_PROBED: lambda ev: self._on_ffmpeg_probed(*ev.payload),
+        }
+
+        # FFmpeg 能力探测在首次绘制后于后台进行（None 表示尚未完成）
+        self.ffmpeg_caps: Optional[FFmpegCapabilities] = None
+        self._startup_report = startup_report
+        self._first_paint: Optional[float] = None
 
         logger.info("Application started.")
         self.setup_ui()
-        self.check_ffmpeg()
+        # 窗口先显示出来，拖拽支持和 FFmpeg 探测等到首次绘制之后再做
+        self.root.bind("<Map>", self._on_first_map, add="+")
 
     def setup_ui(self):
         # Main container
@@ -59,7 +130,7 @@ class ImageToVideoConverter:
 
         self.drop_label = ttk.Label(
             self.drop_frame,
-            text="点击或拖放图片文件到此处",
+            text="点击或拖放图片文件、文件夹或 zip/tar 压缩包到此处",
             font=('Helvetica', 12)
         )
         self.drop_label.pack(expand=True)
@@ -68,7 +139,7 @@ class ImageToVideoConverter:
         control_frame = ttk.Frame(main_frame)
         control_frame.pack(fill=tk.X, pady=5)
 
-        ttk.Label(control_frame, text="视频时长 (秒):").pack(side=tk.LEFT, padx=5)
+        ttk.Label(control_frame, text="视频时长 (秒，动图循环至该时长):").pack(side=tk.LEFT, padx=5)
 
         duration_spin = ttk.Spinbox(
             control_frame,
@@ -79,6 +150,47 @@ class ImageToVideoConverter:
         )
         duration_spin.pack(side=tk.LEFT, padx=5)
 
+        ttk.Label(control_frame, text="并行任务数:").pack(side=tk.LEFT, padx=5)
+
+        jobs_spin = ttk.Spinbox(
+            control_frame,
+            from_=1,
+            to=max(64, os.cpu_count() or 1),
+            textvariable=self.jobs,
+            width=5
+        )
+        jobs_spin.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(control_frame, text="编码配置:").pack(side=tk.LEFT, padx=5)
+
+        profile_combo = ttk.Combobox(
+            control_frame,
+            textvariable=self.profile_var,
+            values=available_profiles(),
+            width=10,
+            state="readonly"
+        )
+        profile_combo.pack(side=tk.LEFT, padx=5)
+        profile_combo.bind("<<ComboboxSelected>>", self.on_profile_selected)
+
+        ttk.Checkbutton(
+            control_frame,
+            text="使用缓存",
+            variable=self.use_cache
+        ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Checkbutton(
+            control_frame,
+            text="大图预解码",
+            variable=self.pillow_ingest
+        ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Checkbutton(
+            control_frame,
+            text="合成一个视频",
+            variable=self.slideshow
+        ).pack(side=tk.LEFT, padx=5)
+
         # Output directory
         output_frame = ttk.Frame(main_frame)
         output_frame.pack(fill=tk.X, pady=5)
@@ -99,6 +211,7 @@ class ImageToVideoConverter:
         btn_frame.columnconfigure(0, weight=1)
         btn_frame.columnconfigure(1, weight=1)
         btn_frame.columnconfigure(2, weight=1)
+        btn_frame.columnconfigure(3, weight=1)
 
         self.convert_btn = ttk.Button(
             btn_frame,
@@ -109,15 +222,29 @@ class ImageToVideoConverter:
         self.convert_btn.grid(row=0, column=1, padx=6)
 
         # Image convert controls (for .webp)
-        self.img_format_var = tk.StringVar(value="png")
+        img_opts = ttk.Frame(btn_frame)
+        img_opts.grid(row=0, column=0, sticky=tk.E, padx=6)
+
+        self.img_format_var = tk.StringVar(value=IMAGE_FORMAT_LABELS["png"])
         self.img_format_combo = ttk.Combobox(
-            btn_frame,
+            img_opts,
             textvariable=self.img_format_var,
-            values=["png", "jpg"],
-            width=5,
+            values=[IMAGE_FORMAT_LABELS[f] for f in IMAGE_FORMATS],
+            width=9,
             state="disabled"
         )
-        self.img_format_combo.grid(row=0, column=0, sticky=tk.E, padx=6)
+        self.img_format_combo.pack(side=tk.LEFT)
+
+        # 图片编码配置：fast 最快，max 文件最小；all 依次运行全部配置，便于对比耗时和体积
+        self.img_profile_var = tk.StringVar(value=DEFAULT_IMAGE_PROFILE)
+        self.img_profile_combo = ttk.Combobox(
+            img_opts,
+            textvariable=self.img_profile_var,
+            values=[*IMAGE_PROFILES, IMAGE_PROFILE_ALL],
+            width=8,
+            state="disabled"
+        )
+        self.img_profile_combo.pack(side=tk.LEFT, padx=(4, 0))
 
         self.img_convert_btn = ttk.Button(
             btn_frame,
@@ -127,10 +254,25 @@ class ImageToVideoConverter:
         )
         self.img_convert_btn.grid(row=0, column=2, sticky=tk.W, padx=6)
 
+        # 取消当前批量任务（视频/图片转换）：不再启动新任务，进行中的任务正常结束
+        self.cancel_btn = ttk.Button(
+            btn_frame,
+            text="取消",
+            command=self.cancel,
+            state=tk.DISABLED
+        )
+        self.cancel_btn.grid(row=0, column=3, sticky=tk.W, padx=6)
+
         # Log / error output area (shown below the button)
         log_frame = ttk.LabelFrame(main_frame, text="日志/错误信息", padding=(8, 6))
         log_frame.pack(fill=tk.BOTH, expand=False, pady=(0, 6))
 
+        ttk.Button(
+            log_frame,
+            text="保存完整日志",
+            command=self.save_full_log
+        ).pack(side=tk.BOTTOM, anchor=tk.E, pady=(4, 0))
+
         self.log_text = tk.Text(log_frame, height=6, wrap="word")
         self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
@@ -138,9 +280,13 @@ class ImageToVideoConverter:
         log_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.log_text.configure(yscrollcommand=log_scroll.set)
 
-        # 默认只读（需要写入时临时解锁）
+        # 默认只读（LogView 刷新时临时解锁）
         self.log_text.configure(state=tk.DISABLED)
 
+        # 只保留最近若干行；追加的内容按固定节拍批量刷到控件
+        self.log_view = LogView(self.log_text)
+        self.root.after(events.DRAIN_INTERVAL_MS, self._ui_tick)
+
         # Status bar
         self.status_var = tk.StringVar(value="就绪")
         self.status_bar = ttk.Label(
@@ -155,8 +301,47 @@ class ImageToVideoConverter:
         self._bind_click_recursive(self.drop_frame, self.browse_file)
         self._bind_hover_recursive(self.drop_frame)
 
+    def _on_first_map(self, event):
+        if event.widget is not self.root or self._first_paint is not None:
+            return
+        # 处理完挂起的重绘，此时窗口内容已经画出来
+        self.root.update_idletasks()
+        self._first_paint = time.perf_counter() - _STARTED_AT
+        logger.info(f"First paint after {self._first_paint * 1000:.0f} ms")
+        self.root.after_idle(lambda: self.root.after(0, self._deferred_startup))
+
+    def _deferred_startup(self):
         # Drag and drop support (tkinterdnd2)
         self._setup_drag_and_drop()
+        self._set_status("正在检测 FFmpeg...")
+
+        def probe():
+            started = time.perf_counter()
+            caps = probe_ffmpeg()
+            self.events.post(events.FFMPEG_PROBED, payload=(caps, time.perf_counter() - started))
+
+        threading.Thread(target=probe, daemon=True).start()
+
+    def _on_ffmpeg_probed(self, caps: Optional[FFmpegCapabilities], elapsed: float):
+        self.ffmpeg_caps = caps
+        source = "缓存" if caps is not None and caps.cached else "探测"
+        logger.info(f"FFmpeg probe finished in {elapsed * 1000:.0f} ms, available={caps is not None}")
+        if self._startup_report:
+            report = (
+                f"首次绘制：{self._first_paint * 1000:.0f} ms；"
+                f"FFmpeg 检测（{source}）：{elapsed * 1000:.0f} ms；"
+                f"合计：{(time.perf_counter() - _STARTED_AT) * 1000:.0f} ms"
+            )
+            print(report, flush=True)
+            logger.info(f"Startup report: first_paint={self._first_paint:.3f}s, ffmpeg_probe={elapsed:.3f}s")
+            self.root.after(0, self.root.destroy)
+            return
+        if not self.check_ffmpeg():
+            return
+        self._set_status("就绪")
+        if not caps.has_encoder("libx264"):
+            self._log_append("警告：当前 FFmpeg 不包含 libx264 编码器，视频转换将会失败。\n")
+        self._offer_resume()
 
     def on_enter(self, event):
         self.drop_frame.configure(style='Drop.TLabelframe')
@@ -166,11 +351,12 @@ class ImageToVideoConverter:
 
     def _setup_drag_and_drop(self):
         """启用拖拽上传（需要安装 tkinterdnd2）。"""
-        if TkinterDnD is None or DND_FILES is None:
-            logger.info("tkinterdnd2 not available; drag-and-drop disabled.")
-            return
-
         try:
+            DND_FILES = _load_dnd(self.root)
+            if DND_FILES is None:
+                logger.info("tkinterdnd2 not available; drag-and-drop disabled.")
+                return
+
             self.drop_frame.drop_target_register(DND_FILES)
             self.drop_frame.dnd_bind('<<Drop>>', self.on_drop)
 
@@ -219,47 +405,74 @@ class ImageToVideoConverter:
                 norm.append(os.path.normpath(f))
         return norm
 
-    def _collect_images_from_paths(self, paths: list[str]) -> list[str]:
-        """把拖入的文件/文件夹解析成图片文件列表（支持递归遍历文件夹）。"""
-        images: list[str] = []
+    def _iter_images_from_paths(self, paths: list[str]):
+        """把拖入的文件/文件夹/压缩包解析成图片文件（递归遍历文件夹；压缩包只列出成员，不解压）。
 
-        for p in paths:
-            if not p:
-                continue
+        生成器：边遍历边产出，不必等整棵目录树扫描完。
+        """
+        return engine.iter_collect_images(paths)
 
+    def _scan_paths(self, paths: list[str]):
+        """后台线程扫描，找到的图片分批经事件队列回到界面线程（_on_scan_found / _on_scan_done）。"""
+        self._set_status("正在扫描拖入的文件/文件夹...")
+        self._scan_generation += 1
+        self._scanned = []
+        generation = self._scan_generation
+
+        def scan():
+            chunk: list[str] = []
+            last_post = time.perf_counter()
             try:
-                if os.path.isdir(p):
-                    for root_dir, _dirs, files in os.walk(p):
-                        for name in files:
-                            fp = os.path.join(root_dir, name)
-                            if os.path.isfile(fp) and self.is_supported_file(fp):
-                                images.append(fp)
-                elif os.path.isfile(p):
-                    if self.is_supported_file(p):
-                        images.append(p)
-            except Exception:
-                logger.exception(f"Failed to collect images from path: {p}")
-
-        seen = set()
-        uniq = []
-        for f in images:
-            if f not in seen:
-                seen.add(f)
-                uniq.append(f)
-        return uniq
+                for path in self._iter_images_from_paths(paths):
+                    chunk.append(path)
+                    if len(chunk) >= SCAN_CHUNK_SIZE or time.perf_counter() - last_post >= SCAN_POST_INTERVAL:
+                        self.events.post(events.SCAN_FOUND, payload=(generation, chunk))
+                        chunk = []
+                        last_post = time.perf_counter()
+            except Exception as e:
+                logger.exception("Error scanning dropped paths")
+                self.events.post(events.SCAN_FAILED, payload=e)
+                return
+            self.events.post(events.SCAN_DONE, payload=(generation, chunk))
+
+        threading.Thread(target=scan, daemon=True).start()
+
+    def _on_scan_found(self, ev: events.UIEvent):
+        generation, chunk = ev.payload
+        if generation != self._scan_generation:
+            return
+        self._scanned.extend(chunk)
+        self._set_status(f"正在扫描拖入的文件/文件夹...已找到 {len(self._scanned)} 张图片")
+
+    def _on_scan_done(self, ev: events.UIEvent):
+        generation, chunk = ev.payload
+        if generation != self._scan_generation:
+            return
+        images = self._scanned + chunk
+        self._scanned = []
+        self._on_drop_scanned(images)
 
     def on_drop(self, event):
-        """拖拽文件到区域后的处理：支持多文件 + 文件夹。"""
+        """拖拽文件到区域后的处理：支持多文件 + 文件夹 + 压缩包（后台线程扫描，不阻塞界面）。"""
         try:
             paths = self._parse_drop_files(getattr(event, 'data', ''))
             if not paths:
                 self._log_append("未识别到拖拽的文件路径。\n")
                 return
+            self._scan_paths(paths)
+        except Exception as e:
+            self._on_drop_failed(e)
 
-            images = self._collect_images_from_paths(paths)
+    def _on_drop_failed(self, e: Exception):
+        self._set_status("拖拽解析失败")
+        self._log_append(f"处理拖拽时出错：\n{str(e)}\n")
+        logger.exception("Error handling drop event")
+
+    def _on_drop_scanned(self, images: list[str]):
+        try:
             if not images:
                 self._set_status("未找到可用图片")
-                self._log_append("拖拽内容中未找到支持的图片文件（支持：jpg/png/bmp/tiff/webp）。\n")
+                self._log_append("拖拽内容中未找到支持的图片文件（支持：jpg/png/bmp/tiff/webp/gif，可在 zip/tar 压缩包内）。\n")
                 return
 
             # 更新队列
@@ -267,10 +480,7 @@ class ImageToVideoConverter:
 
             # 只更新 UI 显示与默认输出目录（不要在这里调用 set_input_file，否则会把 input_files 覆盖成单张）
             self.input_file = images[0]
-            try:
-                self.output_dir = str(Path(images[0]).resolve().parent)
-            except Exception:
-                self.output_dir = os.path.dirname(images[0])
+            self.output_dir = engine.default_output_dir(images[0])
 
             self.output_var.set(f"输出目录: {self.output_dir}")
             self.convert_btn.config(state=tk.NORMAL)
@@ -289,9 +499,7 @@ class ImageToVideoConverter:
             self._update_image_convert_controls(self.input_files)
 
         except Exception as e:
-            self._set_status("拖拽解析失败")
-            self._log_append(f"处理拖拽时出错：\n{str(e)}\n")
-            logger.exception("Error handling drop event")
+            self._on_drop_failed(e)
 
     def _bind_click_recursive(self, widget, callback):
         try:
@@ -313,28 +521,28 @@ class ImageToVideoConverter:
             self._bind_hover_recursive(child)
 
     def is_supported_file(self, file_path: str) -> bool:
-        ext = os.path.splitext(file_path)[1].lower()
-        return ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']
+        return engine.is_supported_file(file_path)
 
     def browse_file(self, event=None):
         file_path = filedialog.askopenfilename(
             title="选择图片文件",
             filetypes=(
-                ("图片文件", "*.jpg;*.jpeg;*.png;*.bmp;*.tiff;*.webp"),
+                ("图片文件", "*.jpg;*.jpeg;*.png;*.bmp;*.tiff;*.webp;*.gif"),
+                ("压缩包", ";".join(f"*{ext}" for ext in ARCHIVE_EXTENSIONS)),
                 ("所有文件", "*.*")
             )
         )
-        if file_path:
+        if file_path and is_archive(file_path):
+            # 压缩包与拖入相同：列出其中的全部图片加入队列
+            self._scan_paths([file_path])
+        elif file_path:
             self.set_input_file(file_path)
 
     def set_input_file(self, file_path: str):
         self.input_file = file_path
         logger.info(f"Input file selected: {file_path}")
 
-        try:
-            self.output_dir = str(Path(file_path).resolve().parent)
-        except Exception:
-            self.output_dir = os.path.dirname(file_path)
+        self.output_dir = engine.default_output_dir(file_path)
 
         logger.info(f"Default output directory set to: {self.output_dir}")
         self.output_var.set(f"输出目录: {self.output_dir}")
@@ -356,27 +564,106 @@ class ImageToVideoConverter:
             self.output_var.set(f"输出目录: {dir_path}")
 
     def _log_clear(self):
-        if not hasattr(self, "log_text"):
+        if not hasattr(self, "log_view"):
             return
-        self.log_text.configure(state=tk.NORMAL)
-        self.log_text.delete("1.0", tk.END)
-        self.log_text.configure(state=tk.DISABLED)
+        self.log_view.clear()
 
     def _log_append(self, text: str):
-        if not hasattr(self, "log_text"):
+        if not hasattr(self, "log_view"):
             return
-        self.log_text.configure(state=tk.NORMAL)
-        self.log_text.insert(tk.END, text)
-        self.log_text.see(tk.END)
-        self.log_text.configure(state=tk.DISABLED)
+        self.log_view.append(text)
+
+    def _ui_tick(self):
+        """界面节拍：处理积压事件、刷新进度状态和日志面板。"""
+        try:
+            for ev in self.events.drain():
+                handler = self._handlers.get(ev.kind)
+                if handler is not None:
+                    handler(ev)
+            if self._is_converting and self._batch_kind == "video":
+                status = self._batch_status()
+                if status != self.status_var.get():
+                    self._set_status(status)
+            self.log_view.flush()
+        except Exception:
+            logger.exception("UI tick failed")
+        self.root.after(events.DRAIN_INTERVAL_MS, self._ui_tick)
+
+    def _batch_status(self) -> str:
+        text = f"正在转换（运行 {len(self._running)}）：已完成 {self._batch_index}/{self._batch_total}"
+        return f"{text}；{self._progress_text}" if self._progress_text else text
+
+    def _on_job_started(self, ev: events.UIEvent):
+        self._running[ev.index] = os.path.basename(ev.payload)
+
+    def _on_job_progress(self, ev: events.UIEvent):
+        if self._batch_kind == "slideshow":
+            self._set_status(f"正在生成幻灯片：{ev.payload.describe()}")
+        elif ev.index in self._running:
+            self._progress_text = f"{self._running[ev.index]} {ev.payload.describe()}"
+
+    def _on_job_done(self, ev: events.UIEvent):
+        res = ev.payload
+        self._batch_index += 1
+        self._running.pop(ev.index, None)
+        if self._batch_kind == "images":
+            if res.ok:
+                self._log_append(f"成功：{os.path.basename(res.input_path)} -> {os.path.basename(res.output_path)}\n")
+            else:
+                self._log_append(f"失败：{os.path.basename(res.input_path)}，原因：{res.error}\n")
+            self._set_status(f"正在转换图片：{self._batch_index}/{self._batch_total}")
+        else:
+            self._log_append(f"[{res.index + 1}/{self._batch_total}] {os.path.basename(res.input_path)}\n{res.log}")
+
+    def _on_batch_done(self, ev: events.UIEvent):
+        kind = self._batch_kind
+        self._is_converting = False
+        self._batch_kind = ""
+        self._running.clear()
+        self._progress_text = ""
+        self.convert_btn.config(state=tk.NORMAL)
+        self.cancel_btn.config(state=tk.DISABLED)
+        self._update_image_convert_controls(self.input_files)
+        if kind == "images":
+            self._finish_image_batch(ev.payload)
+        elif kind == "slideshow":
+            self._finish_slideshow(ev.payload)
+        else:
+            self._finish_video_batch(ev.payload)
+
+    def save_full_log(self):
+        path = filedialog.asksaveasfilename(
+            title="保存完整日志",
+            defaultextension=".log",
+            filetypes=(("日志文件", "*.log"), ("文本文件", "*.txt"), ("所有文件", "*.*"))
+        )
+        if not path:
+            return
+        try:
+            self.log_view.export(path)
+            self._set_status(f"完整日志已保存: {path}")
+            logger.info(f"Full log exported to {path}")
+        except Exception as e:
+            logger.exception("Failed to export full log")
+            messagebox.showerror("错误", f"保存日志失败：\n{str(e)}")
 
     def _set_status(self, text: str):
+        # 只更新变量，重绘交给 Tk 主循环（不在这里强制 update，避免重入）
         self.status_var.set(text)
+
+    def on_profile_selected(self, event=None):
+        """选中带推荐并行数的配置（如 tuned）时同步并行任务数。"""
+        profile = get_profile(self.profile_var.get())
+        if profile.jobs > 0:
+            self.jobs.set(profile.jobs)
+        logger.info(f"Encoder profile selected: {profile}")
+
+    def _get_jobs(self) -> int:
+        """并行任务数（输入无效时回退到 CPU 核心数）。"""
         try:
-            self.root.update_idletasks()
-            self.root.update()
+            return max(1, int(self.jobs.get()))
         except Exception:
-            pass
+            return engine.default_jobs()
 
     def _update_image_convert_controls(self, files: list[str]):
         """根据是否包含 webp 文件启用/禁用图片转换控件。"""
@@ -390,11 +677,15 @@ class ImageToVideoConverter:
 
         try:
             self.img_format_combo.config(state='readonly' if has_webp else 'disabled')
+            self.img_profile_combo.config(state='readonly' if has_webp else 'disabled')
         except Exception:
             pass
 
     def convert_image_format(self):
-        """将当前队列中的 webp 文件转换成 png 或 jpg，并输出到输出目录。"""
+        """将当前队列中的 webp 文件按所选编码配置转换成 png、jpg 或无损 webp，并输出到输出目录。
+
+        编码配置为 all 时依次运行每个配置，分别输出到输出目录下的同名子目录，结束后逐个汇总耗时和体积。
+        """
         if self._is_converting:
             self._log_append("正在转换视频中，请稍候再进行图片转换。\n")
             return
@@ -403,11 +694,15 @@ class ImageToVideoConverter:
             messagebox.showerror("错误", "请先选择或拖拽图片文件")
             return
 
-        fmt = (self.img_format_var.get() or 'png').lower().strip()
-        if fmt not in ('png', 'jpg'):
-            fmt = 'png'
+        label = self.img_format_var.get()
+        fmt = next((f for f, text in IMAGE_FORMAT_LABELS.items() if text == label), 'png')
+        profile_name = self.img_profile_var.get()
+        if profile_name == IMAGE_PROFILE_ALL:
+            names = list(IMAGE_PROFILES)
+        else:
+            names = [profile_name if profile_name in IMAGE_PROFILES else DEFAULT_IMAGE_PROFILE]
 
-        webps = [p for p in self.input_files if str(p).lower().endswith('.webp') and os.path.isfile(p)]
+        webps = [p for p in self.input_files if str(p).lower().endswith('.webp') and source_exists(p)]
         if not webps:
             messagebox.showinfo("提示", "当前选择中不包含 WebP 文件")
             self._update_image_convert_controls(self.input_files)
@@ -415,176 +710,115 @@ class ImageToVideoConverter:
 
         if not self.output_dir:
             # 默认输出到第一个文件所在目录
-            try:
-                self.output_dir = str(Path(webps[0]).resolve().parent)
-            except Exception:
-                self.output_dir = os.path.dirname(webps[0])
+            self.output_dir = engine.default_output_dir(webps[0])
             self.output_var.set(f"输出目录: {self.output_dir}")
 
-        os.makedirs(self.output_dir, exist_ok=True)
-
-        self._log_append(f"开始转换图片：WebP -> {fmt.upper()}，共 {len(webps)} 个文件\n")
-
-        ok = 0
-        fail = 0
-        out_files: list[str] = []
-
-        for src in webps:
-            try:
-                src_path = Path(src)
-                dst_path = Path(self.output_dir) / f"{src_path.stem}.{fmt}"
-
-                with Image.open(src_path) as im:
-                    if fmt == 'jpg':
-                        # jpg 不支持透明，转换为 RGB
-                        if im.mode in ('RGBA', 'LA'):
-                            bg = Image.new('RGB', im.size, (255, 255, 255))
-                            bg.paste(im, mask=im.split()[-1])
-                            im_out = bg
-                        else:
-                            im_out = im.convert('RGB')
-                        im_out.save(dst_path, 'JPEG', quality=95, optimize=True)
-                    else:
-                        im.save(dst_path, 'PNG', optimize=True)
-
-                ok += 1
-                out_files.append(str(dst_path))
-                self._log_append(f"成功：{src_path.name} -> {dst_path.name}\n")
-            except Exception as e:
-                fail += 1
-                self._log_append(f"失败：{os.path.basename(src)}，原因：{str(e)}\n")
-
-        self._log_append(f"图片转换完成：成功 {ok}，失败 {fail}\n")
+        output_dir = self.output_dir
+        jobs = min(self._get_jobs(), len(webps))
 
+        self._start_batch("images", len(webps) * len(names))
+        cancel_event = self._cancel_event
+        self._log_append(
+            f"开始转换图片：WebP -> {IMAGE_FORMAT_LABELS[fmt]}，编码配置 {'/'.join(names)}，"
+            f"共 {len(webps)} 个文件，并行 {jobs} 个进程\n"
+        )
+        self._set_status(f"正在转换图片：共 {len(webps)} 个文件")
+
+        def on_result(res: engine.ImageResult):
+            self.events.post(events.JOB_FINISHED if res.ok else events.JOB_FAILED, res.index, res)
+
+        def worker():
+            summaries = []
+            for name in names:
+                if cancel_event.is_set():
+                    break
+                # 对比多个配置时各写一个子目录，互不覆盖
+                out = os.path.join(output_dir, name) if len(names) > 1 else output_dir
+                try:
+                    summary = engine.convert_images(
+                        webps, out, fmt, jobs=jobs, on_result=on_result, cancel_event=cancel_event,
+                        profile=IMAGE_PROFILES[name],
+                    )
+                except Exception as e:
+                    logger.exception("convert_images exception")
+                    summary = engine.ImageBatchSummary(total=len(webps), fail=len(webps), profile=name)
+                    self.events.post(events.LOG, payload=f"图片转换时发生异常:\n{str(e)}\n")
+                summaries.append(summary)
+            self.events.post(events.BATCH_DONE, payload=summaries)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _finish_image_batch(self, summaries: list[engine.ImageBatchSummary]):
+        cancelled = "（已取消）" if any(s.cancelled for s in summaries) else ""
+        for summary in summaries:
+            self._log_append(
+                f"图片转换完成（{summary.profile}）：成功 {summary.ok}，失败 {summary.fail}，"
+                f"耗时 {summary.elapsed:.1f}s（{summary.files_per_second:.2f} 个/秒，"
+                f"{summary.mb_per_second:.2f} MB/s），编码 {summary.encode_time:.1f}s，"
+                f"输出 {summary.output_bytes / (1024 * 1024):.2f} MB\n"
+            )
+        if cancelled:
+            self._log_append(f"图片转换{cancelled}\n")
+        ok = sum(s.ok for s in summaries)
+        fail = sum(s.fail for s in summaries)
         # 转换完成后不弹出二次确认，避免打断用户操作。
         # 如需生成视频，用户可直接点击“开始转换”（支持 webp 直接转 mp4）。
-        if ok > 0:
-            self._set_status(f"图片转换完成：成功 {ok}，失败 {fail}")
-
-    def check_ffmpeg(self):
-        try:
-            subprocess.run(
-                ["ffmpeg", "-version"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                creationflags=subprocess.CREATE_NO_WINDOW
+        self._set_status(f"图片转换完成{cancelled}：成功 {ok}，失败 {fail}")
+
+    def _convert_slideshow(self, queue: list[str], options: engine.ConvertOptions):
+        """幻灯片模式：整个队列在一次 FFmpeg 调用中合成一个视频。"""
+        output_dir = options.output_dir or engine.default_output_dir(queue[0])
+        output_path = os.path.join(output_dir, f"{Path(queue[0]).stem}_slideshow.mp4")
+        self._batch_kind = "slideshow"
+        # 单个 FFmpeg 进程，不支持中途取消
+        self.cancel_btn.config(state=tk.DISABLED)
+        self._log_append(f"幻灯片模式：{len(queue)} 张图片合成一个视频 -> {output_path}\n")
+
+        def worker():
+            res = engine.convert_slideshow(
+                queue, output_path, options, on_progress=lambda p: self.events.post(events.PROGRESS, 0, p)
             )
-            return True
-        except FileNotFoundError:
-            messagebox.showerror(
-                "错误",
-                "未找到 FFmpeg。请确保已安装 FFmpeg 并添加到系统 PATH 环境变量中。\n\n"
-                "您可以从 https://ffmpeg.org/download.html 下载 FFmpeg。"
-            )
-            self.root.after(100, self.root.quit)
-            return False
-
-    def _convert_one(self, file_path: str, on_done=None):
-        """转换单张图片。on_done(success: bool)"""
-        if not file_path or not os.path.exists(file_path):
-            self._set_status("转换失败")
-            self._log_append(f"图片不存在：{file_path}\n")
-            if on_done:
-                on_done(False)
-            return
+            self.events.post(events.BATCH_DONE, payload=res)
 
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir, exist_ok=True)
-
-        input_path = Path(file_path)
-        output_path = Path(self.output_dir) / f"{input_path.stem}.mp4"
-
-        duration = self.duration.get()
-        cmd = [
-            "ffmpeg",
-            "-y",
-            # 降低内存占用：限制线程数（部分机器/环境下大图编码可能出现 Cannot allocate memory）
-            "-threads", "1",
-            "-thread_type", "slice",
-            "-loop", "1",
-            "-framerate", "30",
-            "-i", str(input_path),
-            "-t", str(duration),
-            # stillimage + 限制分辨率 + pad 到偶数，提升兼容性并减少编码压力
-            "-vf", "fps=30,scale=1280:-2:force_original_aspect_ratio=decrease,pad=ceil(iw/2)*2:ceil(ih/2)*2,format=yuv420p",
-            "-c:v", "libx264",
-            # ultrafast 内存/CPU压力更小；stillimage 更适合静态图
-            "-preset", "ultrafast",
-            "-tune", "stillimage",
-            "-crf", "23",
-            "-pix_fmt", "yuv420p",
-            "-movflags", "+faststart",
-            "-f", "mp4",
-            str(output_path)
-        ]
-
-        ffmpeg_cmd_str = " ".join(cmd)
-        logger.info(f"Starting conversion. Input: {input_path}, Output: {output_path}, Duration: {duration}s")
-        logger.info("FFmpeg command: " + ffmpeg_cmd_str)
-        self._log_append("FFmpeg 指令:\n" + ffmpeg_cmd_str + "\n\n")
+        threading.Thread(target=worker, daemon=True).start()
 
-        try:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                creationflags=(subprocess.CREATE_NO_WINDOW if hasattr(subprocess, "CREATE_NO_WINDOW") else 0)
-            )
-
-            def worker_wait():
-                try:
-                    out, err = process.communicate()
-                    return_code = process.returncode
-
-                    file_ok = output_path.exists() and output_path.stat().st_size > 0
-                    logger.info(
-                        f"FFmpeg exited. return_code={return_code}, file_ok={file_ok}, output_exists={output_path.exists()}"
-                    )
-
-                    def update_ui():
-                        if return_code == 0 and file_ok:
-                            self._log_append(
-                                f"转换成功！\n输出文件: {output_path}\n大小: {output_path.stat().st_size} bytes\n"
-                            )
-                            if on_done:
-                                on_done(True)
-                        else:
-                            debug = []
-                            debug.append("转换失败（请查看下方日志/错误信息）\n")
-                            debug.append("FFmpeg 命令:\n" + ffmpeg_cmd_str)
-                            debug.append(f"返回码: {return_code}")
-                            if output_path.exists():
-                                debug.append(f"输出文件大小: {output_path.stat().st_size} bytes")
-                            else:
-                                debug.append("输出文件不存在")
-                            if err:
-                                debug.append("\nFFmpeg 错误输出(stderr):\n" + err)
-                            if out:
-                                debug.append("\nFFmpeg 标准输出(stdout):\n" + out)
-                            self._log_append("\n\n".join(debug) + "\n")
-                            if on_done:
-                                on_done(False)
-
-                    self.root.after(0, update_ui)
-
-                except Exception as e:
-                    logger.exception("worker_wait exception")
+    def _finish_slideshow(self, res: engine.JobResult):
+        self._log_append(res.log)
+        status = "幻灯片完成" if res.ok else "幻灯片生成失败"
+        self._set_status(f"{status}：{self._batch_total} 张图片，耗时 {res.elapsed:.1f}s")
 
-                    def update_ui_error():
-                        self._log_append(f"等待 FFmpeg 结束时发生异常:\n{str(e)}\n")
-                        if on_done:
-                            on_done(False)
-
-                    self.root.after(0, update_ui_error)
+    def cancel(self):
+        """取消当前批量任务：尚未开始的任务不再执行。"""
+        if not self._is_converting:
+            return
+        self._cancel_event.set()
+        self.cancel_btn.config(state=tk.DISABLED)
+        self._log_append("已请求取消：等待进行中的任务结束...\n")
+        logger.info("Batch cancel requested.")
 
-            threading.Thread(target=worker_wait, daemon=True).start()
+    def _start_batch(self, kind: str, total: int, options: Optional[engine.ConvertOptions] = None):
+        self._is_converting = True
+        self._cancel_event = threading.Event()
+        self._batch_kind = kind
+        self._batch_options = options
+        self._batch_total = total
+        self._batch_index = 0
+        self._running.clear()
+        self._progress_text = ""
+        self.convert_btn.config(state=tk.DISABLED)
+        self.img_convert_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.NORMAL)
 
-        except Exception as e:
-            self._log_append(f"执行 FFmpeg 时出错:\n{str(e)}\n")
-            logger.exception("Exception while running FFmpeg")
-            if on_done:
-                on_done(False)
+    def check_ffmpeg(self):
+        if self.ffmpeg_caps is not None:
+            return True
+        messagebox.showerror(
+            "错误",
+            "未找到 FFmpeg。请确保已安装 FFmpeg 并添加到系统 PATH 环境变量中。\n\n"
+            "您可以从 https://ffmpeg.org/download.html 下载 FFmpeg。"
+        )
+        self.root.after(100, self.root.quit)
+        return False
 
     def convert(self):
         if self._is_converting:
@@ -592,53 +826,133 @@ class ImageToVideoConverter:
             return
 
         queue = self.input_files if self.input_files else ([self.input_file] if self.input_file else [])
-        queue = [q for q in queue if q and os.path.exists(q) and self.is_supported_file(q)]
+        queue = [q for q in queue if q and source_exists(q) and self.is_supported_file(q)]
 
         if not queue:
             messagebox.showerror("错误", "请选择有效的图片文件")
             return
 
-        self._is_converting = True
-        self._batch_total = len(queue)
-        self._batch_index = 0
+        jobs = min(self._get_jobs(), len(queue))
 
         self._log_clear()
-        self.convert_btn.config(state=tk.DISABLED)
+        options = engine.ConvertOptions(
+            duration=self.duration.get(),
+            output_dir=self.output_dir,
+            jobs=jobs,
+            cache_dir=default_cache_dir() if self.use_cache.get() else "",
+            ingest=engine.INGEST_PILLOW if self.pillow_ingest.get() else engine.INGEST_FFMPEG,
+            profile=get_profile(self.profile_var.get()),
+        )
+        self._start_batch("video", len(queue), options)
+        self._log_append(f"开始批量转换：共 {len(queue)} 张图片，并行 {jobs} 个任务\n")
+        self._set_status(f"正在转换（并行 {jobs}）：共 {self._batch_total} 张图片")
 
-        results = {"ok": 0, "fail": 0}
+        if self.slideshow.get():
+            self._convert_slideshow(queue, options)
+            return
 
-        def finish():
-            self._is_converting = False
-            self.convert_btn.config(state=tk.NORMAL)
-            self._set_status(f"批量完成：成功 {results['ok']}，失败 {results['fail']}")
-            self._log_append(f"\n批量完成：成功 {results['ok']}，失败 {results['fail']}\n")
+        journal = BatchJournal.create(
+            self._journal_path(), {"files": queue, "options": engine.options_to_dict(options)}
+        )
+        self._run_video_batch(queue, options, journal)
 
-        def run_next(prev_ok=None):
-            if prev_ok is True:
-                results["ok"] += 1
-            elif prev_ok is False:
-                results["fail"] += 1
+    def _run_video_batch(self, queue: list[str], options: engine.ConvertOptions, journal: BatchJournal):
+        cancel_event = self._cancel_event
 
-            if self._batch_index >= self._batch_total:
-                finish()
+        def worker():
+            try:
+                summary = engine.run_batch(
+                    queue,
+                    options,
+                    # 引擎在工作线程中回调，只投递事件，由界面线程统一处理
+                    on_result=lambda res: self.events.post(
+                        events.JOB_FINISHED if res.ok else events.JOB_FAILED, res.index, res
+                    ),
+                    cancel_event=cancel_event,
+                    on_progress=lambda idx, p: self.events.post(events.PROGRESS, idx, p),
+                    on_start=lambda idx, path: self.events.post(events.JOB_STARTED, idx, path),
+                    journal=journal,
+                )
+            except Exception as e:
+                logger.exception("run_batch exception")
+                summary = engine.BatchSummary(total=len(queue), fail=len(queue))
+                self.events.post(events.LOG, payload=f"批量转换时发生异常:\n{str(e)}\n")
+            finally:
+                journal.close()
+            self.events.post(events.BATCH_DONE, payload=summary)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    @staticmethod
+    def _journal_path() -> str:
+        return os.path.join(app_cache_dir(), GUI_JOURNAL_FILE_NAME)
+
+    def _offer_resume(self):
+        """上次批量转换被中断（崩溃/断电）时，询问是否只转换剩余和失败的图片。"""
+        path = self._journal_path()
+        if not os.path.isfile(path):
+            return
+        journal = BatchJournal(path)
+        try:
+            if journal.finished:
                 return
+            files = journal.header.get("files") or []
+            remaining = [f for f in journal.remaining(files) if source_exists(f)]
+            options_data = journal.header.get("options")
+        except Exception:
+            logger.exception(f"Failed to read batch journal {path}")
+            return
+        finally:
+            journal.close()
+        if not remaining or not options_data:
+            return
 
-            current = queue[self._batch_index]
-            self._batch_index += 1
-
-            self._set_status(f"正在转换（{self._batch_index}/{self._batch_total}）：{os.path.basename(current)}")
-            self._convert_one(current, on_done=lambda ok: run_next(ok))
+        if not messagebox.askyesno(
+            "继续上次的转换",
+            f"上次批量转换未完成：共 {len(files)} 张，剩余 {len(remaining)} 张未完成或失败。\n\n是否继续转换剩余的图片？",
+        ):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return
 
-        # 启动第一张
-        run_next(None)
+        options = engine.options_from_dict(options_data)
+        self._log_clear()
+        self._start_batch("video", len(remaining), options)
+        self._log_append(
+            f"继续上次的批量转换：跳过已完成 {len(files) - len(remaining)} 张，剩余 {len(remaining)} 张，"
+            f"并行 {options.jobs} 个任务\n"
+        )
+        self._set_status(f"正在继续转换（并行 {options.jobs}）：共 {self._batch_total} 张图片")
+        self._run_video_batch(remaining, options, BatchJournal(path))
+
+    def _finish_video_batch(self, summary: engine.BatchSummary):
+        cancelled = "（已取消）" if summary.cancelled else ""
+        self._set_status(f"批量完成{cancelled}：成功 {summary.ok}，失败 {summary.fail}")
+        self._log_append(
+            f"\n批量完成{cancelled}：成功 {summary.ok}，失败 {summary.fail}，"
+            f"耗时 {summary.elapsed:.1f}s（{summary.images_per_second:.2f} 张/秒）\n"
+        )
+        if self._batch_options is not None and self._batch_options.cache_dir:
+            self._log_append(
+                f"缓存命中 {summary.cache_hits}，未命中 {summary.cache_misses}，"
+                f"节省 {summary.bytes_saved} bytes\n"
+            )
 
 
 def main():
-    # 若安装了 tkinterdnd2，则必须使用 TkinterDnD.Tk() 才能接收系统文件拖拽
-    if TkinterDnD is not None:
-        root = TkinterDnD.Tk()
-    else:
-        root = tk.Tk()
+    # 图片转换使用进程池；PyInstaller 打包后子进程需要 freeze_support
+    multiprocessing.freeze_support()
+
+    # --startup-time：输出到首次绘制和 FFmpeg 检测完成的耗时后退出
+    startup_report = "--startup-time" in sys.argv[1:]
+
+    # 指标输出路径由环境变量指定（见 metrics.ENV_JSONL / ENV_PROM），未设置时只在内存中聚合
+    metrics.configure()
+
+    # tkdnd 扩展在首次绘制后才加载（见 _load_dnd），这里用普通 Tk 根窗口
+    root = tk.Tk()
 
     # 设置窗口图标（左上角标题栏图标）。
     # 注意：PyInstaller 的 icon= 只影响 EXE 文件/任务栏分组图标，Tk 窗口左上角需要在代码里设置。
@@ -653,7 +967,7 @@ def main():
     style = ttk.Style()
     style.configure('Drop.TLabelframe', background='#f0f0f0')
 
-    app = ImageToVideoConverter(root)
+    app = ImageToVideoConverter(root, startup_report=startup_report)
     root.mainloop()
 
 
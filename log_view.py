@@ -0,0 +1,95 @@
+"""有界的日志面板。
+
+工作线程/回调只把文本追加到待刷新缓冲区（线程安全，不碰 Tk）；界面线程按固定节拍
+一次性把新增内容插入 tk.Text，并从顶部删除超出 max_lines 的旧行。
+因此无论批量多长，控件中的行数和每次刷新的开销都有上限。
+完整日志按行写入临时文件（不占内存），可通过 export() 另存。
+"""
+
+import shutil
+import tempfile
+import threading
+import tkinter as tk
+from collections import deque
+
+DEFAULT_MAX_LINES = 2000
+# 单行最长显示字符数（FFmpeg 配置信息等超长行会截断显示，完整内容在导出的日志中）
+MAX_LINE_CHARS = 1000
+
+
+class LogView:
+    def __init__(self, text: tk.Text, max_lines: int = DEFAULT_MAX_LINES):
+        self.text = text
+        self.max_lines = max_lines
+        self._lock = threading.Lock()
+        self._pending: deque[str] = deque(maxlen=max_lines)
+        self._pending_dropped = False
+        self._clear_requested = False
+        self._lines_shown = 0
+        self._spool = self._new_spool()
+
+    @staticmethod
+    def _new_spool():
+        return tempfile.TemporaryFile(mode="w+", encoding="utf-8", prefix="pic_to_video_log_")
+
+    def append(self, text: str) -> None:
+        """追加文本（任意线程可调用）。"""
+        if not text:
+            return
+        lines = text.splitlines()
+        with self._lock:
+            self._spool.write(text if text.endswith("\n") else text + "\n")
+            if len(self._pending) + len(lines) > self.max_lines:
+                # 两次刷新之间产生的行数超过上限：只有最后 max_lines 行会显示
+                self._pending_dropped = True
+            for line in lines:
+                if len(line) > MAX_LINE_CHARS:
+                    line = line[:MAX_LINE_CHARS] + " …"
+                self._pending.append(line)
+
+    def clear(self) -> None:
+        """清空显示和完整日志（任意线程可调用，下次刷新时生效）。"""
+        with self._lock:
+            self._pending.clear()
+            self._pending_dropped = False
+            self._clear_requested = True
+            self._spool.close()
+            self._spool = self._new_spool()
+
+    def flush(self) -> None:
+        """把缓冲区内容刷到控件（必须在界面线程调用）。"""
+        with self._lock:
+            clear = self._clear_requested or self._pending_dropped
+            lines = list(self._pending)
+            self._pending.clear()
+            self._pending_dropped = False
+            self._clear_requested = False
+        if not clear and not lines:
+            return
+
+        self.text.configure(state=tk.NORMAL)
+        try:
+            if clear:
+                self.text.delete("1.0", tk.END)
+                self._lines_shown = 0
+            if lines:
+                self.text.insert(tk.END, "\n".join(lines) + "\n")
+                self._lines_shown += len(lines)
+            excess = self._lines_shown - self.max_lines
+            if excess > 0:
+                self.text.delete("1.0", f"{excess + 1}.0")
+                self._lines_shown -= excess
+            self.text.see(tk.END)
+        finally:
+            self.text.configure(state=tk.DISABLED)
+
+    def export(self, path: str) -> None:
+        """把完整日志另存为 UTF-8 文本文件。"""
+        with self._lock:
+            self._spool.flush()
+            self._spool.seek(0)
+            try:
+                with open(path, "w", encoding="utf-8") as out:
+                    shutil.copyfileobj(self._spool, out)
+            finally:
+                self._spool.seek(0, 2)
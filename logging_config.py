@@ -1,15 +1,25 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # --- Configuration ---
 LOG_FILE_NAME = "app.log"
 LOG_MAX_BYTES = 5 * 1024 * 1024  # 5 MB
 LOG_BACKUP_COUNT = 3
 
+_listener = None
+
 # --- Setup Logger ---
 def setup_logging():
-    """Initializes and configures the root logger."""
+    """Initializes and configures the root logger.
+
+    Records are only enqueued on the calling thread (UI or worker); a QueueListener
+    thread does the formatting and the file I/O, including rotation.
+    """
+    global _listener
+
     log_formatter = logging.Formatter(
         '%(asctime)s - %(levelname)s - [%(module)s:%(lineno)d] - %(message)s'
     )
@@ -18,7 +28,15 @@ def setup_logging():
     log_dir = os.path.dirname(os.path.abspath(__file__))
     log_file_path = os.path.join(log_dir, LOG_FILE_NAME)
 
-    # Rotating file handler
+    # Get the root logger and add the handler
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+
+    # Avoid adding duplicate handlers if this function is called multiple times
+    if root_logger.handlers:
+        return root_logger
+
+    # Rotating file handler, driven by the listener thread
     file_handler = RotatingFileHandler(
         log_file_path,
         maxBytes=LOG_MAX_BYTES,
@@ -28,17 +46,34 @@ def setup_logging():
     file_handler.setFormatter(log_formatter)
     file_handler.setLevel(logging.INFO)
 
-    # Get the root logger and add the handler
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    root_logger.addHandler(queue_handler)
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    # Flush queued records before the interpreter exits
+    atexit.register(stop_logging)
 
-    # Avoid adding duplicate handlers if this function is called multiple times
-    if not root_logger.handlers:
-        root_logger.addHandler(file_handler)
+    if hasattr(os, "register_at_fork"):
+        def _after_fork_in_child():
+            # The listener thread does not survive fork; forked workers log synchronously
+            global _listener
+            _listener = None
+            root_logger.removeHandler(queue_handler)
+            root_logger.addHandler(file_handler)
+
+        os.register_at_fork(after_in_child=_after_fork_in_child)
 
     return root_logger
 
+
+def stop_logging():
+    """Drains the log queue and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 # --- Initialize and get logger ---
 # This will be imported by other modules
 logger = setup_logging()
-
@@ -0,0 +1,219 @@
+"""按内存预算准入转换任务。
+
+固定的 -threads 1 / -preset ultrafast 是为了避免大图编码时 "Cannot allocate memory"，
+但它同样限制了小图。这里先从文件头读出每张图片的尺寸和像素模式，估算 FFmpeg
+解码 + 缩放 + 编码的峰值内存，再按预算准入：小图可以多路并行，超大图则独占预算单独运行。
+准入按提交顺序排队（FIFO），大图不会被源源不断的小图饿死。
+任务按单线程的估算准入，准入后再用剩余预算追加编码线程（job_threads）：小图多线程，大图少线程或单线程。
+"""
+
+import os
+import re
+import sys
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from encoder_profiles import EncoderProfile
+from image_metadata import ImageInfo
+
+MB = 1024 * 1024
+
+# 0 表示不限制；-1 表示按当前可用物理内存自动计算
+MEMORY_BUDGET_OFF = 0
+MEMORY_BUDGET_AUTO = -1
+# 自动预算占可用内存的比例，留出余量给系统和 GUI
+AUTO_BUDGET_RATIO = 0.7
+
+# FFmpeg 进程本身（库、滤镜图、muxer）的基础占用
+FFMPEG_BASE_BYTES = 32 * MB
+# swscale 缩放时源帧与中间格式并存
+DECODE_OVERHEAD = 1.25
+# x264 与线程数无关的 yuv420p 帧缓冲（参考帧、重建帧等），按输出帧数计
+ENCODER_BASE_FRAMES = 4
+# 每个编码线程另外持有的输出帧数：slice 线程共用同一帧，frame 线程各自持有正在编码的帧和参考帧
+# （1280 宽、ultrafast 实测每线程约 2MB / 8.7MB）
+ENCODER_FRAMES_PER_THREAD = {"slice": 2, "frame": 6}
+# 非 fast_still 模式下 -loop 1 按 30fps 反复解码源图：多一份源帧，滤镜图与编码队列中另有约这么多输出帧
+LOOP_EXTRA_FRAMES = 15
+# 无法读取文件头时按 12 MP RGB 估算
+UNKNOWN_IMAGE_BYTES = 4000 * 3000 * 3
+
+# 各平台内存不足时的典型输出和返回码（-9/137：被 OOM killer 杀掉；0xC0000017：Windows STATUS_NO_MEMORY）
+_OOM_PATTERN = re.compile(
+    r"cannot allocate memory|out of memory|enomem|memory allocation failed|malloc of size \d+ failed|get_buffer\(\) failed",
+    re.IGNORECASE,
+)
+_OOM_RETURN_CODES = {-9, 137, 0xC0000017}
+
+
+def available_memory() -> Optional[int]:
+    """当前可用物理内存（字节）；无法获取时返回 None。"""
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+
+    if sys.platform == "win32":
+        try:
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return int(status.ullAvailPhys)
+        except Exception:
+            return None
+        return None
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        pass
+    try:
+        # macOS 没有 SC_AVPHYS_PAGES，按物理内存的一半估计
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def resolve_budget(budget: int) -> int:
+    """把配置值换算成字节数；0 表示不限制。"""
+    if budget != MEMORY_BUDGET_AUTO:
+        return max(0, budget)
+    avail = available_memory()
+    return int(avail * AUTO_BUDGET_RATIO) if avail else MEMORY_BUDGET_OFF
+
+
+def output_pixels(info: ImageInfo, max_width: int) -> int:
+    """与 scale=W:-2 相同的输出像素数估算（宽度固定为 max_width，小图也会被放大）。"""
+    scale = max_width / info.width if info.width else 1.0
+    return int(info.pixels * scale * scale)
+
+
+def estimate_job_memory(
+    info: Optional[ImageInfo],
+    profile: EncoderProfile,
+    pillow_ingest: bool = False,
+    cpu_count: Optional[int] = None,
+    looped: bool = False,
+) -> int:
+    """估算单个转换任务的峰值内存（字节）。looped 表示输入按 -loop 1 逐帧重复解码（非 fast_still）。"""
+    threads = profile.threads or cpu_count or os.cpu_count() or 1
+    if info is None:
+        decode = UNKNOWN_IMAGE_BYTES
+        out_px = profile.max_width * profile.max_width * 9 // 16
+    else:
+        out_px = output_pixels(info, profile.max_width)
+        if pillow_ingest:
+            # draft 模式最多按 2 倍目标尺寸解码，另有一份 rgb24 输出帧
+            decode = out_px * 4 * 3 + out_px * 3
+        else:
+            decode = int(info.pixels * info.bytes_per_pixel * DECODE_OVERHEAD)
+    per_thread = ENCODER_FRAMES_PER_THREAD.get(profile.thread_type, ENCODER_FRAMES_PER_THREAD["frame"])
+    frames = ENCODER_BASE_FRAMES + per_thread * threads
+    if looped:
+        decode *= 2
+        frames += LOOP_EXTRA_FRAMES
+    encode = int(out_px * 1.5 * frames)
+    return FFMPEG_BASE_BYTES + decode + encode
+
+
+def job_threads(profile: EncoderProfile, jobs: int, cpu_count: Optional[int] = None) -> int:
+    """单个任务最多使用的编码线程数：配置的线程数，或并行任务平分后的 CPU 核数（取较大者）。"""
+    cpus = cpu_count or os.cpu_count() or 1
+    if not profile.threads:
+        return cpus
+    return max(profile.threads, cpus // max(1, jobs))
+
+
+def is_oom_failure(return_code: Optional[int], log: str) -> bool:
+    if return_code in _OOM_RETURN_CODES:
+        return True
+    return bool(_OOM_PATTERN.search(log or ""))
+
+
+class Lease:
+    """reserve() 给出的额度；extend() 追加的部分随同释放。"""
+
+    def __init__(self, cost: int):
+        self.cost = cost
+
+
+class MemoryBudget:
+    """FIFO 的内存预算准入：reserve(cost) 阻塞到预算足够为止。
+
+    单个任务的成本超过总预算时，等到没有其他任务运行后独占执行，不会永久阻塞。
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        self._cond = threading.Condition()
+        self._queue: deque[object] = deque()
+
+    @contextmanager
+    def reserve(self, cost: int):
+        cost = max(0, min(cost, self.total))
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            waited = False
+            while self._queue[0] is not ticket or (self.used > 0 and self.used + cost > self.total):
+                waited = True
+                self._cond.wait()
+            self._queue.popleft()
+            self.used += cost
+            self.peak = max(self.peak, self.used)
+            if waited:
+                self.waits += 1
+            # 队首变化，唤醒下一个等待者检查预算
+            self._cond.notify_all()
+        lease = Lease(cost)
+        try:
+            yield lease
+        finally:
+            with self._cond:
+                self.used -= lease.cost
+                self._cond.notify_all()
+
+    def extend(self, lease: Lease, step: int, count: int) -> int:
+        """不阻塞地在剩余预算内为已准入的额度追加至多 count 份 step 字节，返回实际追加的份数。
+
+        有任务在排队等待时不追加，剩余预算留给队首的任务。
+        """
+        if step <= 0 or count <= 0:
+            return 0
+        with self._cond:
+            if self._queue:
+                return 0
+            granted = min(count, max(0, self.total - self.used) // step)
+            self.used += granted * step
+            self.peak = max(self.peak, self.used)
+            lease.cost += granted * step
+            return granted
+
+    @contextmanager
+    def exclusive(self):
+        """独占整个预算（用于内存不足后的重试）。"""
+        with self.reserve(self.total):
+            yield
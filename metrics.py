@@ -0,0 +1,245 @@
+"""流水线各阶段的耗时/字节数埋点。
+
+每个阶段（scan、header_probe、ffmpeg_spawn、encode、verify、image_convert）用
+span() 或 record() 记录一次耗时、输入/输出字节数和成败。内存中按阶段聚合为直方图；
+配置了输出路径时，后台线程把每条记录追加为 JSON 行，并定期把聚合结果原子地写成
+Prometheus 文本格式（供 node_exporter 的 textfile collector 采集，文件名需以 .prom 结尾）。
+热路径上只做一次加锁累加和一次入队，不做任何文件 I/O。
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+from logging_config import logger
+
+METRIC_PREFIX = "pic_to_video"
+# 直方图桶上限（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROM_WRITE_INTERVAL = 15.0
+
+# 未通过命令行指定时，从环境变量读取输出路径（GUI 使用）
+ENV_JSONL = "PIC_TO_VIDEO_METRICS_JSONL"
+ENV_PROM = "PIC_TO_VIDEO_METRICS_PROM"
+
+
+@dataclass
+class StageStats:
+    count: int = 0
+    errors: int = 0
+    seconds_sum: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    buckets: list[int] = field(default_factory=lambda: [0] * len(BUCKETS))
+
+    def add(self, seconds: float, bytes_in: int, bytes_out: int, ok: bool):
+        self.count += 1
+        self.seconds_sum += seconds
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        if not ok:
+            self.errors += 1
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+
+@dataclass
+class Span:
+    """span() 产出的可写记录：在 with 块内设置 bytes_out / ok / attrs。"""
+    stage: str
+    bytes_in: int = 0
+    bytes_out: int = 0
+    ok: bool = True
+    attrs: dict = field(default_factory=dict)
+
+
+class MetricsRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: dict[str, StageStats] = {}
+        self._queue: "queue.SimpleQueue[object]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._dirty = False
+        self.jsonl_path = ""
+        self.prom_path = ""
+
+    def configure(self, jsonl_path: str = "", prom_path: str = "") -> None:
+        """设置输出路径；任一路径非空时启动后台写入线程。"""
+        self.jsonl_path = jsonl_path or os.environ.get(ENV_JSONL, "")
+        self.prom_path = prom_path or os.environ.get(ENV_PROM, "")
+        if (self.jsonl_path or self.prom_path) and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+            logger.info(f"Metrics export enabled. jsonl={self.jsonl_path or 'off'}, prom={self.prom_path or 'off'}")
+
+    def record(
+        self,
+        stage: str,
+        seconds: float,
+        bytes_in: int = 0,
+        bytes_out: int = 0,
+        ok: bool = True,
+        **attrs,
+    ) -> None:
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats()
+            stats.add(seconds, bytes_in, bytes_out, ok)
+            self._dirty = True
+        if self._thread is not None and self.jsonl_path:
+            self._queue.put({
+                "ts": round(time.time(), 3),
+                "stage": stage,
+                "seconds": round(seconds, 6),
+                "bytes_in": bytes_in,
+                "bytes_out": bytes_out,
+                "ok": ok,
+                **attrs,
+            })
+
+    def snapshot(self) -> dict[str, StageStats]:
+        with self._lock:
+            return {
+                name: StageStats(s.count, s.errors, s.seconds_sum, s.bytes_in, s.bytes_out, list(s.buckets))
+                for name, s in self._stages.items()
+            }
+
+    def render_prometheus(self) -> str:
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_stage_duration_seconds Time spent per pipeline stage.",
+            f"# TYPE {p}_stage_duration_seconds histogram",
+        ]
+        stages = sorted(self.snapshot().items())
+        for name, s in stages:
+            for bound, count in zip(BUCKETS, s.buckets):
+                lines.append(f'{p}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'{p}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {s.count}')
+            lines.append(f'{p}_stage_duration_seconds_sum{{stage="{name}"}} {s.seconds_sum:.6f}')
+            lines.append(f'{p}_stage_duration_seconds_count{{stage="{name}"}} {s.count}')
+        for metric, attr, help_text in (
+            ("stage_errors_total", "errors", "Failed stage executions."),
+            ("stage_bytes_in_total", "bytes_in", "Bytes read by a stage."),
+            ("stage_bytes_out_total", "bytes_out", "Bytes written by a stage."),
+        ):
+            lines.append(f"# HELP {p}_{metric} {help_text}")
+            lines.append(f"# TYPE {p}_{metric} counter")
+            for name, s in stages:
+                lines.append(f'{p}_{metric}{{stage="{name}"}} {getattr(s, attr)}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Optional[str] = None) -> None:
+        path = path or self.prom_path
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.render_prometheus())
+            # textfile collector 要求原子替换，避免读到写了一半的文件
+            os.replace(tmp, path)
+        except Exception:
+            logger.exception(f"Failed to write Prometheus metrics to {path}")
+
+    def _write_jsonl(self, events: list[dict]) -> None:
+        try:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                for ev in events:
+                    f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+        except Exception:
+            logger.exception(f"Failed to append metrics to {self.jsonl_path}")
+
+    def _run(self) -> None:
+        last_prom = 0.0
+        while True:
+            events: list[dict] = []
+            waiters: list[threading.Event] = []
+            try:
+                item = self._queue.get(timeout=1.0)
+                while True:
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        events.append(item)
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            if events and self.jsonl_path:
+                self._write_jsonl(events)
+            now = time.monotonic()
+            if self.prom_path and (waiters or (self._dirty and now - last_prom >= PROM_WRITE_INTERVAL)):
+                self._dirty = False
+                last_prom = now
+                self.write_prometheus()
+            for w in waiters:
+                w.set()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """等待后台线程写完已入队的记录并刷新 Prometheus 文件。"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """线性插值分位数（p 取 0-100）。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def latency_stats(values: list[float]) -> dict:
+    return {
+        "mean": round(sum(values) / len(values), 4) if values else 0.0,
+        "p50": round(percentile(values, 50), 4),
+        "p90": round(percentile(values, 90), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values), 4) if values else 0.0,
+    }
+
+
+recorder = MetricsRecorder()
+
+
+def configure(jsonl_path: str = "", prom_path: str = "") -> None:
+    recorder.configure(jsonl_path, prom_path)
+
+
+def flush() -> None:
+    recorder.flush()
+
+
+def record(stage: str, seconds: float, bytes_in: int = 0, bytes_out: int = 0, ok: bool = True, **attrs) -> None:
+    recorder.record(stage, seconds, bytes_in, bytes_out, ok, **attrs)
+
+
+@contextmanager
+def span(stage: str, bytes_in: int = 0, **attrs):
+    """计时一个阶段；with 块抛出异常时记为失败（异常照常抛出）。"""
+    sp = Span(stage=stage, bytes_in=bytes_in, attrs=dict(attrs))
+    started = time.perf_counter()
+    try:
+        yield sp
+    except BaseException:
+        sp.ok = False
+        raise
+    finally:
+        recorder.record(sp.stage, time.perf_counter() - started, sp.bytes_in, sp.bytes_out, sp.ok, **sp.attrs)
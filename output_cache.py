@@ -0,0 +1,239 @@
+"""内容寻址的输出缓存。
+
+键 = 图片内容 sha256 + 完整编码参数（时长、滤镜、编码器设置）；
+命中时用硬链接（失败则复制）直接提供 MP4，不再调用 FFmpeg。
+索引保存在缓存目录下的 index.json，超过容量上限时按最近最少使用（LRU）淘汰。
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import Iterable, Optional
+
+from archive_source import open_source
+from logging_config import logger
+
+INDEX_FILE_NAME = "index.json"
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+_HASH_CHUNK = 1024 * 1024
+# put() 只标记索引已修改，距上次写盘超过该秒数才写回；其余由 flush()（批量结束时）统一写回
+INDEX_FLUSH_INTERVAL = 30.0
+
+
+def app_cache_dir() -> str:
+    """应用缓存根目录（Windows: %LOCALAPPDATA%，其他：~/.cache）。"""
+    if sys.platform.startswith("win"):
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pic_to_video")
+
+
+def default_cache_dir() -> str:
+    """默认输出缓存目录。"""
+    return os.path.join(app_cache_dir(), "outputs")
+
+
+def hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open_source(path) as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(content_hash: str, params: Iterable[str]) -> str:
+    h = hashlib.sha256(content_hash.encode("ascii"))
+    for p in params:
+        h.update(b"\0")
+        h.update(str(p).encode("utf-8"))
+    return h.hexdigest()
+
+
+def partial_path(path: str) -> str:
+    """与 path 同目录的临时文件名（隐藏文件，写完后用 os.replace 原子改名为 path）。"""
+    head, tail = os.path.split(path)
+    return os.path.join(head, f".{tail}.{os.getpid()}.{threading.get_ident()}.part")
+
+
+def discard_partial(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.exception(f"Failed to remove partial file {path}")
+
+
+def discard_stale_partials(path: str) -> None:
+    """删除 path 的所有临时文件（上次运行中断时遗留的）。"""
+    head, tail = os.path.split(path)
+    for stale in glob.glob(os.path.join(glob.escape(head), f".{glob.escape(tail)}.*.part")):
+        discard_partial(stale)
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """硬链接 src 到 dst（跨盘等失败时复制）。
+
+    先写到同目录的临时名再原子替换：dst 要么是旧文件，要么是完整的新文件，也不会写穿已有硬链接。
+    """
+    try:
+        if os.path.samefile(src, dst):
+            # 已是同一文件的硬链接（rename 在这种情况下什么也不做，临时文件会残留）
+            return
+    except OSError:
+        pass
+    tmp = partial_path(dst)
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        discard_partial(tmp)
+        raise
+
+
+class OutputCache:
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._entries: dict[str, dict] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILE_NAME)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".mp4")
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries = dict(data.get("entries", {}))
+        except FileNotFoundError:
+            self._entries = {}
+        except Exception:
+            logger.exception("Failed to load output cache index; starting empty")
+            self._entries = {}
+
+    def _save_locked(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"entries": self._entries}, f)
+        os.replace(tmp, self.index_path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def flush(self):
+        """把 LRU 时间戳等变更写回磁盘。"""
+        with self._lock:
+            if self._dirty:
+                try:
+                    self._save_locked()
+                except Exception:
+                    logger.exception("Failed to save output cache index")
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(e.get("size", 0) for e in self._entries.values())
+
+    def get(self, key: str, dst_path: str) -> bool:
+        """命中则把缓存输出放到 dst_path 并返回 True。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            path = self._entry_path(key)
+            if entry is None or not os.path.isfile(path) or os.path.getsize(path) != entry.get("size"):
+                if entry is not None:
+                    # 缓存文件丢失或损坏
+                    self._entries.pop(key, None)
+                    self._dirty = True
+                self.misses += 1
+                return False
+            entry["last_used"] = time.time()
+            self._dirty = True
+
+        try:
+            link_or_copy(path, dst_path)
+        except Exception:
+            logger.exception(f"Failed to serve cache entry {key} -> {dst_path}")
+            with self._lock:
+                self.misses += 1
+            return False
+
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += entry["size"]
+        return True
+
+    def put(self, key: str, src_path: str) -> None:
+        """把新编码的输出登记到缓存（失败只记录日志，不影响转换结果）。"""
+        path = self._entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            link_or_copy(src_path, path)
+            size = os.path.getsize(path)
+        except Exception:
+            logger.exception(f"Failed to store cache entry for {src_path}")
+            return
+
+        with self._lock:
+            self._entries[key] = {"size": size, "last_used": time.time()}
+            self._evict_locked()
+            self._dirty = True
+            # 监视/服务模式长期不调用 flush()，按时间间隔写回，避免进程退出前的登记全部丢失
+            if time.monotonic() - self._saved_at < INDEX_FLUSH_INTERVAL:
+                return
+            try:
+                self._save_locked()
+            except Exception:
+                logger.exception("Failed to save output cache index")
+
+    def _evict_locked(self):
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self._entries.items(), key=lambda kv: kv[1].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._entry_path(key))
+            except FileNotFoundError:
+                pass
+            except Exception:
+                logger.exception(f"Failed to evict cache entry {key}")
+                continue
+            total -= entry.get("size", 0)
+            del self._entries[key]
+            logger.info(f"Output cache evicted {key}")
+
+    def stats_text(self) -> str:
+        return f"缓存命中 {self.hits}，未命中 {self.misses}，节省 {self.bytes_saved} bytes"
+
+
+def open_cache(cache_dir: Optional[str], max_bytes: int = DEFAULT_MAX_BYTES) -> Optional[OutputCache]:
+    """cache_dir 为空表示不使用缓存；打开失败时记录日志并退回无缓存。"""
+    if not cache_dir:
+        return None
+    try:
+        return OutputCache(cache_dir, max_bytes)
+    except Exception:
+        logger.exception(f"Failed to open output cache at {cache_dir}")
+        return None
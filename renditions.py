@@ -0,0 +1,73 @@
+"""多分辨率输出（rendition ladder）。
+
+一次 FFmpeg 调用解码一次图片，用 split 滤镜分成多路，各自缩放/pad 后分别编码写出，
+例如同时生成 1080p、720p、480p 的 MP4 和 WebM，而不是每个尺寸把整个队列重跑一遍。
+规格写法："1080,720,480,720:webm"（高度，可带 p 后缀；:webm 表示 VP9 WebM，默认 MP4）。
+"""
+
+from dataclasses import dataclass
+
+MP4 = "mp4"
+WEBM = "webm"
+CONTAINERS = (MP4, WEBM)
+
+# VP9 各高度的推荐 CRF（配合 -b:v 0 的恒定质量模式）
+VP9_CRF = {2160: 15, 1440: 24, 1080: 31, 720: 32, 480: 33, 360: 36}
+VP9_DEFAULT_CRF = 33
+VP9_ENCODER = "libvpx-vp9"
+
+MIN_HEIGHT = 144
+MAX_HEIGHT = 4320
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """一路输出：缩放到 width x height 的框内（保持比例，不补黑边），再 pad 到偶数尺寸。"""
+    name: str
+    width: int
+    height: int
+    container: str = MP4
+    # 0 表示 MP4 沿用编码配置的 crf，WebM 按高度取 VP9_CRF
+    crf: int = 0
+
+    @property
+    def suffix(self) -> str:
+        """输出文件名后缀，例如 _720p.mp4。"""
+        return f"_{self.name}.{self.container}"
+
+
+def box_width(height: int) -> int:
+    """16:9 框的宽度（取偶数）：1080 -> 1920，720 -> 1280，480 -> 854。"""
+    return (height * 16 // 9 + 1) // 2 * 2
+
+
+def parse_rendition(token: str) -> Rendition:
+    """解析单个规格，如 "720"、"1080p"、"480:webm"；格式错误抛 ValueError。"""
+    size, _, container = token.strip().lower().partition(":")
+    container = container or MP4
+    if container not in CONTAINERS:
+        raise ValueError(f"未知的输出格式：{container}（可选 {', '.join(CONTAINERS)}）")
+    try:
+        height = int(size[:-1] if size.endswith("p") else size)
+    except ValueError:
+        raise ValueError(f"无效的分辨率：{token}") from None
+    if not MIN_HEIGHT <= height <= MAX_HEIGHT:
+        raise ValueError(f"分辨率高度须在 {MIN_HEIGHT}~{MAX_HEIGHT} 之间：{token}")
+    crf = VP9_CRF.get(height, VP9_DEFAULT_CRF) if container == WEBM else 0
+    return Rendition(f"{height}p", box_width(height), height, container, crf)
+
+
+def parse_ladder(spec: str) -> tuple[Rendition, ...]:
+    """解析逗号分隔的规格列表（去重，保持顺序）；空字符串表示不使用多分辨率输出。"""
+    out: list[Rendition] = []
+    for token in spec.split(","):
+        if not token.strip():
+            continue
+        r = parse_rendition(token)
+        if all(r.suffix != o.suffix for o in out):
+            out.append(r)
+    return tuple(out)
+
+
+def format_ladder(renditions: tuple[Rendition, ...]) -> str:
+    return ",".join(r.name if r.container == MP4 else f"{r.name}:{r.container}" for r in renditions)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 模块都在仓库根目录（没有包结构），直接运行 pytest 时需要把根目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,127 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import archive_source
+from archive_source import (
+    close_archives, is_tar_member, iter_members, member_output_dir, member_path, open_source, source_exists,
+    source_stat, split_member,
+)
+
+MEMBERS = {"a.png": b"A" * 10, "sub/b.png": b"B" * 20, "sub/c.txt": b"C", "d.png": b"D" * 30}
+
+
+def _accept(name):
+    return name.endswith(".png")
+
+
+@pytest.fixture
+def tar_gz(tmp_path):
+    path = str(tmp_path / "pics.tar.gz")
+    with tarfile.open(path, "w:gz") as tf:
+        for name, data in MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    yield path
+    close_archives()
+
+
+@pytest.fixture
+def zip_file(tmp_path):
+    path = str(tmp_path / "pics.zip")
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, data in MEMBERS.items():
+            zf.writestr(name, data)
+    return path
+
+
+def test_split_member():
+    assert split_member("/x/pics.zip!/sub/a.png") == ("/x/pics.zip", "sub/a.png")
+    # 目录名中的分隔符不是压缩包
+    assert split_member("/x/wow!/pics.tar.gz!/a.png") == ("/x/wow!/pics.tar.gz", "a.png")
+    assert split_member("/x/wow!/a.png") is None
+    assert split_member("/x/pics.zip!/") is None
+    assert split_member("/x/a.png") is None
+
+
+def test_is_tar_member():
+    assert is_tar_member("/x/pics.tgz!/a.png")
+    assert not is_tar_member("/x/pics.zip!/a.png")
+    assert not is_tar_member("/x/pics.tgz")
+
+
+def test_member_output_dir_stays_inside_archive_dir(tmp_path):
+    archive = str(tmp_path / "pics.tar.gz")
+    base = os.path.join(str(tmp_path), "pics")
+    assert member_output_dir(member_path(archive, "a.png")) == base
+    assert member_output_dir(member_path(archive, "x/y/a.png")) == os.path.join(base, "x", "y")
+    assert member_output_dir(member_path(archive, "../../etc/a.png")) == os.path.join(base, "etc")
+    assert member_output_dir(member_path(archive, "/abs/./a.png")) == os.path.join(base, "abs")
+
+
+@pytest.mark.parametrize("kind", ["tar_gz", "zip_file"])
+def test_members_listed_in_order_and_readable_out_of_order(kind, request):
+    archive = request.getfixturevalue(kind)
+    paths = list(iter_members(archive, _accept))
+    assert paths == [member_path(archive, n) for n in ("a.png", "sub/b.png", "d.png")]
+
+    for path in reversed(paths + paths):
+        with open_source(path) as f:
+            assert f.read() == MEMBERS[split_member(path)[1]]
+        assert source_stat(path)[1] == len(MEMBERS[split_member(path)[1]])
+
+    assert not source_exists(member_path(archive, "missing.png"))
+
+
+def test_large_tar_member_is_streamed(tar_gz, monkeypatch):
+    monkeypatch.setattr(archive_source, "TAR_BUFFER_MEMBER_BYTES", 15)
+    path = member_path(tar_gz, "sub/b.png")
+    with open_source(path) as f:
+        assert not isinstance(f, io.BytesIO)
+        assert f.read() == MEMBERS["sub/b.png"]
+    with open_source(member_path(tar_gz, "a.png")) as f:
+        assert f.read() == MEMBERS["a.png"]
+
+
+def test_size_index_is_dropped_when_archive_changes(tar_gz):
+    list(iter_members(tar_gz, _accept))
+    st = os.stat(tar_gz)
+    os.utime(tar_gz, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    list(iter_members(tar_gz, _accept))
+    assert [key for key in archive_source._sizes if key[0] == tar_gz] == [(tar_gz, os.stat(tar_gz).st_mtime_ns)]
+
+    close_archives()
+    assert not archive_source._sizes
+    assert not archive_source._cursors
+
+
+def test_longest_first_keeps_tar_members_in_place(tmp_path):
+    from PIL import Image
+
+    from converter_engine import order_longest_first
+    from image_metadata import HeaderIndex
+
+    def png(size):
+        buf = io.BytesIO()
+        Image.new("RGB", size).save(buf, "PNG")
+        return buf.getvalue()
+
+    archive = str(tmp_path / "pics.tar")
+    with tarfile.open(archive, "w") as tf:
+        for name, size in (("t1.png", (10, 10)), ("t2.png", (300, 300))):
+            data = png(size)
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    small, big = str(tmp_path / "small.png"), str(tmp_path / "big.png")
+    for path, size in ((small, (20, 20)), (big, (200, 200))):
+        with open(path, "wb") as f:
+            f.write(png(size))
+
+    t1, t2 = member_path(archive, "t1.png"), member_path(archive, "t2.png")
+    assert order_longest_first([small, t1, big, t2], HeaderIndex()) == [big, t1, small, t2]
+    close_archives()
@@ -0,0 +1,49 @@
+import autotune
+import converter_engine as engine
+from autotune import Measurement, candidate_grid, pick_best
+from encoder_profiles import EncoderProfile
+
+
+def _m(preset, rate, size, fail=0):
+    return Measurement(EncoderProfile("tuned", preset=preset), jobs=1, images=4, ok=4 - fail, fail=fail,
+                       images_per_second=rate, bytes_per_output=size)
+
+
+def test_grid_keeps_threads_times_jobs_near_cpu_count():
+    grid = candidate_grid("throughput", cpu=4)
+    assert len(grid) == len(autotune.CANDIDATE_PRESETS) * 3
+    assert {(p.threads, jobs) for p, jobs in grid} == {(1, 4), (2, 2), (4, 1)}
+    assert {p.crf for p, _ in candidate_grid("smallest", cpu=1)} == {26}
+
+
+def test_pick_best_per_goal():
+    fast = _m("ultrafast", 10.0, 900.0)
+    mid = _m("veryfast", 6.0, 300.0)
+    slow = _m("medium", 2.0, 250.0)
+    broken = _m("superfast", 50.0, 10.0, fail=1)
+    candidates = [fast, mid, slow, broken]
+
+    assert pick_best(candidates, "throughput") is fast
+    assert pick_best(candidates, "balanced") is mid
+    # medium 不到最快候选的 MIN_RATE_RATIO
+    assert pick_best(candidates, "smallest") is mid
+    assert pick_best([broken], "throughput") is None
+
+
+def test_measure_runs_candidate_without_cache(tmp_path, monkeypatch):
+    seen = []
+
+    def run_batch(files, options, on_result=None, **_kwargs):
+        seen.append(options)
+        on_result(engine.JobResult(index=0, input_path=files[0], ok=True, output_size=100, peak_rss_kb=2048))
+        return engine.BatchSummary(total=1, ok=1, output_bytes=100, elapsed=0.5)
+
+    monkeypatch.setattr(engine, "run_batch", run_batch)
+    profile = EncoderProfile("tuned", preset="veryfast", threads=2)
+    base = engine.ConvertOptions(cache_dir=str(tmp_path / "cache"))
+    m = autotune.measure(["a.jpg"], profile, 3, base, str(tmp_path / "work"))
+
+    (options,) = seen
+    assert (options.profile, options.jobs, options.cache_dir, options.memory_budget) == (profile, 3, "", 0)
+    assert options.output_dir == str(tmp_path / "work")
+    assert (m.images_per_second, m.bytes_per_output, m.peak_rss_kb) == (2.0, 100.0, 2048)
@@ -0,0 +1,99 @@
+import os
+
+from batch_journal import DONE, FAILED, QUEUED, RUNNING, BatchJournal
+
+
+def _write(path, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def _done(journal, src, out):
+    journal.mark(src, DONE, output=out, size=os.path.getsize(out), source_mtime_ns=os.stat(src).st_mtime_ns)
+
+
+def test_resume_skips_only_intact_done_jobs(tmp_path):
+    src_ok = _write(tmp_path / "a.png", b"a")
+    src_failed = _write(tmp_path / "b.png", b"b")
+    src_running = _write(tmp_path / "c.png", b"c")
+    out = _write(tmp_path / "a.mp4", b"video")
+    path = str(tmp_path / "batch.jsonl")
+
+    journal = BatchJournal.create(path, {"args": ["x"]})
+    for src in (src_ok, src_failed, src_running):
+        journal.mark(src, QUEUED)
+    _done(journal, src_ok, out)
+    journal.mark(src_failed, FAILED, return_code=1)
+    journal.mark(src_running, RUNNING, output=str(tmp_path / "c.mp4"))
+    journal.close()
+
+    resumed = BatchJournal(path)
+    assert resumed.header == {"args": ["x"]}
+    assert not resumed.finished
+    assert resumed.remaining([src_ok, src_failed, src_running]) == [src_failed, src_running]
+    assert resumed.counts() == {DONE: 1, FAILED: 1, RUNNING: 1}
+    resumed.close()
+
+
+def test_done_job_is_redone_when_output_or_source_changes(tmp_path):
+    src = _write(tmp_path / "a.png", b"a")
+    out = _write(tmp_path / "a.mp4", b"video")
+    journal = BatchJournal.create(str(tmp_path / "batch.jsonl"), {})
+    _done(journal, src, out)
+    assert journal.is_done(src)
+
+    _write(out, b"truncated")
+    assert not journal.is_done(src)
+
+    _done(journal, src, out)
+    st = os.stat(src)
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert not journal.is_done(src)
+    journal.close()
+
+
+def test_half_written_last_line_is_ignored(tmp_path):
+    src = _write(tmp_path / "a.png", b"a")
+    out = _write(tmp_path / "a.mp4", b"video")
+    path = str(tmp_path / "batch.jsonl")
+    journal = BatchJournal.create(path, {})
+    _done(journal, src, out)
+    journal.mark_finished()
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"path": "' + src)
+
+    resumed = BatchJournal(path)
+    assert resumed.finished
+    assert resumed.is_done(src)
+    resumed.close()
+
+
+def test_compact_keeps_last_record_and_prunes_missing_sources(tmp_path):
+    src = _write(tmp_path / "a.png", b"a")
+    gone = _write(tmp_path / "gone.png", b"g")
+    out = _write(tmp_path / "a.mp4", b"video")
+    path = str(tmp_path / "batch.jsonl")
+    journal = BatchJournal.create(path, {"args": []})
+    journal.mark(src, QUEUED)
+    journal.mark(src, RUNNING)
+    _done(journal, src, out)
+    journal.mark(gone, DONE)
+    os.remove(gone)
+
+    journal.compact()
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+
+    journal.compact(prune_missing=True)
+    journal.mark(src, DONE, output=out, size=os.path.getsize(out))
+    journal.close()
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+
+    resumed = BatchJournal(path)
+    assert resumed.header == {"args": []}
+    assert resumed.counts() == {DONE: 1}
+    assert resumed.is_done(src)
+    resumed.close()
@@ -0,0 +1,70 @@
+import pytest
+
+import benchmark
+from benchmark import compare_results, latency_stats, parse_tiers, percentile
+
+
+def _result(**stage):
+    return {"version": benchmark.RESULT_VERSION, "stages": {"video": stage}}
+
+
+def test_percentile_interpolates():
+    assert percentile([], 50) == 0.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 90) == pytest.approx(4.6)
+    assert percentile([7.0], 99) == 7.0
+
+
+def test_latency_stats():
+    stats = latency_stats([0.1, 0.2, 0.3, 0.4])
+    assert stats["mean"] == 0.25
+    assert stats["p50"] == 0.25
+    assert stats["max"] == 0.4
+    assert latency_stats([])["p95"] == 0.0
+
+
+def test_parse_tiers():
+    assert parse_tiers("default") == list(benchmark.DEFAULT_TIERS)
+    assert parse_tiers("all") == list(benchmark.SIZE_TIERS)
+    assert parse_tiers("thumb, fhd") == ["thumb", "fhd"]
+    with pytest.raises(ValueError):
+        parse_tiers("thumb,huge")
+
+
+def test_compare_flags_regressions_by_direction():
+    base = _result(throughput=10.0, latency={"p50": 1.0, "p95": 2.0}, output_bytes=1000, fail=0)
+    new = _result(throughput=8.0, latency={"p50": 0.5, "p95": 2.1}, output_bytes=1000, fail=1)
+    deltas = {d.metric: d for d in compare_results(base, new, threshold_pct=10.0)}
+
+    assert deltas["throughput"].regression
+    assert deltas["throughput"].change_pct == pytest.approx(-20.0)
+    assert not deltas["latency.p50"].regression
+    assert not deltas["latency.p95"].regression
+    assert not deltas["output_bytes"].regression
+    assert deltas["fail"].regression
+
+
+def test_compare_skips_missing_stages_and_zero_baselines():
+    base = {"stages": {"video": {"throughput": 0.0}}}
+    new = {"stages": {"video": {"throughput": 5.0}, "image_png": {"throughput": 1.0}}}
+    assert compare_results(base, new) == []
+
+
+def test_result_version_is_checked(tmp_path):
+    path = str(tmp_path / "r.json")
+    benchmark.save_result(_result(throughput=1.0), path)
+    assert benchmark.load_result(path)["stages"]["video"]["throughput"] == 1.0
+
+    benchmark.save_result({"version": 999}, path)
+    with pytest.raises(ValueError):
+        benchmark.load_result(path)
+
+
+def test_corpus_stems_are_unique_and_manifest_is_reused(tmp_path):
+    images = benchmark.generate_corpus(str(tmp_path), ["thumb"])
+    assert len(images) == len(benchmark.FORMAT_VARIANTS)
+    stems = {img.path.rsplit(".", 1)[0] for img in images}
+    assert len(stems) == len(images)
+
+    again = benchmark.generate_corpus(str(tmp_path), ["thumb"], on_image=lambda _img: pytest.fail("regenerated"))
+    assert [img.path for img in again] == [img.path for img in images]
@@ -0,0 +1,38 @@
+import converter_cli as cli
+import converter_engine as engine
+
+
+def test_no_images_is_usage_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "check_ffmpeg", lambda *_: True)
+    assert cli.main(["convert", str(tmp_path)]) == cli.EXIT_USAGE
+
+
+def test_missing_ffmpeg_exit_code(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"x")
+    code = cli.main(["convert", str(tmp_path), "--ffmpeg", str(tmp_path / "no-ffmpeg")])
+    assert code == cli.EXIT_NO_FFMPEG
+
+
+def test_rejects_non_positive_duration(tmp_path):
+    assert cli.main(["convert", str(tmp_path), "--duration", "0"]) == cli.EXIT_USAGE
+
+
+def test_image_format_converts_webp(tmp_path):
+    from PIL import Image
+
+    Image.new("RGBA", (4, 4), (255, 0, 0, 128)).save(tmp_path / "a.webp")
+    out = tmp_path / "out"
+    assert cli.main(["image-format", str(tmp_path), "--format", "jpg", "--out", str(out), "-q"]) == cli.EXIT_OK
+    with Image.open(out / "a.jpg") as im:
+        assert im.mode == "RGB"
+
+
+def test_output_cache_is_opt_in(tmp_path):
+    def cache_dir(*flags):
+        args = cli.build_parser().parse_args(["convert", str(tmp_path), *flags])
+        return cli._convert_options(args).cache_dir
+
+    assert cache_dir() == ""
+    assert cache_dir("--cache") == cli.default_cache_dir()
+    assert cache_dir("--cache-dir", str(tmp_path / "c")) == str(tmp_path / "c")
+    assert cache_dir("--cache", "--no-cache") == ""
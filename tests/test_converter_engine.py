@@ -0,0 +1,302 @@
+import os
+import threading
+import time
+from dataclasses import replace
+
+import pytest
+
+import converter_engine as engine
+from encoder_profiles import PROFILES
+from renditions import parse_ladder
+
+
+def _images(tmp_path, count):
+    files = []
+    for i in range(count):
+        path = tmp_path / f"img{i}.png"
+        path.write_bytes(b"x")
+        files.append(str(path))
+    return files
+
+
+def _fake_convert(monkeypatch, delays=None):
+    """用假的 convert_one 代替 FFmpeg，记录同时运行的任务数。"""
+    state = {"running": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def convert_one(file_path, options, index=0, **_kwargs):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep((delays or {}).get(index, 0.01))
+        with lock:
+            state["running"] -= 1
+        return engine.JobResult(index=index, input_path=file_path, ok=not file_path.endswith("img3.png"), output_size=10)
+
+    monkeypatch.setattr(engine, "convert_one", convert_one)
+    return state
+
+
+def test_build_ffmpeg_cmd_layout():
+    cmd = engine.build_ffmpeg_cmd("in.png", "out.mp4", engine.ConvertOptions(duration=5, ffmpeg_bin="/opt/ffmpeg"))
+    assert cmd[0] == "/opt/ffmpeg"
+    assert cmd[cmd.index("-i") + 1] == "in.png"
+    assert cmd[-1] == "out.mp4"
+
+
+def _last_index(cmd, arg):
+    return len(cmd) - 1 - cmd[::-1].index(arg)
+
+
+@pytest.mark.parametrize("build, outputs", [
+    (lambda o: engine.build_ffmpeg_cmd("in.png", "out.mp4", o), ["out.mp4"]),
+    (lambda o: engine.build_ffmpeg_cmd("in.png", "out.mp4", replace(o, fast_still=False)), ["out.mp4"]),
+    (lambda o: engine.build_ladder_cmd("in.png", ["a.mp4", "b.webm"], o, parse_ladder("720,480:webm")),
+     ["a.mp4", "b.webm"]),
+    (lambda o: engine.build_animation_cmd("out.mp4", o, (640, 480), 30), ["out.mp4"]),
+    (lambda o: engine.build_slideshow_cmd("list.txt", "out.mp4", o, 6), ["out.mp4"]),
+    (lambda o: engine.build_pack_cmd(["a.png", "b.png"], ["a.mp4", "b.mp4"], o, [None, None]), ["a.mp4", "b.mp4"]),
+])
+def test_threads_are_output_options(build, outputs):
+    # 放在 -i 之前的 -threads 只限制解码器；每个输出都要带上自己的编码线程数
+    cmd = build(engine.ConvertOptions(profile=replace(PROFILES["balanced"], threads=3)))
+    positions = [i for i, arg in enumerate(cmd) if arg == "-threads"]
+    assert len(positions) == len(outputs)
+    assert positions[0] > _last_index(cmd, "-i")
+    for pos, out in zip(positions, outputs):
+        assert cmd[pos + 1] == "3"
+        assert pos < cmd.index(out)
+
+
+def test_fast_still_decodes_the_image_once():
+    cmd = engine.build_ffmpeg_cmd("in.png", "out.mp4", engine.ConvertOptions(duration=5))
+    assert "-loop" not in cmd
+    assert "-t" not in cmd
+    vf = cmd[cmd.index("-vf") + 1]
+    assert "loop=loop=4:size=1" in vf
+    assert cmd[cmd.index("-r") + 1] == str(engine.STILL_FPS)
+
+
+def test_slow_path_keeps_looped_input():
+    cmd = engine.build_ffmpeg_cmd("in.png", "out.mp4", engine.ConvertOptions(duration=5, fast_still=False))
+    assert cmd[cmd.index("-loop") + 1] == "1"
+    assert cmd.index("-loop") < cmd.index("-i")
+    assert cmd[cmd.index("-t") + 1] == "5"
+    assert cmd[cmd.index("-vf") + 1].startswith("fps=30,")
+
+
+def test_collect_images_walks_dirs_and_dedupes(tmp_path):
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    (sub / "a.JPG").write_bytes(b"x")
+    (tmp_path / "b.png").write_bytes(b"x")
+    (tmp_path / "notes.txt").write_text("x")
+
+    files = engine.collect_images([str(tmp_path), str(tmp_path / "b.png"), ""])
+    assert sorted(files) == sorted([str(sub / "a.JPG"), str(tmp_path / "b.png")])
+
+
+def test_run_batch_bounds_jobs_and_reports_in_queue_order(tmp_path, monkeypatch):
+    files = _images(tmp_path, 5)
+    state = _fake_convert(monkeypatch, delays={0: 0.1})
+    seen = []
+
+    summary = engine.run_batch(files, engine.ConvertOptions(jobs=2), on_result=lambda r: seen.append(r.index))
+
+    assert state["peak"] == 2
+    assert seen == [0, 1, 2, 3, 4]
+    assert (summary.total, summary.ok, summary.fail, summary.output_bytes) == (5, 4, 1, 40)
+
+
+def test_run_batch_stops_starting_jobs_after_cancel(tmp_path, monkeypatch):
+    files = _images(tmp_path, 4)
+    _fake_convert(monkeypatch)
+    cancel = threading.Event()
+    cancel.set()
+
+    summary = engine.run_batch(files, engine.ConvertOptions(jobs=1), cancel_event=cancel)
+    assert summary.cancelled
+    assert summary.ok + summary.fail == 0
+
+
+def test_second_batch_is_served_from_cache(tmp_path, monkeypatch):
+    files = _images(tmp_path, 2)
+    calls = []
+
+    def convert_one(file_path, options, index=0, **_kwargs):
+        calls.append(file_path)
+        out = engine.output_path_for(file_path, options)
+        with open(out, "wb") as f:
+            f.write(b"video")
+        return engine.JobResult(index=index, input_path=file_path, output_path=out, ok=True, output_size=5)
+
+    monkeypatch.setattr(engine, "convert_one", convert_one)
+    options = engine.ConvertOptions(jobs=1, output_dir=str(tmp_path / "out"), cache_dir=str(tmp_path / "cache"))
+    engine.run_batch(files, options)
+    # 两张图内容相同：第二张在第一批内就命中缓存
+    assert len(calls) == 1
+
+    summary = engine.run_batch(files, options)
+    assert len(calls) == 1
+    assert summary.cache_hits == 2
+    assert summary.bytes_saved == 10
+
+
+def test_raw_frame_input_reads_stdin():
+    cmd = engine.build_ffmpeg_cmd("in.jpg", "out.mp4", engine.ConvertOptions(duration=2), raw_size=(1280, 720))
+    assert cmd[cmd.index("-f") + 1] == "rawvideo"
+    assert cmd[cmd.index("-s") + 1] == "1280x720"
+    assert cmd[cmd.index("-i") + 1] == "pipe:0"
+    assert "scale=" not in cmd[cmd.index("-vf") + 1]
+
+
+def test_cache_key_depends_on_ingest(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"x")
+    pillow = engine.ConvertOptions(ingest=engine.INGEST_PILLOW)
+    assert engine.cache_key_for(str(path), pillow) != engine.cache_key_for(str(path), engine.ConvertOptions())
+
+
+@pytest.mark.skipif(os.name != "posix", reason="假 ffmpeg 为 shell 脚本")
+def test_cache_key_depends_on_ffmpeg_binary_and_version(tmp_path, monkeypatch):
+    import ffmpeg_probe
+
+    monkeypatch.setattr(ffmpeg_probe, "_memo", {})
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    path = tmp_path / "a.png"
+    path.write_bytes(b"x")
+
+    def fake_ffmpeg(name, version):
+        script = tmp_path / name
+        script.write_text(f"#!/bin/sh\n[ \"$2\" = -version ] && echo 'ffmpeg version {version}'\nexit 0\n")
+        script.chmod(0o755)
+        return engine.ConvertOptions(ffmpeg_bin=str(script))
+
+    old = fake_ffmpeg("ffmpeg-a", "6.0")
+    key = engine.cache_key_for(str(path), old)
+    assert engine.cache_key_for(str(path), old) == key
+    assert engine.cache_key_for(str(path), fake_ffmpeg("ffmpeg-b", "6.0")) != key
+    # 原地升级：同一路径，版本不同
+    assert engine.cache_key_for(str(path), fake_ffmpeg("ffmpeg-a", "7.1-upgraded")) != key
+
+
+def test_run_batch_consumes_a_generator_lazily(tmp_path, monkeypatch):
+    files = _images(tmp_path, 10)
+    pulled = []
+    started_after = []
+
+    def scan():
+        for path in files:
+            pulled.append(path)
+            yield path
+
+    def convert_one(file_path, options, index=0, **_kwargs):
+        started_after.append(len(pulled))
+        return engine.JobResult(index=index, input_path=file_path, ok=True)
+
+    monkeypatch.setattr(engine, "convert_one", convert_one)
+    summary = engine.run_batch(scan(), engine.ConvertOptions(jobs=1))
+
+    assert summary.total == summary.ok == 10
+    # 第一个任务开始时扫描还远没有结束
+    assert started_after[0] < len(files)
+
+
+def test_profile_sets_encoder_and_width():
+    profile = engine.EncoderProfile("x", preset="veryfast", crf=28, max_width=640)
+    cmd = engine.build_ffmpeg_cmd("in.png", "out.mp4", engine.ConvertOptions(profile=profile))
+    assert cmd[cmd.index("-preset") + 1] == "veryfast"
+    assert cmd[cmd.index("-crf") + 1] == "28"
+    assert "scale=640:-2" in cmd[cmd.index("-vf") + 1]
+
+
+def test_oom_failure_is_retried_alone_with_low_memory_settings(tmp_path, monkeypatch):
+    (path,) = _images(tmp_path, 1)
+    calls = []
+
+    def convert_one(file_path, options, index=0, **_kwargs):
+        calls.append(options)
+        if len(calls) == 1:
+            return engine.JobResult(index=index, input_path=file_path, return_code=1, log="Cannot allocate memory")
+        return engine.JobResult(index=index, input_path=file_path, ok=True, log="ok")
+
+    monkeypatch.setattr(engine, "convert_one", convert_one)
+    options = engine.ConvertOptions(profile=engine.PROFILES["balanced"])
+    result = engine.convert_scheduled(path, options, engine.MemoryBudget(1024 ** 3))
+
+    assert result.ok and result.oom_retried
+    retry = calls[1]
+    assert (retry.profile.threads, retry.profile.preset, retry.ingest) == (1, "ultrafast", engine.INGEST_PILLOW)
+    assert "Cannot allocate memory" in result.log
+
+
+def test_journal_resume_redoes_only_unfinished_jobs(tmp_path, monkeypatch):
+    from batch_journal import BatchJournal
+
+    files = _images(tmp_path, 3)
+    calls = []
+    fail = {files[1]}
+
+    def convert_one(file_path, options, index=0, **_kwargs):
+        calls.append(file_path)
+        out = engine.output_path_for(file_path, options)
+        if file_path in fail:
+            return engine.JobResult(index=index, input_path=file_path, output_path=out, return_code=1)
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        with open(out, "wb") as f:
+            f.write(b"video")
+        return engine.JobResult(index=index, input_path=file_path, output_path=out, ok=True, output_size=5)
+
+    monkeypatch.setattr(engine, "convert_one", convert_one)
+    options = engine.ConvertOptions(jobs=1, output_dir=str(tmp_path / "out"))
+    journal_path = str(tmp_path / "batch.jsonl")
+    journal = BatchJournal.create(journal_path, {})
+    engine.run_batch(files, options, journal=journal)
+    journal.close()
+    assert calls == files
+
+    calls.clear()
+    fail.clear()
+    journal = BatchJournal(journal_path)
+    summary = engine.run_batch(files, options, journal=journal)
+    journal.close()
+    assert calls == [files[1]]
+    assert (summary.skipped, summary.ok) == (2, 1)
+
+
+def test_noop_scale_is_dropped_only_when_exact():
+    from image_metadata import ImageInfo
+
+    assert engine.planned_scale_pad_filter(ImageInfo(1280, 720, "RGB", "PNG")) == "format=yuv420p"
+    assert engine.planned_scale_pad_filter(ImageInfo(1280, 721, "RGB", "PNG")) == engine.SCALE_PAD_FILTER
+    # 更窄的图片会被 scale=W:-2 放大，不能跳过
+    assert engine.planned_scale_pad_filter(ImageInfo(640, 480, "RGB", "PNG")) == engine.SCALE_PAD_FILTER
+    assert engine.planned_scale_pad_filter(None) == engine.SCALE_PAD_FILTER
+
+
+def test_longest_first_order(tmp_path):
+    from PIL import Image
+    from image_metadata import HeaderIndex
+
+    paths = []
+    for name, size in [("small", (10, 10)), ("big", (80, 60)), ("mid", (40, 30)), ("small2", (10, 10))]:
+        path = str(tmp_path / f"{name}.png")
+        Image.new("RGB", size).save(path)
+        paths.append(path)
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"x")
+    paths.append(str(broken))
+
+    ordered = engine.order_longest_first(paths, HeaderIndex())
+    names = [os.path.basename(p) for p in ordered]
+    assert names == ["broken.png", "big.png", "mid.png", "small.png", "small2.png"]
+
+
+def test_animation_cmd_reads_timed_frames_from_stdin():
+    cmd = engine.build_animation_cmd("out.mp4", engine.ConvertOptions(), (640, 480), 30)
+    assert cmd[cmd.index("-s") + 1] == "640x480"
+    assert cmd[cmd.index("-framerate") + 1] == "30"
+    assert cmd[cmd.index("-i") + 1] == "pipe:0"
+    assert cmd[cmd.index("-r") + 1] == "30"
+    assert "loop=" not in " ".join(cmd)
+    assert cmd[-1] == "out.mp4"
@@ -0,0 +1,73 @@
+import os
+
+from dir_scanner import DirIndex, iter_images
+
+
+def _accept(name):
+    return name.endswith(".png")
+
+
+def _tree(tmp_path):
+    for rel in ["a.png", "notes.txt", "sub/b.png", "sub/deeper/c.png", "other/d.png"]:
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+
+
+def _walk(root):
+    found = []
+    for dir_path, _dirs, files in os.walk(root):
+        found += [os.path.join(dir_path, f) for f in files if _accept(f)]
+    return found
+
+
+def test_same_files_as_os_walk(tmp_path):
+    _tree(tmp_path)
+    assert sorted(iter_images([str(tmp_path)], _accept)) == sorted(_walk(str(tmp_path)))
+
+
+def test_yields_before_the_scan_finishes(tmp_path):
+    _tree(tmp_path)
+    it = iter_images([str(tmp_path)], _accept)
+    first = next(it)
+    assert first.endswith(".png")
+    assert len([first, *it]) == 4
+
+
+def test_dedupes_and_skips_unsupported(tmp_path):
+    _tree(tmp_path)
+    paths = [str(tmp_path / "a.png"), str(tmp_path), str(tmp_path / "notes.txt"), ""]
+    found = list(iter_images(paths, _accept))
+    assert found[0] == str(tmp_path / "a.png")
+    assert len(found) == len(set(found)) == 4
+
+
+def test_index_reuses_unchanged_dirs(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    _tree(root)
+    index_path = str(tmp_path / "index.json")
+
+    first = DirIndex(index_path)
+    assert len(list(iter_images([str(root)], _accept, first))) == 4
+    assert first.reused == 0
+
+    second = DirIndex(index_path)
+    assert len(list(iter_images([str(root)], _accept, second))) == 4
+    assert second.scanned == 0
+    assert second.reused == 4
+
+
+def test_index_rescans_changed_dir(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    _tree(root)
+    index_path = str(tmp_path / "index.json")
+    list(iter_images([str(root)], _accept, DirIndex(index_path)))
+
+    (root / "sub" / "new.png").write_bytes(b"x")
+    st = os.stat(root / "sub")
+    os.utime(root / "sub", ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    index = DirIndex(index_path)
+    assert len(list(iter_images([str(root)], _accept, index))) == 5
+    assert index.scanned == 1
@@ -0,0 +1,32 @@
+import json
+
+import encoder_profiles as profiles
+from encoder_profiles import DEFAULT_PROFILE, PROFILES, TUNED, EncoderProfile
+
+
+def test_throughput_matches_previous_hardcoded_arguments():
+    p = PROFILES[DEFAULT_PROFILE]
+    assert (p.preset, p.crf, p.threads, p.thread_type, p.tune, p.max_width) == (
+        "ultrafast", 23, 1, "slice", "stillimage", 1280
+    )
+
+
+def test_unknown_or_missing_tuned_falls_back_to_default(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert profiles.get_profile("nope") is PROFILES[DEFAULT_PROFILE]
+    assert profiles.get_profile(TUNED) is PROFILES[DEFAULT_PROFILE]
+    assert TUNED not in profiles.available_profiles()
+
+
+def test_tuned_profile_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    path = profiles.save_tuned_profile(EncoderProfile("x", preset="veryfast", threads=2, jobs=3), {"goal": "balanced"})
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    data["profile"]["from_a_newer_version"] = 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+    tuned = profiles.get_profile(TUNED)
+    assert (tuned.name, tuned.preset, tuned.threads, tuned.jobs) == (TUNED, "veryfast", 2, 3)
+    assert TUNED in profiles.available_profiles()
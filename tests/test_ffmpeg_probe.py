@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+import ffmpeg_probe
+from ffmpeg_probe import parse_encoders, parse_filters, probe_ffmpeg
+
+_ENCODERS = """Encoders:
+ V..... = Video
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC
+ V....D libvpx-vp9           libvpx VP9
+"""
+
+_FILTERS = """Filters:
+  T.. = Timeline support
+ ... loop              V->V       Loop video frames.
+ TSC scale             V->V       Scale the input video size.
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """记录调用次数的假 ffmpeg 脚本。"""
+    monkeypatch.setattr(ffmpeg_probe, "_memo", {})
+    calls = tmp_path / "calls.txt"
+    script = tmp_path / "ffmpeg"
+    script.write_text(
+        "#!/bin/sh\n"
+        f"echo \"$2\" >> '{calls}'\n"
+        "case \"$2\" in\n"
+        "  -version) echo 'ffmpeg version 9.9-test' ;;\n"
+        f"  -encoders) cat '{tmp_path / 'encoders.txt'}' ;;\n"
+        f"  -filters) cat '{tmp_path / 'filters.txt'}' ;;\n"
+        "esac\n"
+    )
+    (tmp_path / "encoders.txt").write_text(_ENCODERS)
+    (tmp_path / "filters.txt").write_text(_FILTERS)
+    script.chmod(0o755)
+    return str(script), calls
+
+
+def _calls(calls):
+    return calls.read_text().split() if calls.exists() else []
+
+
+def test_parsers():
+    assert parse_encoders(_ENCODERS) == ["libx264", "libvpx-vp9"]
+    assert parse_filters(_FILTERS) == ["loop", "scale"]
+
+
+@pytest.mark.skipif(os.name != "posix", reason="假 ffmpeg 为 shell 脚本")
+def test_probe_is_cached_on_disk(tmp_path, fake_ffmpeg, monkeypatch):
+    script, calls = fake_ffmpeg
+    cache_path = str(tmp_path / "probe.json")
+
+    caps = probe_ffmpeg(script, cache_path)
+    assert caps.version == "ffmpeg version 9.9-test"
+    assert caps.has_encoder("libx264") and caps.has_filter("loop")
+    assert not caps.cached
+    assert _calls(calls) == ["-version", "-encoders", "-filters"]
+
+    # 模拟重新启动：进程内缓存清空后从磁盘读取，不再启动 ffmpeg
+    monkeypatch.setattr(ffmpeg_probe, "_memo", {})
+    again = probe_ffmpeg(script, cache_path)
+    assert again.cached and again.encoders == caps.encoders
+    assert len(_calls(calls)) == 3
+
+
+@pytest.mark.skipif(os.name != "posix", reason="假 ffmpeg 为 shell 脚本")
+def test_replaced_binary_is_probed_again(tmp_path, fake_ffmpeg, monkeypatch):
+    script, calls = fake_ffmpeg
+    cache_path = str(tmp_path / "probe.json")
+    probe_ffmpeg(script, cache_path)
+
+    st = os.stat(script)
+    os.utime(script, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    monkeypatch.setattr(ffmpeg_probe, "_memo", {})
+    assert not probe_ffmpeg(script, cache_path).cached
+    assert len(_calls(calls)) == 6
+
+
+def test_missing_binary(tmp_path):
+    assert probe_ffmpeg(str(tmp_path / "no-ffmpeg"), str(tmp_path / "probe.json")) is None
@@ -0,0 +1,79 @@
+import sys
+
+from ffmpeg_runner import ProgressParser, run_ffmpeg, with_progress_args
+
+
+def _feed(parser, text):
+    snapshots = []
+    for line in text.strip().splitlines():
+        snapshot = parser.feed(line + "\n")
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def test_snapshot_per_progress_block():
+    parser = ProgressParser(duration=4)
+    snapshots = _feed(parser, """
+frame=30
+fps=29.5
+out_time_us=1000000
+out_time_ms=1000000
+speed=2.5x
+progress=continue
+frame=120
+fps=30.0
+out_time_us=4000000
+speed=N/A
+progress=end
+""")
+    assert len(snapshots) == 2
+    first, last = snapshots
+    assert (first.frame, first.fps, first.speed, first.out_time) == (30, 29.5, 2.5, 1.0)
+    assert first.percent == 25.0
+    assert not first.done
+    assert last.frame == 120
+    assert last.speed == 0.0
+    assert last.done and last.percent == 100.0
+
+
+def test_percent_is_capped_until_end():
+    parser = ProgressParser(duration=1)
+    (snapshot,) = _feed(parser, "out_time_us=5000000\nprogress=continue")
+    assert snapshot.percent == 99.9
+
+
+def test_snapshots_are_independent_copies():
+    parser = ProgressParser(duration=2)
+    first, second = _feed(parser, "frame=1\nprogress=continue\nframe=2\nprogress=continue")
+    assert (first.frame, second.frame) == (1, 2)
+
+
+def test_ignores_lines_without_key_value():
+    parser = ProgressParser(duration=2)
+    assert parser.feed("garbage\n") is None
+    assert parser.feed("\n") is None
+    assert _feed(parser, "out_time_us=-5\nprogress=continue")[0].out_time == 0.0
+
+
+# 代替 FFmpeg 的脚本：把 stdin 字节数写到 stderr，并输出两段 -progress 块
+_FAKE_FFMPEG = r"""
+import sys
+n = len(sys.stdin.buffer.read())
+sys.stderr.write(f"read {n} bytes\n")
+sys.stdout.write("out_time_us=1000000\nprogress=continue\nout_time_us=2000000\nprogress=end\n")
+sys.exit(3)
+"""
+
+
+def test_progress_args_follow_the_executable():
+    assert with_progress_args(["ffmpeg", "-y", "out.mp4"]) == ["ffmpeg", "-progress", "pipe:1", "-nostats", "-y", "out.mp4"]
+
+
+def test_run_ffmpeg_streams_progress_and_stdin():
+    seen = []
+    run = run_ffmpeg([sys.executable, "-c", _FAKE_FFMPEG], duration=2, stdin_data=b"x" * 70000, on_progress=seen.append)
+    assert run.return_code == 3
+    assert run.stderr_tail == "read 70000 bytes"
+    assert [p.percent for p in seen] == [50.0, 100.0]
+    assert run.progress.done
@@ -0,0 +1,73 @@
+from PIL import Image
+
+from frame_ingest import AnimationStream, load_frame, target_size
+
+
+def _animation(path, durations, size=(40, 30)):
+    frames = [Image.new("RGB", size, (i * 60 % 256, 0, 0)) for i in range(len(durations))]
+    frames[0].save(path, "WEBP", save_all=True, append_images=frames[1:], duration=durations, loop=0, lossless=True)
+    return str(path)
+
+
+def _repeats(stream):
+    counts: list[int] = []
+    last = None
+    for data in stream.frames():
+        if data is last:
+            counts[-1] += 1
+        else:
+            counts.append(1)
+            last = data
+    return counts
+
+
+def test_target_size_matches_scale_minus_two():
+    assert target_size(4000, 3000, 1280) == (1280, 960)
+    assert target_size(1000, 333, 1280) == (1280, 426)
+
+
+def test_load_frame_downscales_jpeg_to_rgb24(tmp_path):
+    path = tmp_path / "big.jpg"
+    Image.new("RGB", (4000, 3000), (10, 20, 30)).save(path, "JPEG")
+
+    frame = load_frame(str(path), target_width=1280)
+    assert (frame.width, frame.height) == (1280, 960)
+    assert frame.source_size == (4000, 3000)
+    assert len(frame.data) == 1280 * 960 * 3
+    assert frame.pix_fmt == "rgb24"
+
+
+def test_load_frame_converts_alpha_and_pads_height_to_even(tmp_path):
+    path = tmp_path / "a.png"
+    Image.new("RGBA", (101, 51), (255, 0, 0, 128)).save(path)
+
+    frame = load_frame(str(path), target_width=100)
+    assert frame.height % 2 == 0
+    assert len(frame.data) == frame.width * frame.height * 3
+
+
+def test_frame_timing_rounds_on_cumulative_time(tmp_path):
+    # 30 fps：累计 100/150/183/250ms -> 第 3/5(4.5 四舍五入)/5/8 帧
+    stream = AnimationStream(_animation(tmp_path / "a.webp", [100, 50, 33, 67]), target_width=40)
+    assert _repeats(stream) == [3, 2, 3]
+    assert stream.emitted == 8
+    assert stream.decoded == 4
+    assert (stream.width, stream.height) == (40, 30)
+
+
+def test_missing_or_tiny_durations_default_to_100ms(tmp_path):
+    stream = AnimationStream(_animation(tmp_path / "a.webp", [0, 10, 100]), target_width=40)
+    assert _repeats(stream) == [3, 3, 3]
+
+
+def test_short_animation_loops_to_min_seconds(tmp_path):
+    stream = AnimationStream(_animation(tmp_path / "a.webp", [100, 100]), target_width=40, min_seconds=0.5)
+    assert sum(_repeats(stream)) == 15
+    assert stream.loops == 2
+    assert stream.seconds == 0.5
+
+
+def test_long_animation_plays_once(tmp_path):
+    stream = AnimationStream(_animation(tmp_path / "a.webp", [200, 200]), target_width=40, min_seconds=0.1)
+    assert sum(_repeats(stream)) == 12
+    assert stream.loops == 1
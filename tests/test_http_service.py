@@ -0,0 +1,120 @@
+import http.client
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import converter_engine as engine
+from converter_engine import ConvertOptions
+from http_service import ConversionHTTPServer, ConversionService, QueueFull
+
+
+@pytest.fixture
+def server(tmp_path):
+    service = ConversionService(ConvertOptions(jobs=1, memory_budget=0), work_dir=str(tmp_path / "service"))
+    srv = ConversionHTTPServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+    service.shutdown()
+
+
+def _post(server, headers: dict, body: bytes = b"", path: str = "/jobs"):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.putrequest("POST", path)
+    for key, value in headers.items():
+        conn.putheader(key, value)
+    conn.endheaders()
+    if body:
+        conn.send(body)
+    resp = conn.getresponse()
+    data = json.loads(resp.read() or b"{}")
+    conn.close()
+    return resp.status, data
+
+
+@pytest.mark.parametrize("length", ["abc", "-1", "1.5"])
+def test_invalid_content_length_is_rejected(server, length):
+    status, data = _post(server, {"Content-Length": length, "Content-Type": "application/json"})
+    assert status == 400
+    assert data["error"] == "invalid Content-Length"
+
+
+def test_missing_content_length(server):
+    assert _post(server, {"Content-Type": "application/json"})[0] == 411
+
+
+def test_bad_submissions(server, tmp_path):
+    body = b'{"path": "not-an-image.txt"}'
+    assert _post(server, {"Content-Length": str(len(body)), "Content-Type": "application/json"}, body)[0] == 400
+    body = json.dumps({"path": str(tmp_path / "missing.png")}).encode()
+    assert _post(server, {"Content-Length": str(len(body)), "Content-Type": "application/json"}, body)[0] == 404
+    assert _post(server, {"Content-Length": "3", "Content-Type": "text/plain"}, b"abc")[0] == 415
+    assert _post(server, {"Content-Length": "0"}, path="/nope")[0] == 404
+
+
+def test_stats(server):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.request("GET", "/stats")
+    resp = conn.getresponse()
+    stats = json.loads(resp.read())
+    conn.close()
+    assert resp.status == 200
+    assert stats["submitted"] == 0
+    assert set(stats["latency"]) == {"mean", "p50", "p90", "p95", "p99", "max"}
+
+
+def _fake_convert(monkeypatch, gate=None):
+    """代替 FFmpeg：把输入内容写成输出文件；gate 不为空时等待放行。"""
+    def convert_one(file_path, options, index=0, **_kwargs):
+        if gate is not None:
+            gate.wait(5)
+        out = engine.output_path_for(file_path, options)
+        with open(file_path, "rb") as src, open(out, "wb") as dst:
+            dst.write(b"mp4:" + src.read())
+        return engine.JobResult(index=index, input_path=file_path, output_path=out, ok=True,
+                                output_size=os.path.getsize(out))
+
+    monkeypatch.setattr(engine, "convert_one", convert_one)
+
+
+def test_upload_roundtrip(server, monkeypatch):
+    _fake_convert(monkeypatch)
+    status, job = _post(server, {"Content-Length": "5", "Content-Type": "image/png"}, b"image")
+    assert status == 202
+
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.request("GET", f"/jobs/{job['id']}?wait=5")
+    done = json.loads(conn.getresponse().read())
+    assert done["state"] == "done"
+    conn.request("GET", done["result_url"])
+    resp = conn.getresponse()
+    assert resp.status == 200
+    assert resp.read() == b"mp4:image"
+    conn.close()
+
+
+def test_full_queue_is_rejected(tmp_path, monkeypatch):
+    gate = threading.Event()
+    _fake_convert(monkeypatch, gate)
+    src = tmp_path / "a.png"
+    src.write_bytes(b"x")
+    service = ConversionService(ConvertOptions(jobs=1, memory_budget=0, output_dir=str(tmp_path)),
+                                work_dir=str(tmp_path / "service"), max_queue=1)
+    try:
+        running = service.submit(str(src))
+        deadline = time.monotonic() + 5
+        while service.running == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        service.submit(str(src))
+        with pytest.raises(QueueFull):
+            service.submit(str(src))
+        assert service.stats()["rejected"] == 1
+    finally:
+        gate.set()
+        running.done.wait(5)
+        service.shutdown()
@@ -0,0 +1,52 @@
+import threading
+
+from PIL import Image
+
+import converter_engine as engine
+
+
+def _webps(tmp_path, count):
+    files = []
+    for i in range(count):
+        path = tmp_path / f"img{i}.webp"
+        Image.new("RGBA", (32 + i, 24), (i * 40, 0, 0, 200)).save(path, "WEBP")
+        files.append(str(path))
+    return files
+
+
+def test_results_arrive_in_queue_order(tmp_path):
+    files = _webps(tmp_path, 4)
+    seen = []
+    summary = engine.convert_images(files, str(tmp_path / "out"), "png", jobs=2, on_result=lambda r: seen.append(r.index))
+
+    assert seen == [0, 1, 2, 3]
+    assert (summary.ok, summary.fail) == (4, 0)
+    assert summary.output_bytes > 0
+    for i in range(4):
+        assert (tmp_path / "out" / f"img{i}.png").exists()
+
+
+def test_pool_output_matches_in_process_conversion(tmp_path):
+    (src,) = _webps(tmp_path, 1)
+    engine.convert_images([src], str(tmp_path / "pool"), "jpg", jobs=1)
+    direct = engine.convert_image_file(src, str(tmp_path), "jpg")
+    with open(tmp_path / "pool" / "img0.jpg", "rb") as a, open(direct, "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_broken_file_is_reported_not_raised(tmp_path):
+    bad = tmp_path / "bad.webp"
+    bad.write_bytes(b"not an image")
+    results = []
+    summary = engine.convert_images([str(bad)], str(tmp_path), "png", jobs=1, on_result=results.append)
+
+    assert (summary.ok, summary.fail) == (0, 1)
+    assert results[0].error
+
+
+def test_cancelled_batch_skips_results(tmp_path):
+    files = _webps(tmp_path, 3)
+    cancel = threading.Event()
+    cancel.set()
+    summary = engine.convert_images(files, str(tmp_path / "out"), "png", jobs=1, cancel_event=cancel)
+    assert summary.cancelled
@@ -0,0 +1,85 @@
+import json
+import os
+
+from PIL import Image
+
+from image_metadata import HeaderIndex, probe_header
+
+
+def _png(path, size, mode="RGB"):
+    Image.new(mode, size).save(path, "PNG")
+    return str(path)
+
+
+def _bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_probe_reads_header_fields(tmp_path):
+    info = probe_header(_png(tmp_path / "a.png", (64, 48), "RGBA"))
+    assert (info.width, info.height, info.mode, info.format) == (64, 48, "RGBA", "PNG")
+    assert info.has_alpha and not info.animated
+    assert info.pixels == 64 * 48
+
+
+def test_animation_is_detected(tmp_path):
+    path = tmp_path / "a.gif"
+    frames = [Image.new("RGB", (8, 8), (i * 100, 0, 0)) for i in range(3)]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=100)
+    assert probe_header(str(path)).animated
+
+
+def test_jpeg_decodes_to_yuv420(tmp_path):
+    path = tmp_path / "a.jpg"
+    Image.new("RGB", (16, 16)).save(path, "JPEG")
+    assert probe_header(str(path)).bytes_per_pixel == 1.5
+    assert probe_header(_png(tmp_path / "a.png", (16, 16), "RGBA")).bytes_per_pixel == 4
+
+
+def test_unchanged_file_is_served_from_index(tmp_path):
+    path = _png(tmp_path / "a.png", (64, 48))
+    index = HeaderIndex()
+    assert index.get(path).width == 64
+    assert index.get(path).width == 64
+    assert (index.probed, index.hits) == (1, 1)
+
+
+def test_modified_file_is_probed_again(tmp_path):
+    path = _png(tmp_path / "a.png", (64, 48))
+    index = HeaderIndex()
+    index.get(path)
+    _png(path, (32, 16))
+    _bump_mtime(path)
+    assert (index.get(path).width, index.get(path).height) == (32, 16)
+    assert index.probed == 2
+
+
+def test_failed_probe_is_remembered(tmp_path):
+    path = str(tmp_path / "broken.png")
+    with open(path, "wb") as f:
+        f.write(b"not an image")
+    index = HeaderIndex()
+    assert index.get(path) is None
+    assert index.get(path) is None
+    assert (index.probed, index.hits) == (1, 1)
+    assert HeaderIndex().get(str(tmp_path / "missing.png")) is None
+
+
+def test_index_persists_and_ignores_other_versions(tmp_path):
+    path = _png(tmp_path / "a.png", (64, 48))
+    index_path = str(tmp_path / "index.json")
+    index = HeaderIndex(index_path)
+    index.probe_all([path])
+    index.save()
+
+    reloaded = HeaderIndex(index_path)
+    assert reloaded.get(path).width == 64
+    assert (reloaded.probed, reloaded.hits) == (0, 1)
+
+    with open(index_path, encoding="utf-8") as f:
+        data = json.load(f)
+    data["version"] = -1
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    assert len(HeaderIndex(index_path)) == 0
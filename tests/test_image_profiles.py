@@ -0,0 +1,54 @@
+import io
+
+import pytest
+from PIL import Image
+
+from converter_engine import convert_image_file
+from image_profiles import DEFAULT_IMAGE_PROFILE, IMAGE_PROFILES, get_image_profile, output_name, save_params
+
+
+def test_max_matches_previous_hardcoded_arguments():
+    profile = IMAGE_PROFILES["max"]
+    assert DEFAULT_IMAGE_PROFILE == "max"
+    assert save_params("jpg", profile) == ("JPEG", {"quality": 95, "optimize": True})
+    assert save_params("png", profile) == ("PNG", {"optimize": True})
+
+
+def test_other_profiles():
+    assert save_params("png", IMAGE_PROFILES["fast"]) == ("PNG", {"compress_level": 1})
+    assert save_params("jpg", IMAGE_PROFILES["fast"]) == ("JPEG", {"quality": 90, "optimize": False, "subsampling": 2})
+    fmt, params = save_params("webp", IMAGE_PROFILES["balanced"])
+    assert fmt == "WEBP" and params["lossless"] is True
+    assert get_image_profile("unknown") is IMAGE_PROFILES[DEFAULT_IMAGE_PROFILE]
+
+
+def test_output_name():
+    assert output_name("/x/a.webp", "png") == "a.png"
+    assert output_name("/x/a.webp", "webp") == "a_lossless.webp"
+    assert output_name("/x/a.png", "webp") == "a.webp"
+
+
+@pytest.mark.parametrize("fmt, pil_format, old_params", [
+    ("png", "PNG", {"optimize": True}),
+    ("jpg", "JPEG", {"quality": 95, "optimize": True}),
+])
+def test_max_output_is_byte_identical(tmp_path, fmt, pil_format, old_params):
+    src = str(tmp_path / "a.webp")
+    im = Image.linear_gradient("L").convert("RGB").resize((96, 64))
+    im.save(src, "WEBP", lossless=True)
+
+    out = convert_image_file(src, str(tmp_path), fmt, IMAGE_PROFILES["max"])
+    expected = io.BytesIO()
+    with Image.open(src) as source:
+        source.convert("RGB").save(expected, pil_format, **old_params)
+    with open(out, "rb") as f:
+        assert f.read() == expected.getvalue()
+
+
+def test_lossless_webp_roundtrip(tmp_path):
+    src = str(tmp_path / "a.webp")
+    im = Image.linear_gradient("L").convert("RGB").resize((96, 64))
+    im.save(src, "WEBP", quality=50)
+    out = convert_image_file(src, str(tmp_path), "webp", IMAGE_PROFILES["fast"])
+    with Image.open(src) as a, Image.open(out) as b:
+        assert a.convert("RGB").tobytes() == b.convert("RGB").tobytes()
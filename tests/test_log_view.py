@@ -0,0 +1,103 @@
+import threading
+
+import tkinter as tk
+
+from log_view import MAX_LINE_CHARS, LogView
+
+
+class FakeText:
+    """tk.Text 的最小替身：只支持 LogView 用到的按行插入/删除。"""
+
+    def __init__(self):
+        self.lines: list[str] = []
+        self.state = tk.DISABLED
+        self.inserts = 0
+
+    def configure(self, state):
+        self.state = state
+
+    def insert(self, index, text):
+        assert index == tk.END and self.state == tk.NORMAL
+        self.inserts += 1
+        self.lines += text.splitlines()
+
+    def delete(self, start, end):
+        assert self.state == tk.NORMAL
+        if end == tk.END:
+            self.lines.clear()
+        else:
+            del self.lines[:int(end.split(".")[0]) - 1]
+
+    def see(self, _index):
+        pass
+
+
+def test_flush_inserts_pending_lines_once():
+    text = FakeText()
+    view = LogView(text, max_lines=10)
+    view.append("a\nb\n")
+    view.append("c")
+    assert text.lines == []
+
+    view.flush()
+    assert text.lines == ["a", "b", "c"]
+    assert text.inserts == 1
+    assert text.state == tk.DISABLED
+    view.flush()
+    assert text.inserts == 1
+
+
+def test_widget_keeps_only_max_lines():
+    text = FakeText()
+    view = LogView(text, max_lines=5)
+    for i in range(4):
+        view.append(f"{i}\n")
+    view.flush()
+    for i in range(4, 7):
+        view.append(f"{i}\n")
+    view.flush()
+    assert text.lines == ["2", "3", "4", "5", "6"]
+
+    # 两次刷新之间的行数超过上限时只显示最后 max_lines 行
+    view.append("\n".join(str(i) for i in range(100)))
+    view.flush()
+    assert text.lines == ["95", "96", "97", "98", "99"]
+
+
+def test_long_lines_are_truncated_for_display_only(tmp_path):
+    text = FakeText()
+    view = LogView(text)
+    view.append("x" * (MAX_LINE_CHARS + 10))
+    view.flush()
+    assert len(text.lines[0]) < MAX_LINE_CHARS + 10
+
+    path = tmp_path / "log.txt"
+    view.export(str(path))
+    assert path.read_text(encoding="utf-8") == "x" * (MAX_LINE_CHARS + 10) + "\n"
+
+
+def test_clear_resets_display_and_export(tmp_path):
+    text = FakeText()
+    view = LogView(text)
+    view.append("old\n")
+    view.flush()
+    view.clear()
+    view.append("new\n")
+    view.flush()
+    assert text.lines == ["new"]
+
+    path = tmp_path / "log.txt"
+    view.export(str(path))
+    assert path.read_text(encoding="utf-8") == "new\n"
+
+
+def test_append_from_many_threads():
+    text = FakeText()
+    view = LogView(text, max_lines=10000)
+    threads = [threading.Thread(target=lambda n=n: [view.append(f"{n}-{i}\n") for i in range(200)]) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    view.flush()
+    assert len(text.lines) == 800
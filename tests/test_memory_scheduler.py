@@ -0,0 +1,140 @@
+import threading
+from dataclasses import replace
+import time
+
+from encoder_profiles import PROFILES
+from image_metadata import ImageInfo
+from memory_scheduler import (
+    MEMORY_BUDGET_AUTO, MemoryBudget, estimate_job_memory, is_oom_failure, job_threads, resolve_budget,
+)
+
+
+def _run(budget, cost, order, name, started=None, release=None):
+    def target():
+        with budget.reserve(cost):
+            order.append(name)
+            if started is not None:
+                started.set()
+            if release is not None:
+                release.wait(5)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def _wait_queued(budget, count):
+    deadline = time.monotonic() + 5
+    while len(budget._queue) < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert len(budget._queue) == count
+
+
+def test_admission_is_fifo():
+    budget = MemoryBudget(100)
+    order: list[str] = []
+    started, release = threading.Event(), threading.Event()
+    first = _run(budget, 60, order, "first", started, release)
+    assert started.wait(5)
+
+    big = _run(budget, 60, order, "big")
+    _wait_queued(budget, 1)
+    # 预算够用的小任务也不能越过排在前面的大任务
+    small = _run(budget, 10, order, "small")
+    _wait_queued(budget, 2)
+    assert order == ["first"]
+
+    release.set()
+    for thread in (first, big, small):
+        thread.join(5)
+    assert order == ["first", "big", "small"]
+    assert budget.used == 0
+    assert budget.peak <= 100
+    assert budget.waits == 2
+
+
+def test_job_larger_than_budget_runs_alone():
+    budget = MemoryBudget(100)
+    with budget.reserve(500):
+        assert budget.used == 100
+
+
+def test_exclusive_waits_for_running_jobs():
+    budget = MemoryBudget(100)
+    order: list[str] = []
+    started, release = threading.Event(), threading.Event()
+    job = _run(budget, 10, order, "job", started, release)
+    assert started.wait(5)
+
+    def exclusive():
+        with budget.exclusive():
+            order.append("exclusive")
+            assert budget.used == 100
+
+    thread = threading.Thread(target=exclusive)
+    thread.start()
+    _wait_queued(budget, 1)
+    assert order == ["job"]
+    release.set()
+    job.join(5)
+    thread.join(5)
+    assert order == ["job", "exclusive"]
+
+
+def test_estimate_grows_with_image_and_threads():
+    profile = PROFILES["throughput"]
+    small = ImageInfo(640, 480, "RGB", "PNG")
+    big = ImageInfo(8000, 6000, "RGB", "PNG")
+    assert estimate_job_memory(big, profile) > estimate_job_memory(small, profile)
+    assert estimate_job_memory(small, PROFILES["balanced"]) > estimate_job_memory(small, profile)
+    # Pillow 预解码不再需要原图尺寸的解码缓冲
+    assert estimate_job_memory(big, profile, pillow_ingest=True) < estimate_job_memory(big, profile)
+    assert estimate_job_memory(None, profile) > 0
+
+
+def test_resolve_budget():
+    assert resolve_budget(0) == 0
+    assert resolve_budget(123) == 123
+    assert resolve_budget(MEMORY_BUDGET_AUTO) >= 0
+
+
+def test_oom_classification():
+    assert is_oom_failure(-9, "")
+    assert is_oom_failure(137, "")
+    assert is_oom_failure(1, "[mjpeg @ 0x1] Cannot allocate memory")
+    assert is_oom_failure(1, "Error while decoding stream: get_buffer() failed")
+    assert not is_oom_failure(1, "Invalid data found when processing input")
+    assert not is_oom_failure(0, "")
+
+
+def test_extend_uses_only_free_budget_and_is_released():
+    budget = MemoryBudget(100)
+    with budget.reserve(30) as lease:
+        assert budget.extend(lease, 20, 5) == 3
+        assert (lease.cost, budget.used) == (90, 90)
+        assert budget.extend(lease, 20, 5) == 0
+    assert budget.used == 0
+
+
+def _granted_threads(budget, info, profile, max_threads):
+    # 与 convert_scheduled 相同：按单线程准入，再用剩余预算追加线程
+    one = estimate_job_memory(info, replace(profile, threads=1))
+    per_thread = estimate_job_memory(info, replace(profile, threads=2)) - one
+    with budget.reserve(one) as lease:
+        return 1 + budget.extend(lease, per_thread, max_threads - 1)
+
+
+def test_threads_follow_frame_size():
+    profile = PROFILES["balanced"]
+    assert job_threads(profile, jobs=1, cpu_count=8) == 8
+    assert job_threads(profile, jobs=8, cpu_count=8) == 2
+    assert job_threads(PROFILES["throughput"], jobs=8, cpu_count=8) == 1
+    assert job_threads(PROFILES["smallest"], jobs=8, cpu_count=8) == 8
+
+    budget = MemoryBudget(512 * 1024 * 1024)
+    small = ImageInfo(640, 480, "RGB", "PNG")
+    giant = ImageInfo(12000, 9000, "RGB", "PNG")
+    assert _granted_threads(budget, small, profile, 8) == 8
+    assert _granted_threads(budget, replace(small, width=8000, height=6000), replace(profile, max_width=7680), 8) < 8
+    assert _granted_threads(budget, giant, replace(profile, max_width=12000), 8) == 1
+    assert budget.used == 0
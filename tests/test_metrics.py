@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+import metrics
+from metrics import BUCKETS, MetricsRecorder
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    monkeypatch.delenv(metrics.ENV_JSONL, raising=False)
+    monkeypatch.delenv(metrics.ENV_PROM, raising=False)
+    rec = MetricsRecorder()
+    monkeypatch.setattr(metrics, "recorder", rec)
+    return rec
+
+
+def test_record_aggregates_per_stage(recorder):
+    metrics.record("encode", 0.02, bytes_in=10, bytes_out=5)
+    metrics.record("encode", 3.0, ok=False)
+    stats = recorder.snapshot()["encode"]
+    assert (stats.count, stats.errors, stats.bytes_in, stats.bytes_out) == (2, 1, 10, 5)
+    assert stats.seconds_sum == pytest.approx(3.02)
+    # 累积直方图：0.025 档起包含第一条，5.0 档起包含两条
+    assert stats.buckets[BUCKETS.index(0.01)] == 0
+    assert stats.buckets[BUCKETS.index(0.025)] == 1
+    assert stats.buckets[BUCKETS.index(5.0)] == 2
+
+
+def test_span_marks_exceptions_as_errors(recorder):
+    with metrics.span("verify", bytes_in=3) as sp:
+        sp.bytes_out = 7
+    with pytest.raises(RuntimeError):
+        with metrics.span("verify"):
+            raise RuntimeError("boom")
+    stats = recorder.snapshot()["verify"]
+    assert (stats.count, stats.errors, stats.bytes_in, stats.bytes_out) == (2, 1, 3, 7)
+
+
+def test_prometheus_text(recorder):
+    metrics.record("scan", 0.5, bytes_in=100)
+    text = recorder.render_prometheus()
+    assert 'pic_to_video_stage_duration_seconds_bucket{stage="scan",le="0.5"} 1' in text
+    assert 'pic_to_video_stage_duration_seconds_bucket{stage="scan",le="0.25"} 0' in text
+    assert 'pic_to_video_stage_duration_seconds_count{stage="scan"} 1' in text
+    assert 'pic_to_video_stage_bytes_in_total{stage="scan"} 100' in text
+    assert "# TYPE pic_to_video_stage_errors_total counter" in text
+
+
+def test_exports_jsonl_and_prom_on_flush(recorder, tmp_path):
+    jsonl = tmp_path / "m.jsonl"
+    prom = tmp_path / "m.prom"
+    recorder.configure(str(jsonl), str(prom))
+    metrics.record("encode", 0.1, bytes_out=42, file="a.png")
+    recorder.flush()
+
+    (line,) = jsonl.read_text(encoding="utf-8").splitlines()
+    event = json.loads(line)
+    assert (event["stage"], event["bytes_out"], event["file"], event["ok"]) == ("encode", 42, "a.png", True)
+    assert 'stage="encode"' in prom.read_text(encoding="utf-8")
+    assert not (tmp_path / "m.prom.tmp").exists()
+
+
+def test_recording_without_outputs_does_no_io(recorder):
+    metrics.record("scan", 0.1)
+    assert recorder._thread is None
+    recorder.flush()
@@ -0,0 +1,102 @@
+import os
+import time
+
+from converter_engine import ConvertOptions, cache_key_for
+from output_cache import OutputCache, discard_stale_partials, hash_file, link_or_copy, make_key, partial_path
+
+
+def _write(path, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_key_depends_on_content_and_params_not_path(tmp_path):
+    a = _write(tmp_path / "a.png", b"same")
+    b = _write(tmp_path / "b.png", b"same")
+    c = _write(tmp_path / "c.png", b"other")
+    assert hash_file(a) == hash_file(b) != hash_file(c)
+
+    options = ConvertOptions(duration=3)
+    assert cache_key_for(a, options) == cache_key_for(b, options)
+    assert cache_key_for(a, options) != cache_key_for(c, options)
+    assert cache_key_for(a, options) != cache_key_for(a, ConvertOptions(duration=5))
+    assert make_key("h", ["-a", "b"]) != make_key("h", ["-ab"])
+
+
+def test_hit_serves_stored_output(tmp_path):
+    cache = OutputCache(str(tmp_path / "cache"))
+    out = _write(tmp_path / "a.mp4", b"video")
+    key = make_key("h", ["x"])
+    assert not cache.get(key, str(tmp_path / "miss.mp4"))
+
+    cache.put(key, out)
+    dst = str(tmp_path / "copy.mp4")
+    assert cache.get(key, dst)
+    with open(dst, "rb") as f:
+        assert f.read() == b"video"
+    assert (cache.hits, cache.misses, cache.bytes_saved) == (1, 1, 5)
+
+
+def test_missing_entry_file_is_a_miss(tmp_path):
+    cache = OutputCache(str(tmp_path / "cache"))
+    key = make_key("h", ["x"])
+    cache.put(key, _write(tmp_path / "a.mp4", b"video"))
+    os.remove(cache._entry_path(key))
+    assert not cache.get(key, str(tmp_path / "copy.mp4"))
+
+
+def test_lru_eviction_drops_least_recently_used(tmp_path):
+    cache = OutputCache(str(tmp_path / "cache"), max_bytes=10)
+    keys = [make_key(str(i), []) for i in range(3)]
+    cache.put(keys[0], _write(tmp_path / "0.mp4", b"0000"))
+    cache.put(keys[1], _write(tmp_path / "1.mp4", b"1111"))
+    time.sleep(0.01)
+    # 使用过的条目变为最近使用，新条目超出容量时淘汰另一个
+    assert cache.get(keys[0], str(tmp_path / "hit.mp4"))
+    time.sleep(0.01)
+    cache.put(keys[2], _write(tmp_path / "2.mp4", b"2222"))
+
+    assert cache.total_bytes == 8
+    assert not os.path.exists(cache._entry_path(keys[1]))
+    assert cache.get(keys[0], str(tmp_path / "a.mp4"))
+    assert cache.get(keys[2], str(tmp_path / "b.mp4"))
+    assert not cache.get(keys[1], str(tmp_path / "c.mp4"))
+
+
+def test_link_or_copy_replaces_without_writing_through_links(tmp_path):
+    src = _write(tmp_path / "src.mp4", b"new")
+    old = _write(tmp_path / "old.mp4", b"old")
+    dst = str(tmp_path / "dst.mp4")
+    os.link(old, dst)
+
+    link_or_copy(src, dst)
+    with open(dst, "rb") as f:
+        assert f.read() == b"new"
+    with open(old, "rb") as f:
+        assert f.read() == b"old"
+    link_or_copy(src, dst)
+    assert sorted(os.listdir(tmp_path)) == ["dst.mp4", "old.mp4", "src.mp4"]
+
+
+def test_stale_partials_are_removed(tmp_path):
+    out = str(tmp_path / "a.mp4")
+    partial = _write(partial_path(out), b"half")
+    other = _write(partial_path(str(tmp_path / "b.mp4")), b"half")
+    assert os.path.basename(partial).startswith(".a.mp4.")
+
+    discard_stale_partials(out)
+    assert not os.path.exists(partial)
+    assert os.path.exists(other)
+
+
+def test_index_is_written_on_flush(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cache = OutputCache(cache_dir)
+    key = make_key("h", ["x"])
+    cache.put(key, _write(tmp_path / "a.mp4", b"video"))
+    assert not os.path.exists(cache.index_path)
+
+    cache.flush()
+    reopened = OutputCache(cache_dir)
+    assert reopened.get(key, str(tmp_path / "copy.mp4"))
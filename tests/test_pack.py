@@ -0,0 +1,71 @@
+from dataclasses import replace
+
+import converter_engine as engine
+from image_metadata import ImageInfo
+
+SMALL = ImageInfo(640, 480, "RGB", "JPEG")
+BIG = ImageInfo(4000, 3000, "RGB", "JPEG")
+
+
+def _sizes(packs):
+    return [[path for path, _info in pack] for pack in packs]
+
+
+def test_small_images_are_grouped_up_to_pack_max():
+    infos = {"a": SMALL, "b": SMALL, "c": SMALL, "d": BIG, "e": SMALL, "f": None}
+    options = engine.ConvertOptions(pack_max=2)
+    packs = list(engine.iter_packs(list(infos), options, infos.get))
+    # 不能打包的图片立即单独成组，不打断正在累积的包
+    assert _sizes(packs) == [["a", "b"], ["d"], ["f"], ["c", "e"]]
+
+
+def test_packs_respect_pixel_budget():
+    mid = ImageInfo(2000, 1500, "RGB", "JPEG")  # 3 MP：每包最多 5 张
+    paths = [str(i) for i in range(12)]
+    packs = list(engine.iter_packs(paths, engine.ConvertOptions(pack_max=100), lambda _p: mid))
+    assert [len(p) for p in packs] == [5, 5, 2]
+    assert all(sum(info.pixels for _p, info in pack) <= engine.PACK_PIXEL_BUDGET for pack in packs)
+
+
+def test_pack_max_one_never_reads_headers():
+    def info_for(_path):
+        raise AssertionError("header read")
+
+    packs = list(engine.iter_packs(["a", "b"], engine.ConvertOptions(pack_max=1), info_for))
+    assert _sizes(packs) == [["a"], ["b"]]
+
+
+def test_only_plain_stills_are_packable():
+    options = engine.ConvertOptions(pack_max=8)
+    assert engine.packable(options, SMALL)
+    assert not engine.packable(options, BIG)
+    assert not engine.packable(options, None)
+    assert not engine.packable(options, replace(SMALL, animated=True))
+    assert not engine.packable(replace(options, ingest=engine.INGEST_PILLOW), SMALL)
+
+
+def test_pack_cmd_has_one_chain_and_output_per_image():
+    options = engine.ConvertOptions(duration=2, pack_max=8)
+    cmd = engine.build_pack_cmd(["a.jpg", "b.jpg"], ["a.mp4", "b.mp4"], options, [SMALL, SMALL])
+
+    inputs = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-i"]
+    assert inputs == ["a.jpg", "b.jpg"]
+    chains = cmd[cmd.index("-filter_complex") + 1].split(";")
+    assert chains[0].startswith("[0:v]") and chains[0].endswith("[v0]")
+    assert chains[1].startswith("[1:v]") and chains[1].endswith("[v1]")
+    assert all("loop=loop=1:size=1" in c for c in chains)
+
+    maps = [i for i, arg in enumerate(cmd) if arg == "-map"]
+    assert [cmd[i + 1] for i in maps] == ["[v0]", "[v1]"]
+    assert cmd[maps[1] - 1] == "a.mp4"
+    assert cmd[-1] == "b.mp4"
+    assert cmd.count("-c:v") == 2
+
+
+def test_pack_cmd_slow_path_loops_each_input():
+    options = engine.ConvertOptions(duration=2, pack_max=8, fast_still=False)
+    cmd = engine.build_pack_cmd(["a.jpg", "b.jpg"], ["a.mp4", "b.mp4"], options, [SMALL, SMALL])
+    assert cmd.count("-loop") == 2
+    first = cmd.index("-i")
+    assert cmd[first - 6:first] == ["-loop", "1", "-framerate", "30", "-t", "2"]
+    assert cmd[cmd.index("-filter_complex") + 1].startswith("[0:v]fps=30,")
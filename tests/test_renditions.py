@@ -0,0 +1,78 @@
+import pytest
+
+import converter_engine as engine
+from renditions import MP4, WEBM, format_ladder, parse_ladder, parse_rendition
+
+
+def _outputs(cmd):
+    """按 -map 切分出每路输出的参数。"""
+    starts = [i for i, arg in enumerate(cmd) if arg == "-map"]
+    return [cmd[s:e] for s, e in zip(starts, starts[1:] + [len(cmd)])]
+
+
+def test_parse_ladder():
+    ladder = parse_ladder("1080, 720p,480:webm,720")
+    assert [(r.name, r.width, r.height, r.container) for r in ladder] == [
+        ("1080p", 1920, 1080, MP4),
+        ("720p", 1280, 720, MP4),
+        ("480p", 854, 480, WEBM),
+    ]
+    assert ladder[0].crf == 0 and ladder[2].crf == 33
+    assert ladder[2].suffix == "_480p.webm"
+    assert format_ladder(ladder) == "1080p,720p,480p:webm"
+    assert parse_ladder("") == ()
+
+
+@pytest.mark.parametrize("token", ["abc", "720:avi", "100", "9000"])
+def test_invalid_rendition(token):
+    with pytest.raises(ValueError):
+        parse_rendition(token)
+
+
+def test_ladder_cmd_decodes_once_and_writes_each_output():
+    ladder = parse_ladder("720,480:webm")
+    options = engine.ConvertOptions(duration=3, renditions=ladder)
+    cmd = engine.build_ladder_cmd("in.png", ["a_720p.mp4", "a_480p.webm"], options, ladder)
+
+    assert cmd.count("-i") == 1
+    assert cmd[cmd.index("-i") + 1] == "in.png"
+    graph = cmd[cmd.index("-filter_complex") + 1].split(";")
+    assert graph[0] == "[0:v]split=2[s0][s1]"
+    assert graph[1].startswith("[s0]scale=1280:720:") and graph[1].endswith("[v0]")
+    assert "loop=loop=2:size=1" in graph[2]
+
+    mp4, webm = _outputs(cmd)
+    assert mp4[:2] == ["-map", "[v0]"] and mp4[-1] == "a_720p.mp4"
+    assert mp4[mp4.index("-c:v") + 1] == "libx264"
+    assert webm[:2] == ["-map", "[v1]"] and webm[-1] == "a_480p.webm"
+    assert webm[webm.index("-c:v") + 1] == "libvpx-vp9"
+    assert webm[webm.index("-crf") + 1] == "33"
+
+
+def test_ladder_cmd_slow_path_and_raw_input():
+    ladder = parse_ladder("720")
+    slow = engine.ConvertOptions(duration=2, fast_still=False)
+    cmd = engine.build_ladder_cmd("in.png", ["a.mp4"], slow, ladder)
+    assert cmd[cmd.index("-loop") + 1] == "1"
+    assert cmd[cmd.index("-filter_complex") + 1].startswith("[0:v]fps=30,split=1")
+
+    cmd = engine.build_ladder_cmd("in.png", ["a.mp4"], engine.ConvertOptions(), ladder, raw_size=(640, 360))
+    assert cmd[cmd.index("-s") + 1] == "640x360"
+    assert cmd[cmd.index("-i") + 1] == "pipe:0"
+
+
+def test_ladder_cmd_animation_scales_every_frame():
+    ladder = parse_ladder("720,480")
+    cmd = engine.build_ladder_cmd("in.gif", ["a.mp4", "b.mp4"], engine.ConvertOptions(), ladder,
+                                  raw_size=(640, 360), animation_fps=12)
+    assert cmd[cmd.index("-framerate") + 1] == "12"
+    graph = cmd[cmd.index("-filter_complex") + 1].split(";")
+    assert all("loop=" not in part for part in graph)
+    assert graph[1].endswith(",format=yuv420p[v0]")
+
+
+def test_rendition_output_paths(tmp_path):
+    options = engine.ConvertOptions(output_dir=str(tmp_path), renditions=parse_ladder("720,480:webm"))
+    paths = engine.rendition_output_paths("/x/photo.jpg", options)
+    assert paths == [str(tmp_path / "photo_720p.mp4"), str(tmp_path / "photo_480p.webm")]
+    assert engine.output_path_for("/x/photo.jpg", options) == paths[0]
@@ -0,0 +1,50 @@
+import os
+
+from PIL import Image
+
+import converter_engine as engine
+from frame_ingest import load_canvas_frame
+
+
+def test_concat_list_repeats_last_file(tmp_path):
+    list_path = str(tmp_path / "list.ffconcat")
+    engine.write_concat_list(["a.png", "it's.png"], 2, list_path)
+    with open(list_path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+
+    quoted = "'" + os.path.abspath("it's.png").replace("'", "'\\''") + "'"
+    assert lines[0] == "ffconcat version 1.0"
+    assert lines[1:] == [
+        f"file '{os.path.abspath('a.png')}'", "duration 2",
+        f"file {quoted}", "duration 2",
+        f"file {quoted}",
+    ]
+
+
+def test_concat_cmd_layout():
+    options = engine.ConvertOptions(duration=2)
+    cmd = engine.build_slideshow_cmd("list.ffconcat", "out.mp4", options, total_seconds=6)
+    i = cmd.index("-i")
+    assert cmd[i - 4:i + 2] == ["-f", "concat", "-safe", "0", "-i", "list.ffconcat"]
+    assert cmd[cmd.index("-vf") + 1] == engine.slideshow_filter()
+    assert cmd[cmd.index("-t") + 1] == "6"
+    assert cmd[-1] == "out.mp4"
+
+
+def test_raw_cmd_reads_one_frame_per_image():
+    options = engine.ConvertOptions(duration=3)
+    cmd = engine.build_slideshow_cmd("pipe:0", "out.mp4", options, total_seconds=9, canvas=(640, 360), raw=True)
+    assert cmd[cmd.index("-s") + 1] == "640x360"
+    assert cmd[cmd.index("-framerate") + 1] == "1/3"
+    assert cmd[cmd.index("-i") + 1] == "pipe:0"
+
+
+def test_canvas_frame_is_letterboxed(tmp_path):
+    path = tmp_path / "tall.png"
+    Image.new("RGB", (100, 400), (255, 255, 255)).save(path)
+
+    frame = load_canvas_frame(str(path), (160, 90))
+    assert (frame.width, frame.height) == (160, 90)
+    im = Image.frombytes("RGB", (160, 90), frame.data)
+    assert im.getpixel((0, 45)) == (0, 0, 0)
+    assert im.getpixel((80, 45)) == (255, 255, 255)
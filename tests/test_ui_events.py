@@ -0,0 +1,119 @@
+import threading
+import time
+
+import ui_events
+from ui_events import EventBus
+
+
+def _kinds(events):
+    return [(ev.kind, ev.index, ev.payload) for ev in events]
+
+
+def test_progress_keeps_latest_per_job():
+    bus = EventBus()
+    for pct in (10, 20, 30):
+        bus.post(ui_events.PROGRESS, 0, pct)
+        bus.post(ui_events.PROGRESS, 1, pct + 1)
+    assert _kinds(bus.drain()) == [(ui_events.PROGRESS, 0, 30), (ui_events.PROGRESS, 1, 31)]
+    assert bus.drain() == []
+
+
+def test_finished_job_drops_its_progress_and_keeps_order():
+    bus = EventBus()
+    bus.post(ui_events.JOB_STARTED, 0)
+    bus.post(ui_events.PROGRESS, 0, 50)
+    bus.post(ui_events.LOG, 0, "a")
+    bus.post(ui_events.JOB_FINISHED, 0)
+    bus.post(ui_events.LOG, 1, "b")
+    assert _kinds(bus.drain()) == [
+        (ui_events.JOB_STARTED, 0, None),
+        (ui_events.LOG, 0, "a"),
+        (ui_events.JOB_FINISHED, 0, None),
+        (ui_events.LOG, 1, "b"),
+    ]
+
+
+def test_only_last_status_is_kept_at_its_position():
+    bus = EventBus()
+    bus.post(ui_events.STATUS, payload="one")
+    bus.post(ui_events.LOG, payload="x")
+    bus.post(ui_events.STATUS, payload="two")
+    bus.post(ui_events.BATCH_DONE)
+    assert _kinds(bus.drain()) == [
+        (ui_events.LOG, -1, "x"),
+        (ui_events.STATUS, -1, "two"),
+        (ui_events.BATCH_DONE, -1, None),
+    ]
+
+
+def test_drain_is_bounded():
+    bus = EventBus()
+    for i in range(10):
+        bus.post(ui_events.LOG, i)
+    assert len(bus.drain(max_events=4)) == 4
+    assert len(bus.drain()) == 6
+
+
+def test_post_from_worker_threads():
+    bus = EventBus()
+    threads = [threading.Thread(target=lambda n=n: [bus.post(ui_events.LOG, n) for _ in range(100)]) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(bus.drain()) == 400
+
+
+
+def _drain_scan(bus, timeout=5.0):
+    found = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        found += bus.drain()
+        if found and found[-1].kind == ui_events.SCAN_DONE:
+            break
+        time.sleep(0.01)
+    return found
+
+
+def test_drop_scan_streams_chunks_and_ignores_stale_scans(monkeypatch):
+    import image_to_video_converter as gui
+
+    class FakeApp:
+        """只带扫描相关属性的界面对象。"""
+        def __init__(self):
+            self.events = EventBus()
+            self._scan_generation = 0
+            self._scanned = []
+            self.status = []
+            self.received = None
+
+        def _iter_images_from_paths(self, paths):
+            return iter(paths)
+
+        def _set_status(self, text):
+            self.status.append(text)
+
+        def _on_drop_scanned(self, images):
+            self.received = images
+
+    monkeypatch.setattr(gui, "SCAN_CHUNK_SIZE", 3)
+    monkeypatch.setattr(gui, "SCAN_POST_INTERVAL", 60)
+    app = FakeApp()
+    images = [f"/x/{i}.png" for i in range(7)]
+
+    gui.ImageToVideoConverter._scan_paths(app, ["/old.png"])
+    stale = _drain_scan(app.events)
+    gui.ImageToVideoConverter._scan_paths(app, images)
+    current = _drain_scan(app.events)
+    assert [ev.kind for ev in current] == [ui_events.SCAN_FOUND, ui_events.SCAN_FOUND, ui_events.SCAN_DONE]
+
+    # 旧扫描的结果在新的拖入之后到达，应被忽略
+    handlers = {
+        ui_events.SCAN_FOUND: gui.ImageToVideoConverter._on_scan_found,
+        ui_events.SCAN_DONE: gui.ImageToVideoConverter._on_scan_done,
+    }
+    for ev in stale + current:
+        handlers[ev.kind](app, ev)
+    assert app.received == images
+    assert app.status[-1].endswith("已找到 6 张图片")
@@ -0,0 +1,74 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from watch_folder import FolderWatcher
+
+
+def _write(path, data: bytes = b"x" * 16):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def _drain(watcher, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    found = []
+    while time.monotonic() < deadline:
+        item = watcher.get(timeout=0.1)
+        if item is not None:
+            found.append(item[0])
+        elif found and not watcher.pending:
+            break
+    return sorted(found)
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    w = FolderWatcher([str(tmp_path)], settle=0.2, poll_interval=0.1, use_native=False)
+    yield w
+    w.stop()
+
+
+def test_settled_files_are_reported_once(tmp_path, watcher):
+    a = _write(tmp_path / "a.png")
+    _write(tmp_path / "notes.txt")
+    _write(tmp_path / ".hidden.png")
+    watcher.start()
+    assert _drain(watcher) == [a]
+    time.sleep(0.5)
+    assert watcher.get() is None
+
+
+def test_file_is_reported_only_after_it_stops_growing(tmp_path, watcher):
+    path = tmp_path / "a.png"
+    _write(path, b"")
+    watcher.start()
+    with open(path, "ab") as f:
+        for _ in range(8):
+            f.write(b"x" * 1024)
+            f.flush()
+            time.sleep(0.08)
+            assert watcher.get() is None
+
+    assert _drain(watcher) == [str(path)]
+
+
+def test_deleted_files_are_forgotten(tmp_path, watcher):
+    os.makedirs(tmp_path / "sub")
+    a = _write(tmp_path / "a.png")
+    b = _write(tmp_path / "sub" / "b.png")
+    watcher.start()
+    assert _drain(watcher) == [a, b]
+
+    os.remove(a)
+    shutil.rmtree(tmp_path / "sub")
+    time.sleep(0.6)
+    assert watcher._known == {}
+    assert str(tmp_path / "sub") not in watcher._dir_files
+
+    # 同名文件重新出现时按新文件处理
+    _write(a)
+    assert _drain(watcher) == [a]
@@ -0,0 +1,69 @@
+"""工作线程 -> 界面线程的事件总线。
+
+所有工作线程（扫描、转换、探测）只调用 post()，从不直接访问 Tk；
+界面线程按固定节拍 drain()，一次取出积压的事件并合并冗余项：
+同一任务的多条进度只保留最新一条，状态文本只保留最后一条。
+因此并行任务再多，界面每个节拍的工作量也基本不变。
+"""
+
+import queue
+from dataclasses import dataclass
+from typing import Any
+
+JOB_STARTED = "job_started"
+PROGRESS = "progress"
+JOB_FINISHED = "job_finished"
+JOB_FAILED = "job_failed"
+LOG = "log"
+STATUS = "status"
+BATCH_DONE = "batch_done"
+SCAN_FOUND = "scan_found"
+SCAN_DONE = "scan_done"
+SCAN_FAILED = "scan_failed"
+FFMPEG_PROBED = "ffmpeg_probed"
+
+DRAIN_INTERVAL_MS = 50
+# 单个节拍最多处理的事件数，其余留到下一个节拍，避免界面卡顿
+MAX_EVENTS_PER_DRAIN = 2000
+
+
+@dataclass
+class UIEvent:
+    kind: str
+    # 任务在队列中的序号（与任务无关的事件为 -1）
+    index: int = -1
+    payload: Any = None
+
+
+class EventBus:
+    def __init__(self):
+        self._queue: "queue.SimpleQueue[UIEvent]" = queue.SimpleQueue()
+
+    def post(self, kind: str, index: int = -1, payload: Any = None) -> None:
+        """任意线程可调用。"""
+        self._queue.put(UIEvent(kind, index, payload))
+
+    def drain(self, max_events: int = MAX_EVENTS_PER_DRAIN) -> list[UIEvent]:
+        """取出积压事件（界面线程调用），按到达顺序返回，进度/状态已合并。"""
+        ordered: list[UIEvent] = []
+        progress: dict[int, UIEvent] = {}
+        status = None
+        status_pos = 0
+        for _ in range(max_events):
+            try:
+                ev = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if ev.kind == PROGRESS:
+                progress[ev.index] = ev
+            elif ev.kind == STATUS:
+                status, status_pos = ev, len(ordered)
+            else:
+                if ev.kind in (JOB_FINISHED, JOB_FAILED):
+                    # 已结束的任务不再需要它之前的进度
+                    progress.pop(ev.index, None)
+                ordered.append(ev)
+        if status is not None:
+            ordered.insert(status_pos, status)
+        ordered.extend(progress.values())
+        return ordered
@@ -0,0 +1,374 @@
+"""监视文件夹：持续把投放到目录中的图片转换为 MP4。
+
+安装了 watchdog 时用系统文件通知（Linux inotify、macOS FSEvents、Windows ReadDirectoryChangesW）
+得知新增/修改的文件；否则按间隔用 scandir 轮询，目录 mtime 未变时复用上次的文件列表，
+只对候选文件做 stat。仍在写入的文件要等 (大小, mtime) 连续 settle 秒不变后才入队（去抖）。
+就绪的文件交给 JobPipeline（输出缓存、内存预算、journal 与批量转换相同），
+最多 jobs 个任务并行，其余在就绪队列中等待；报告每个文件从到达到 MP4 完成的延迟。
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+import metrics
+from batch_journal import BatchJournal
+from converter_engine import BatchSummary, ConvertOptions, JobPipeline, JobResult, is_supported_file
+from logging_config import logger
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_POLL_INTERVAL = 1.0
+# 轮询模式下每隔多少轮对所有文件做一次 stat（捕获原地覆盖写、目录 mtime 不变的修改）
+FULL_RESCAN_EVERY = 30
+# 使用系统通知时也定期全量扫描一次，兜底通知队列溢出等丢事件的情况
+NATIVE_RESCAN_SECONDS = 60.0
+# 去抖检查的节拍
+TICK_SECONDS = 0.2
+# 延迟统计保留最近的样本数
+LATENCY_WINDOW = 10000
+# 长期运行时定期压缩 journal（只保留每个任务的最后一条记录，并丢弃源文件已删除的任务）
+JOURNAL_COMPACT_SECONDS = 3600.0
+
+Stamp = tuple[int, int]
+
+
+@dataclass
+class _Candidate:
+    stamp: Optional[Stamp]
+    changed_at: float
+    # 到达时间（time.monotonic），用于计算到达 -> MP4 的延迟
+    arrived: float
+
+
+def _stat_stamp(path: str) -> Optional[Stamp]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "FolderWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.forget(event.src_path)
+            self.watcher.touch(event.dest_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.watcher.forget(event.src_path)
+
+
+class FolderWatcher:
+    """发现 roots 下新增/修改且已写完的图片，按就绪顺序通过 get() 取出 (路径, 到达时间)。"""
+
+    def __init__(
+        self,
+        roots: Iterable[str],
+        accept: Callable[[str], bool] = is_supported_file,
+        settle: float = DEFAULT_SETTLE_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        use_native: bool = True,
+        include_existing: bool = True,
+    ):
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.accept = accept
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.use_native = use_native and Observer is not None
+        self.include_existing = include_existing
+
+        self._lock = threading.Lock()
+        self._candidates: dict[str, _Candidate] = {}
+        # 已交出去的文件及其当时的 (mtime, 大小)，变化后会再次入队
+        self._known: dict[str, Stamp] = {}
+        self._dir_mtimes: dict[str, int] = {}
+        self._dir_files: dict[str, dict[str, int]] = {}
+        self._dir_subdirs: dict[str, list[str]] = {}
+        self._ready: "queue.SimpleQueue[tuple[str, float]]" = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+
+    @property
+    def backend(self) -> str:
+        return "native" if self.use_native else "polling"
+
+    def start(self) -> None:
+        self._scan(full=True, initial=True)
+        if self.use_native:
+            try:
+                observer = Observer()
+                handler = _EventHandler(self)
+                for root in self.roots:
+                    observer.schedule(handler, root, recursive=True)
+                observer.start()
+                self._observer = observer
+            except Exception:
+                logger.exception("Native file watching unavailable, falling back to polling")
+                self.use_native = False
+        self._thread = threading.Thread(target=self._loop, name="folder-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.roots} with {self.backend} backend, settle={self.settle}s")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._thread is not None:
+            self._thread.join()
+
+    def get(self, timeout: float = 0.0) -> Optional[tuple[str, float]]:
+        try:
+            return self._ready.get(timeout=timeout) if timeout > 0 else self._ready.get_nowait()
+        except queue.Empty:
+            return None
+
+    @property
+    def pending(self) -> int:
+        """仍在去抖（可能正在写入）的文件数。"""
+        with self._lock:
+            return len(self._candidates)
+
+    def touch(self, path: str, arrived: Optional[float] = None) -> None:
+        """标记文件有变化（系统通知线程或扫描调用）。"""
+        name = os.path.basename(path)
+        # 跳过隐藏文件（包括本程序写输出时的 .part 临时文件）
+        if name.startswith(".") or not self.accept(path):
+            return
+        now = time.monotonic()
+        with self._lock:
+            cand = self._candidates.get(path)
+            if cand is None:
+                self._candidates[path] = _Candidate(None, now, arrived if arrived is not None else now)
+            else:
+                cand.changed_at = now
+
+    def forget(self, path: str) -> None:
+        """文件被删除或移走：不再跟踪（同名文件再次出现时按新文件处理）。"""
+        with self._lock:
+            self._candidates.pop(path, None)
+            self._known.pop(path, None)
+
+    def _scan(self, full: bool, initial: bool = False) -> None:
+        """scandir 遍历；目录 mtime 未变时复用文件列表，full=True 时对所有文件 stat。"""
+        now_wall = time.time()
+        now = time.monotonic()
+        stack = list(self.roots)
+        seen_dirs: set[str] = set()
+        while stack:
+            dir_path = stack.pop()
+            seen_dirs.add(dir_path)
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+                if mtime_ns == self._dir_mtimes.get(dir_path) and not full:
+                    names = list(self._dir_files.get(dir_path, {}))
+                    stack.extend(os.path.join(dir_path, d) for d in self._dir_subdirs.get(dir_path, []))
+                    changed: list[str] = []
+                else:
+                    files: dict[str, int] = {}
+                    dirs: list[str] = []
+                    with os.scandir(dir_path) as it:
+                        for entry in it:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    dirs.append(entry.name)
+                                elif entry.is_file() and self.accept(entry.name) and not entry.name.startswith("."):
+                                    files[entry.name] = entry.inode()
+                            except OSError:
+                                continue
+                    # 新文件或被替换的文件（同名重新写入/改名覆盖时 inode 变化）
+                    old = self._dir_files.get(dir_path, {})
+                    changed = [n for n, ino in files.items() if old.get(n) != ino]
+                    for name in old.keys() - files.keys():
+                        self.forget(os.path.join(dir_path, name))
+                    names = list(files)
+                    self._dir_mtimes[dir_path] = mtime_ns
+                    self._dir_files[dir_path] = files
+                    self._dir_subdirs[dir_path] = dirs
+                    stack.extend(os.path.join(dir_path, d) for d in dirs)
+            except OSError:
+                logger.exception(f"Failed to scan watched directory: {dir_path}")
+                continue
+
+            check = names if full else changed
+            for name in check:
+                path = os.path.join(dir_path, name)
+                stamp = _stat_stamp(path)
+                if stamp is None or self._known.get(path) == stamp:
+                    continue
+                if initial and not self.include_existing:
+                    self._known[path] = stamp
+                    continue
+                if initial:
+                    arrived = now
+                else:
+                    # 轮询发现有滞后：按文件 mtime 估计到达时间（最多回溯一个轮询间隔）
+                    arrived = now - min(max(0.0, now_wall - stamp[0] / 1e9), self.poll_interval)
+                with self._lock:
+                    if path not in self._candidates:
+                        self._candidates[path] = _Candidate(None, now, arrived)
+
+        # 删除的目录不再跟踪，其中的文件一并遗忘
+        for stale in [d for d in self._dir_mtimes if d not in seen_dirs]:
+            self._dir_mtimes.pop(stale, None)
+            self._dir_subdirs.pop(stale, None)
+            for name in self._dir_files.pop(stale, {}):
+                self.forget(os.path.join(stale, name))
+
+    def _settle(self) -> None:
+        """对候选文件做 stat：(大小, mtime) 连续 settle 秒不变即视为写完，放入就绪队列。"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._candidates.items())
+        for path, cand in items:
+            stamp = _stat_stamp(path)
+            with self._lock:
+                if stamp is None:
+                    # 文件被删除/移走
+                    self._candidates.pop(path, None)
+                    self._known.pop(path, None)
+                elif stamp != cand.stamp:
+                    cand.stamp = stamp
+                    cand.changed_at = now
+                elif now - cand.changed_at >= self.settle and stamp[1] > 0:
+                    self._candidates.pop(path, None)
+                    if self._known.get(path) != stamp:
+                        self._known[path] = stamp
+                        self._ready.put((path, cand.arrived))
+
+    def _loop(self) -> None:
+        rounds = 0
+        last_scan = time.monotonic()
+        last_full = last_scan
+        while not self._stop.wait(TICK_SECONDS):
+            now = time.monotonic()
+            try:
+                if self.use_native:
+                    if now - last_full >= NATIVE_RESCAN_SECONDS:
+                        self._scan(full=True)
+                        last_full = now
+                elif now - last_scan >= self.poll_interval:
+                    rounds += 1
+                    self._scan(full=rounds % FULL_RESCAN_EVERY == 0)
+                    last_scan = now
+                self._settle()
+            except Exception:
+                logger.exception("Folder watcher iteration failed")
+
+
+@dataclass
+class WatchSummary(BatchSummary):
+    # 最近 LATENCY_WINDOW 个文件从到达到 MP4 完成的延迟（秒）
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def latency_stats(self) -> dict:
+        return metrics.latency_stats(list(self.latencies))
+
+
+def watch(
+    roots: Iterable[str],
+    options: ConvertOptions,
+    stop_event: threading.Event,
+    on_result: Optional[Callable[[JobResult, float], None]] = None,
+    on_report: Optional[Callable[[WatchSummary, int], None]] = None,
+    report_interval: float = 60.0,
+    settle: float = DEFAULT_SETTLE_SECONDS,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    use_native: bool = True,
+    include_existing: bool = True,
+    journal: Optional[BatchJournal] = None,
+) -> WatchSummary:
+    """监视 roots 并转换就绪的图片，直到 stop_event 被置位（阻塞）。
+
+    on_result(result, latency) 和 on_report(summary, 去抖中的文件数) 在调用线程中回调。
+    停止时等待进行中的任务结束；就绪但未开始的文件留给下次运行（有 journal 时不会重复转换）。
+    """
+    summary = WatchSummary()
+    started = time.perf_counter()
+    jobs = max(1, options.jobs)
+    watcher = FolderWatcher(roots, settle=settle, poll_interval=poll_interval,
+                            use_native=use_native, include_existing=include_existing)
+    pipeline = JobPipeline(options, journal)
+    watcher.start()
+
+    in_flight: dict[Future, tuple[str, float]] = {}
+
+    def collect(done: Iterable[Future]) -> None:
+        for fut in done:
+            path, arrived = in_flight.pop(fut)
+            res = fut.result()
+            latency = time.monotonic() - arrived
+            summary.add(res)
+            summary.latencies.append(latency)
+            metrics.record("arrival_to_mp4", latency, bytes_out=res.output_size, ok=res.ok, input=path)
+            if on_result:
+                on_result(res, latency)
+
+    last_report = last_compact = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            while not stop_event.is_set():
+                # 并行上限 jobs：空闲时才从就绪队列取文件
+                while len(in_flight) < jobs:
+                    item = watcher.get(timeout=0 if in_flight else TICK_SECONDS)
+                    if item is None:
+                        break
+                    path, arrived = item
+                    if not pipeline.admit(path):
+                        summary.skipped += 1
+                        continue
+                    in_flight[pool.submit(pipeline.run, summary.total, path)] = (path, arrived)
+                    summary.total += 1
+
+                if in_flight:
+                    done, _ = wait(in_flight, timeout=TICK_SECONDS, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+                if journal is not None and time.monotonic() - last_compact >= JOURNAL_COMPACT_SECONDS:
+                    last_compact = time.monotonic()
+                    journal.compact(prune_missing=True)
+
+                if on_report and time.monotonic() - last_report >= report_interval:
+                    last_report = time.monotonic()
+                    summary.elapsed = time.perf_counter() - started
+                    on_report(summary, watcher.pending)
+
+            summary.cancelled = True
+            collect(wait(in_flight).done)
+    finally:
+        watcher.stop()
+        pipeline.finish(summary)
+        summary.elapsed = time.perf_counter() - started
+        stats = summary.latency_stats()
+        logger.info(
+            f"Watch stopped. converted={summary.ok}, failed={summary.fail}, skipped={summary.skipped}, "
+            f"latency_p50={stats['p50']}s, latency_p95={stats['p95']}s"
+        )
+        metrics.flush()
+    return summary